@@ -1,19 +1,129 @@
-from fastapi import HTTPException
+from fastapi import Cookie, HTTPException
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
 import jwt
 from dotenv import dotenv_values
 
-config = dotenv_values(".env")
+logger = logging.getLogger(__name__)
+
+ENV_FILE = ".env"
+# Verified tokens are remembered for at most this long, and never past their exp
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "4096"))
+# How often the signing keys are re-read, so a rotated secret is picked up without a restart
+AUTH_KEY_RELOAD_SECONDS = float(os.getenv("AUTH_KEY_RELOAD_SECONDS", "30"))
+
+
+class KeyRing:
+    """
+    Current refresh-token secret plus any previous ones still accepted while
+    tokens signed with them expire (REFRESH_JWT_PREVIOUS_SECRETS, comma
+    separated). Process environment overrides the .env file.
+    """
+
+    def __init__(self, env_file: str, reload_seconds: float):
+        self.env_file = env_file
+        self.reload_seconds = reload_seconds
+        self.secrets: tuple[str, ...] = ()
+        self._loaded_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def current(self) -> tuple[str, ...]:
+        if time.monotonic() - self._loaded_at >= self.reload_seconds:
+            with self._lock:
+                if time.monotonic() - self._loaded_at >= self.reload_seconds:
+                    self._load()
+        return self.secrets
+
+    def _load(self) -> None:
+        config = {**dotenv_values(self.env_file), **os.environ}
+        secrets = [config.get("REFRESH_JWT_SECRET")]
+        secrets.extend((config.get("REFRESH_JWT_PREVIOUS_SECRETS") or "").split(","))
+        secrets = tuple(secret.strip() for secret in secrets if secret and secret.strip())
+        if secrets != self.secrets:
+            if self.secrets:
+                logger.info("Refresh token signing keys changed, clearing verified token cache")
+            token_cache.clear()
+        self.secrets = secrets
+        self._loaded_at = time.monotonic()
+
+
+class TokenCache:
+    """Bounded LRU of verified token payloads, keyed by token hash."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[dict, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.time():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key: str, payload: dict) -> None:
+        expires_at = time.time() + self.ttl_seconds
+        if isinstance(payload.get("exp"), (int, float)):
+            expires_at = min(expires_at, payload["exp"])
+        self._entries[key] = (payload, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+token_cache = TokenCache(AUTH_CACHE_MAX_ENTRIES, AUTH_CACHE_TTL)
+key_ring = KeyRing(ENV_FILE, AUTH_KEY_RELOAD_SECONDS)
+
+
+def _verify(token: str, secrets: tuple[str, ...]) -> dict:
+    if not secrets:
+        logger.error("REFRESH_JWT_SECRET is not configured")
+        raise HTTPException(status_code=500, detail="Authentication is not configured.")
+    for secret in secrets:
+        try:
+            return jwt.decode(token, secret, algorithms=["HS256"])
+        except jwt.InvalidSignatureError:
+            # Possibly signed with another accepted key
+            continue
+        except jwt.ExpiredSignatureError:
+            raise HTTPException(status_code=401, detail="Token expired.")
+        except jwt.PyJWTError:
+            raise HTTPException(status_code=401, detail="Invalid token.")
+    raise HTTPException(status_code=401, detail="Invalid token.")
+
+
 def authenticateUser(token):
-     print(token)
-     if not token:
+    if not token:
         raise HTTPException(status_code=401, detail="Authorization token is required.")
 
-     try:
-        
-        decoded_jwt = jwt.decode(token, config["REFRESH_JWT_SECRET"], algorithms=["HS256"])
-        print(decoded_jwt)
-        return decoded_jwt
-     except jwt.ExpiredSignatureError:
-            raise HTTPException(status_code=401, detail="Token expired.")
-     except jwt.PyJWTError:
-            raise HTTPException(status_code=401, detail="Invalid token.")
\ No newline at end of file
+    secrets = key_ring.current()
+    key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    payload = token_cache.get(key)
+    if payload is None:
+        payload = _verify(token, secrets)
+        token_cache.set(key, payload)
+    return payload
+
+
+# Dependency for routes authenticated by the refreshToken cookie
+async def current_user(refreshToken: Optional[str] = Cookie(None)) -> dict:
+    return authenticateUser(refreshToken)
@@ -0,0 +1,128 @@
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+
+def normalize_question(question: str) -> str:
+    return re.sub(r"\s+", " ", question.lower()).strip(" ?!.")
+
+
+def question_key(question: str) -> str:
+    return hashlib.sha256(normalize_question(question).encode("utf-8")).hexdigest()
+
+
+class AnswerEntry:
+    def __init__(self, question: str, answer: str, vector: Optional[list[float]]):
+        self.question = question
+        self.answer = answer
+        self.vector = np.asarray(vector, dtype=np.float32) if vector is not None else None
+        self.created_at = time.time()
+
+
+class IndexAnswers:
+    def __init__(self, version: str):
+        self.version = version
+        self.entries: OrderedDict[str, AnswerEntry] = OrderedDict()
+
+
+class AnswerCache:
+    """
+    Answers to questions already asked against a user's index. Lookups match
+    the normalized question exactly, then optionally the closest earlier
+    question whose embedding has cosine similarity of at least
+    similarity_threshold (0 disables). All of a user's answers are dropped
+    as soon as their index version changes.
+    """
+
+    def __init__(self, max_indexes: int = 1024, max_entries_per_index: int = 64,
+                 ttl_seconds: float = 3600, similarity_threshold: float = 0.0):
+        self.max_indexes = max_indexes
+        self.max_entries_per_index = max_entries_per_index
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._indexes: OrderedDict[str, IndexAnswers] = OrderedDict()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def semantic(self) -> bool:
+        return self.similarity_threshold > 0
+
+    def _answers(self, user_id: str, version: str) -> Optional[IndexAnswers]:
+        answers = self._indexes.get(user_id)
+        if answers is not None and answers.version != version:
+            self.invalidate(user_id)
+            return None
+        if answers is not None:
+            self._indexes.move_to_end(user_id)
+        return answers
+
+    def get(self, user_id: str, version: str, question: str,
+            vector: Optional[list[float]] = None) -> Optional[str]:
+        answers = self._answers(user_id, version)
+        if answers is not None:
+            cutoff = time.time() - self.ttl_seconds
+            for key in [key for key, entry in answers.entries.items() if entry.created_at < cutoff]:
+                del answers.entries[key]
+
+            entry = answers.entries.get(question_key(question))
+            if entry is not None:
+                answers.entries.move_to_end(question_key(question))
+                self.hits += 1
+                return entry.answer
+
+            if self.semantic and vector is not None:
+                match = self._closest(answers, np.asarray(vector, dtype=np.float32))
+                if match is not None:
+                    answers.entries.move_to_end(match)
+                    self.semantic_hits += 1
+                    return answers.entries[match].answer
+
+        self.misses += 1
+        return None
+
+    def _closest(self, answers: IndexAnswers, vector: np.ndarray) -> Optional[str]:
+        keys = [key for key, entry in answers.entries.items() if entry.vector is not None]
+        if not keys:
+            return None
+        matrix = np.stack([answers.entries[key].vector for key in keys])
+        norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(vector) or 1.0)
+        similarities = matrix @ vector / np.where(norms == 0, 1.0, norms)
+        best = int(np.argmax(similarities))
+        return keys[best] if similarities[best] >= self.similarity_threshold else None
+
+    def set(self, user_id: str, version: str, question: str, answer: str,
+            vector: Optional[list[float]] = None) -> None:
+        answers = self._answers(user_id, version)
+        if answers is None:
+            answers = IndexAnswers(version)
+            self._indexes[user_id] = answers
+            while len(self._indexes) > self.max_indexes:
+                self._indexes.popitem(last=False)
+        answers.entries[question_key(question)] = AnswerEntry(question, answer, vector)
+        answers.entries.move_to_end(question_key(question))
+        while len(answers.entries) > self.max_entries_per_index:
+            answers.entries.popitem(last=False)
+
+    def invalidate(self, user_id: str) -> None:
+        if self._indexes.pop(user_id, None) is not None:
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.semantic_hits + self.misses
+        return {
+            "indexes": len(self._indexes),
+            "entries": sum(len(answers.entries) for answers in self._indexes.values()),
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.semantic_hits) / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "similarity_threshold": self.similarity_threshold,
+        }
@@ -0,0 +1,159 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+def embedding_key(model: str, kind: str, text: str) -> str:
+    digest = hashlib.sha256()
+    for part in (model, kind, text):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class EmbeddingStore:
+    """
+    Fixed-capacity float32 vector store on disk. Vectors live in a memory-mapped
+    matrix with one row per slot; a SQLite table maps content hashes to slots
+    and tracks last use so the least recently used rows can be recycled.
+    """
+
+    def __init__(self, directory: str, max_entries: int = 100_000):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(directory, "index.sqlite"), check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, slot INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.commit()
+        self._vectors: Optional[np.memmap] = None
+        self._free: list[int] = []
+        self.dim: Optional[int] = None
+
+        row = self._db.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+        if row is not None:
+            self._open(int(row[0]))
+
+    def _open(self, dim: int) -> None:
+        path = os.path.join(self.directory, "vectors.f32")
+        mode = "r+" if os.path.exists(path) else "w+"
+        self._vectors = np.memmap(path, dtype=np.float32, mode=mode, shape=(self.max_entries, dim))
+        self.dim = dim
+        used = {slot for (slot,) in self._db.execute("SELECT slot FROM entries")}
+        self._free = [slot for slot in range(self.max_entries - 1, -1, -1) if slot not in used]
+
+    def get_many(self, keys: list[str]) -> dict[str, list[float]]:
+        if self._vectors is None or not keys:
+            return {}
+        with self._lock:
+            found = {}
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                for key, slot in self._db.execute(
+                    f"SELECT key, slot FROM entries WHERE key IN ({placeholders})", batch
+                ):
+                    found[key] = self._vectors[slot].tolist()
+            if found:
+                now = time.time()
+                self._db.executemany("UPDATE entries SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+                self._db.commit()
+            return found
+
+    def put_many(self, items: dict[str, list[float]]) -> None:
+        if not items:
+            return
+        with self._lock:
+            if self._vectors is None:
+                dim = len(next(iter(items.values())))
+                self._db.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('dim', ?)", (str(dim),))
+                self._open(dim)
+
+            items = {key: vector for key, vector in items.items() if len(vector) == self.dim}
+            if len(self._free) < len(items):
+                self._evict(len(items) - len(self._free))
+
+            now = time.time()
+            rows = []
+            for key, vector in list(items.items())[:len(self._free)]:
+                existing = self._db.execute("SELECT slot FROM entries WHERE key = ?", (key,)).fetchone()
+                slot = existing[0] if existing is not None else self._free.pop()
+                self._vectors[slot] = np.asarray(vector, dtype=np.float32)
+                rows.append((key, slot, now))
+            self._vectors.flush()
+            self._db.executemany("INSERT OR REPLACE INTO entries (key, slot, last_used) VALUES (?, ?, ?)", rows)
+            self._db.commit()
+
+    def _evict(self, count: int) -> None:
+        # Free at least a tenth of the store at a time so eviction isn't paid on every insert
+        count = max(count, self.max_entries // 10)
+        victims = self._db.execute(
+            "SELECT key, slot FROM entries ORDER BY last_used LIMIT ?", (count,)
+        ).fetchall()
+        self._db.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in victims])
+        self._free.extend(slot for _, slot in victims)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that only sends texts it hasn't seen before to the underlying model."""
+
+    def __init__(self, embeddings: Embeddings, model: str, store: EmbeddingStore):
+        self.embeddings = embeddings
+        self.model = model
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+
+    def _embed(self, kind: str, texts: list[str], compute) -> list[list[float]]:
+        keys = [embedding_key(self.model, kind, text) for text in texts]
+        found = self.store.get_many(list(set(keys)))
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        # Repeats within the batch are embedded once, so they count as hits
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            vectors = compute(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self.store.put_many(computed)
+            found.update(computed)
+        return [found[key] for key in keys]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self._embed("document", texts, self.embeddings.embed_documents)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed("query", [text], lambda texts: [self.embeddings.embed_query(texts[0])])[0]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "model": self.model,
+            "entries": len(self.store),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def store_directory(root: str, model: str) -> str:
+    return os.path.join(root, re.sub(r"[^A-Za-z0-9_.-]+", "_", model))
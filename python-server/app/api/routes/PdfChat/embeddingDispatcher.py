@@ -0,0 +1,187 @@
+import logging
+import queue
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# Exception class names providers use for failures worth retrying (rate limits, outages, timeouts)
+TRANSIENT_ERROR_NAMES = ("Timeout", "Connection", "RateLimit", "TooManyRequests", "ResourceExhausted",
+                         "ServiceUnavailable", "InternalServerError", "DeadlineExceeded", "BadGateway")
+
+
+def _status_code(error: BaseException):
+    for candidate in (getattr(error, "status_code", None), getattr(error, "code", None),
+                      getattr(getattr(error, "response", None), "status_code", None)):
+        if isinstance(candidate, int):
+            return candidate
+    return None
+
+
+def is_transient(error: BaseException) -> bool:
+    """
+    Whether a failed provider request may succeed if retried: 429s, 5xx,
+    timeouts and connection errors. Wrapped errors are checked through
+    their cause chain; anything else (bad keys, invalid input) fails fast.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, (TimeoutError, ConnectionError)):
+            return True
+        status = _status_code(error)
+        if status is not None:
+            return status == 429 or status >= 500
+        if any(name in type(error).__name__ for name in TRANSIENT_ERROR_NAMES):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class TokenBucket:
+    """Blocking token bucket: `rate` tokens per second, bursting up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1) -> float:
+        """Take tokens, sleeping until they are available. Returns the time spent waiting."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class DispatchingEmbeddings(Embeddings):
+    """
+    Shared front for an embeddings provider. Texts from concurrent callers are
+    coalesced into batches of up to batch_size. Each provider request goes
+    through a token-bucket rate limit; transient failures are retried with
+    jittered exponential backoff. Safe to call from any thread.
+    """
+
+    def __init__(self, embeddings: Embeddings, batch_size: int = 100, max_wait: float = 0.05,
+                 requests_per_minute: float = 120, max_concurrency: int = 4,
+                 max_retries: int = 5, backoff_base: float = 0.5, backoff_cap: float = 30):
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._limiter = TokenBucket(requests_per_minute / 60, max(1, max_concurrency))
+        self._pending: queue.Queue = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="embed-batch")
+        self._collector = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._latencies: deque = deque(maxlen=200)
+        self.batches = 0
+        self.texts = 0
+        self.retries = 0
+        self.failures = 0
+
+    def _ensure_started(self) -> None:
+        if self._collector is None:
+            with self._start_lock:
+                if self._collector is None:
+                    self._collector = threading.Thread(target=self._collect, name="embed-dispatcher", daemon=True)
+                    self._collector.start()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        self._ensure_started()
+        futures = []
+        for text in texts:
+            future: Future = Future()
+            self._pending.put((text, future))
+            futures.append(future)
+        return [future.result() for future in futures]
+
+    def embed_query(self, text: str) -> list[float]:
+        # Queries are latency sensitive, so they skip coalescing but still respect the rate limit
+        return self._call(lambda: self.embeddings.embed_query(text), 1)
+
+    def _collect(self) -> None:
+        while True:
+            batch = [self._pending.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._executor.submit(self._send, batch)
+
+    def _send(self, batch: list[tuple[str, Future]]) -> None:
+        texts = [text for text, _ in batch]
+        try:
+            vectors = self._call(lambda: self.embeddings.embed_documents(texts), len(texts))
+            if len(vectors) != len(batch):
+                logger.error(f"Embedding provider returned {len(vectors)} vectors for {len(batch)} texts")
+                raise ValueError(f"Embedding provider returned {len(vectors)} vectors for {len(batch)} texts")
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+        except Exception as e:
+            # Callers block on these futures, so none may be left unresolved
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    def _call(self, request, size: int):
+        for attempt in range(self.max_retries + 1):
+            self._limiter.acquire()
+            started = time.monotonic()
+            try:
+                result = request()
+            except Exception as e:
+                if attempt == self.max_retries or not is_transient(e):
+                    with self._stats_lock:
+                        self.failures += 1
+                    logger.error(f"Embedding request of {size} texts failed after {attempt + 1} attempts: {e}")
+                    raise
+                with self._stats_lock:
+                    self.retries += 1
+                # Full jitter keeps concurrent retries from hitting the provider in lockstep
+                time.sleep(random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt)))
+                continue
+            with self._stats_lock:
+                self._latencies.append(time.monotonic() - started)
+                self.batches += 1
+                self.texts += size
+            return result
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            latencies = sorted(self._latencies)
+            return {
+                "batches": self.batches,
+                "texts": self.texts,
+                "avg_batch_size": self.texts / self.batches if self.batches else 0.0,
+                "retries": self.retries,
+                "failures": self.failures,
+                "queued": self._pending.qsize(),
+                "latency_avg_ms": 1000 * sum(latencies) / len(latencies) if latencies else 0.0,
+                "latency_p95_ms": 1000 * latencies[int(0.95 * (len(latencies) - 1))] if latencies else 0.0,
+            }
@@ -1,45 +1,96 @@
-from PyPDF2 import PdfReader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_community.vectorstores import FAISS
 from langchain_core.prompts import PromptTemplate
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.runnables import Runnable
 from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from .embeddingCache import CachedEmbeddings, EmbeddingStore, store_directory
+from .embeddingDispatcher import DispatchingEmbeddings
 
 import os
-import uuid
-from datetime import datetime
-
-# Extract text from uploaded PDF files
-def get_pdf_text(pdf_docs):
-    text = ""
-    for pdf in pdf_docs:
-        pdf_reader = PdfReader(pdf)
-        for page in pdf_reader.pages:
-            text += page.extract_text() or ""
-    return text
-
-# Split long text into manageable chunks
-def get_text_chunks(text):
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=10000, chunk_overlap=1000)
-    chunks = text_splitter.split_text(text)
+import math
+from functools import lru_cache
+
+EMBEDDING_MODEL = os.getenv("PDF_CHAT_EMBEDDING_MODEL", "models/embedding-001")
+# Set PDF_CHAT_EMBEDDINGS=fake to use a deterministic local embedder (no API calls)
+EMBEDDING_PROVIDER = os.getenv("PDF_CHAT_EMBEDDINGS", "google")
+# Empty string disables the on-disk embedding cache
+EMBEDDING_CACHE_DIR = os.getenv("PDF_CHAT_EMBEDDING_CACHE_DIR", "embeddingCache")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("PDF_CHAT_EMBEDDING_CACHE_MAX_ENTRIES", "100000"))
+
+# Chunking and retrieval budgets, in (estimated) tokens
+CHARS_PER_TOKEN = 4
+CHUNK_TOKENS = int(os.getenv("PDF_CHAT_CHUNK_TOKENS", "400"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("PDF_CHAT_CHUNK_OVERLAP_TOKENS", "50"))
+# Candidates fetched from each retriever, and how many survive re-ranking
+RETRIEVAL_K = int(os.getenv("PDF_CHAT_RETRIEVAL_K", "20"))
+RERANK_K = int(os.getenv("PDF_CHAT_RERANK_K", "5"))
+CONTEXT_TOKENS = int(os.getenv("PDF_CHAT_CONTEXT_TOKENS", "2000"))
+
+def get_embedding_model_name():
+    return "fake-768" if EMBEDDING_PROVIDER == "fake" else EMBEDDING_MODEL
+
+# Single batching, rate-limited front to the embeddings provider, shared by every request
+@lru_cache(maxsize=None)
+def get_embedding_dispatcher():
+    if EMBEDDING_PROVIDER == "fake":
+        embeddings = DeterministicFakeEmbedding(size=768)
+    else:
+        embeddings = GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL)
+    return DispatchingEmbeddings(
+        embeddings,
+        batch_size=int(os.getenv("PDF_CHAT_EMBED_BATCH_SIZE", "100")),
+        requests_per_minute=float(os.getenv("PDF_CHAT_EMBED_RPM", "120")),
+        max_concurrency=int(os.getenv("PDF_CHAT_EMBED_CONCURRENCY", "4")),
+        max_retries=int(os.getenv("PDF_CHAT_EMBED_MAX_RETRIES", "5"))
+    )
+
+# Shared embeddings client, consulting the content-hash embedding cache first
+@lru_cache(maxsize=None)
+def get_embeddings():
+    embeddings = get_embedding_dispatcher()
+    if not EMBEDDING_CACHE_DIR:
+        return embeddings
+    model_name = get_embedding_model_name()
+    store = EmbeddingStore(store_directory(EMBEDDING_CACHE_DIR, model_name), EMBEDDING_CACHE_MAX_ENTRIES)
+    return CachedEmbeddings(embeddings, model_name, store)
+
+# Rough token count; Gemini has no local tokenizer and ~4 characters per token is close for English text
+def count_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+# Split a document page by page into token-bounded chunks that carry their source and page number
+def get_page_chunks(pages, source):
+    # The token estimate is linear in characters, so the budget is applied in characters
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_TOKENS * CHARS_PER_TOKEN,
+        chunk_overlap=CHUNK_OVERLAP_TOKENS * CHARS_PER_TOKEN
+    )
+    chunks = []
+    for page_number, page_text in enumerate(pages, start=1):
+        if not page_text.strip():
+            continue
+        for chunk in text_splitter.split_text(page_text):
+            chunks.append(Document(page_content=chunk, metadata={"source": source, "page": page_number}))
     return chunks
 
-# Generate embeddings and store them in FAISS vector store
-def get_vector_store(text_chunks, user_id):
-    embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-    vector_store = FAISS.from_texts(text_chunks, embedding=embeddings)
-    
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    unique_id = str(uuid.uuid4())
-    unique_subdirectory = f"{timestamp}_{unique_id}"
-    user_directory = os.path.join("faissDatabase", user_id, unique_subdirectory)
-    
-    os.makedirs(user_directory, exist_ok=True)
-    vector_store.save_local(os.path.join(user_directory, "faiss_index"))
-
-# Create a conversational QA chain using a prompt and Google Gemini model
+# Keep the best-ranked chunks that fit in the context token budget
+def apply_context_budget(docs, max_tokens=None):
+    max_tokens = max_tokens or CONTEXT_TOKENS
+    selected = []
+    used = 0
+    for doc in docs:
+        tokens = count_tokens(doc.page_content)
+        if selected and used + tokens > max_tokens:
+            break
+        selected.append(doc)
+        used += tokens
+    return selected
+
+# Create a conversational QA chain using a prompt and Google Gemini model.
+# The chain holds no per-request state, so it is built once and shared.
+@lru_cache(maxsize=None)
 def get_conversational_chain():
     prompt_template = """Answer the question in detail using the context provided. 
 If the answer is not in the context, say "answer is not available in the context."
@@ -60,7 +111,10 @@ Answer:"""
     model = ChatGoogleGenerativeAI(model="gemini-1.5-pro-001", temperature=0.3)
 
     def format_docs(docs: list[Document]) -> str:
-        return "\n\n".join(doc.page_content for doc in docs)
+        return "\n\n".join(
+            f"[{doc.metadata.get('source') or 'document'}, page {doc.metadata.get('page', '?')}]\n{doc.page_content}"
+            for doc in docs
+        )
 
     chain: Runnable = (
         {"context": lambda x: format_docs(x["input_documents"]), "question": lambda x: x["question"]}
@@ -0,0 +1,126 @@
+import asyncio
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+
+def estimate_store_bytes(vector_store: Any) -> int:
+    """Rough resident size of a loaded index: raw float32 vectors plus docstore text."""
+    if hasattr(vector_store, "resident_bytes"):
+        return vector_store.resident_bytes()
+    index = vector_store.index
+    size = index.ntotal * index.d * 4
+    for doc in getattr(vector_store.docstore, "_dict", {}).values():
+        size += len(getattr(doc, "page_content", ""))
+    return size
+
+
+class IndexEntry:
+    def __init__(self, version: str, store: Any, size: int):
+        self.version = version
+        self.store = store
+        self.size = size
+        self.checked_at = time.monotonic()
+
+
+class IndexCache:
+    """
+    Per-user cache of loaded vector stores, evicted least recently used once
+    the estimated memory budget is exceeded. The on-disk version is only
+    re-checked every revalidate_seconds, or right away after invalidate().
+    """
+
+    def __init__(self,
+                 resolve_version: Callable[[str], Optional[str]],
+                 loader: Callable[[str, str], Any],
+                 max_bytes: int = 512 * 1024 * 1024,
+                 revalidate_seconds: float = 30):
+        self.resolve_version = resolve_version
+        self.loader = loader
+        self.max_bytes = max_bytes
+        self.revalidate_seconds = revalidate_seconds
+        self._entries: OrderedDict[str, IndexEntry] = OrderedDict()
+        # Per-user load locks, dropped once no lookup is using them
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+        self.total_bytes = 0
+        self.hits = 0
+        self.loads = 0
+
+    async def get(self, user_id: str) -> Optional[Any]:
+        entry = self._entries.get(user_id)
+        if entry is not None and time.monotonic() - entry.checked_at < self.revalidate_seconds:
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry.store
+
+        lock = self._locks.setdefault(user_id, asyncio.Lock())
+        async with lock:
+            version = await asyncio.to_thread(self.resolve_version, user_id)
+            if version is None:
+                self._drop(user_id)
+                return None
+
+            entry = self._entries.get(user_id)
+            if entry is not None and entry.version == version:
+                entry.checked_at = time.monotonic()
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry.store
+
+            store = await asyncio.to_thread(self.loader, user_id, version)
+            self.loads += 1
+            self._drop(user_id)
+            if store is None:
+                return None
+            entry = IndexEntry(version, store, estimate_store_bytes(store))
+            self._entries[user_id] = entry
+            self.total_bytes += entry.size
+            self._evict()
+            return store
+
+    def put(self, user_id: str, version: Optional[str], store: Optional[Any]) -> None:
+        """Install a store the caller just wrote, so the next question needn't reload it."""
+        self._drop(user_id)
+        if version is None or store is None:
+            return
+        entry = IndexEntry(version, store, estimate_store_bytes(store))
+        self._entries[user_id] = entry
+        self.total_bytes += entry.size
+        self._evict()
+
+    def version(self, user_id: str) -> Optional[str]:
+        """Version of the store currently cached for this user, if any."""
+        entry = self._entries.get(user_id)
+        return entry.version if entry is not None else None
+
+    def loaded(self, user_id: str) -> Optional[tuple[str, Any]]:
+        """(version, store) cached for this user, for writers that extend it rather than reload it."""
+        entry = self._entries.get(user_id)
+        return (entry.version, entry.store) if entry is not None else None
+
+    def invalidate(self, user_id: str) -> None:
+        """Force the next lookup for this user to re-check the index on disk."""
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            entry.checked_at = float("-inf")
+
+    def _drop(self, user_id: str) -> None:
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self.total_bytes -= entry.size
+
+    def _evict(self) -> None:
+        # Always keep the most recently used entry, even if it alone exceeds the budget
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            self.total_bytes -= entry.size
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "loads": self.loads,
+        }
@@ -0,0 +1,199 @@
+import json
+import logging
+import math
+import mmap
+import os
+from typing import Union
+
+import faiss
+import numpy as np
+from langchain_community.docstore.base import Docstore
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+VECTORS_FILE = "vectors.faiss"
+# Quantized copy of VECTORS_FILE used for serving large indexes
+QUANTIZED_FILE = "vectors.ivfpq.faiss"
+DOCSTORE_FILE = "docstore.bin"
+OFFSETS_FILE = "docstore.offsets.npy"
+IDS_FILE = "docstore.ids.json"
+# Written by FAISS.save_local in the older format
+LEGACY_PICKLE_FILE = "index.pkl"
+
+logger = logging.getLogger(__name__)
+
+# Indexes with at least this many vectors also get an IVF-PQ copy on write (0 disables)
+QUANTIZE_MIN_VECTORS = int(os.getenv("PDF_CHAT_QUANTIZE_MIN_VECTORS", "50000"))
+IVF_NPROBE = int(os.getenv("PDF_CHAT_IVF_NPROBE", "16"))
+# Bits per PQ code; training needs at least 2 ** PQ_BITS vectors for the PQ centroids
+PQ_BITS = 8
+# FAISS wants this many training vectors per IVF list
+IVF_TRAINING_PER_LIST = 39
+
+
+class OffsetDocstore(Docstore):
+    """
+    Read-only docstore over a memory-mapped file of JSON records. Only the
+    id -> row mapping is held in memory; text is read from the page cache on demand.
+    """
+
+    def __init__(self, directory: str, ids: list[str]):
+        self._positions = {chunk_id: position for position, chunk_id in enumerate(ids)}
+        self._offsets = np.load(os.path.join(directory, OFFSETS_FILE), mmap_mode="r")
+        with open(os.path.join(directory, DOCSTORE_FILE), "rb") as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(f.name) else b""
+
+    def search(self, search: str) -> Union[str, Document]:
+        position = self._positions.get(search)
+        if position is None:
+            return f"ID {search} not found."
+        start, end = int(self._offsets[position]), int(self._offsets[position + 1])
+        record = json.loads(self._data[start:end])
+        return Document(id=search, page_content=record["text"], metadata=record["metadata"])
+
+    def resident_bytes(self) -> int:
+        return sum(len(chunk_id) + 64 for chunk_id in self._positions)
+
+
+class SegmentDocstore(Docstore):
+    """Read-only view over the docstores of an index and the segments appended to it."""
+
+    def __init__(self, docstores: list[Docstore], ids: list[list[str]]):
+        self.docstores = docstores
+        self._owner = {chunk_id: docstore for docstore, segment_ids in zip(docstores, ids) for chunk_id in segment_ids}
+
+    def search(self, search: str) -> Union[str, Document]:
+        docstore = self._owner.get(search)
+        if docstore is None:
+            return f"ID {search} not found."
+        return docstore.search(search)
+
+    def resident_bytes(self) -> int:
+        return sum(docstore.resident_bytes() for docstore in self.docstores if hasattr(docstore, "resident_bytes"))
+
+
+def combine_stores(stores: list[FAISS]) -> FAISS:
+    """
+    One searchable store over several mapped ones, e.g. a base index and the
+    segments appended to it since, without copying any vectors. Positions run
+    through the stores in order, as in the individual index_to_docstore_id maps.
+    """
+    # Combining a combined store again just adds to its list of segments
+    stores = [segment for store in stores for segment in getattr(store, "segments", [store])]
+    if len(stores) == 1:
+        return stores[0]
+    index = faiss.IndexShards(stores[0].index.d, False, True)
+    ids = []
+    for store in stores:
+        index.add_shard(store.index)
+        ids.append([store.index_to_docstore_id[position] for position in range(store.index.ntotal)])
+    docstore = SegmentDocstore([store.docstore for store in stores], ids)
+    combined = FAISS(stores[0].embedding_function, index, docstore,
+                     dict(enumerate(chunk_id for segment_ids in ids for chunk_id in segment_ids)))
+    combined.mapped = all(getattr(store, "mapped", False) for store in stores)
+    # Holds the shard indexes alive for as long as the combined store is in use
+    combined.segments = stores
+    return combined
+
+
+def _nlist(count: int) -> int:
+    return max(1, min(int(4 * math.sqrt(count)), count // IVF_TRAINING_PER_LIST))
+
+
+def _should_quantize(index: faiss.Index) -> bool:
+    if not QUANTIZE_MIN_VECTORS or not isinstance(index, faiss.IndexFlat):
+        return False
+    count = index.ntotal
+    # Below this, training can't fit the IVF lists and PQ centroids whatever the setting
+    return count >= max(QUANTIZE_MIN_VECTORS, IVF_TRAINING_PER_LIST * _nlist(count), 2 ** PQ_BITS)
+
+
+def _quantize(index: faiss.Index) -> faiss.Index:
+    """Rebuild a flat index as IVF-PQ, trained on its own vectors."""
+    count, dim = index.ntotal, index.d
+    vectors = index.reconstruct_n(0, count)
+    # PQ sub-quantizers must divide the dimension evenly
+    m = next((m for m in (64, 48, 32, 16, 8, 4, 2, 1) if dim % m == 0 and m <= dim), 1)
+    quantized = faiss.IndexIVFPQ(faiss.IndexFlatL2(dim), dim, _nlist(count), m, PQ_BITS)
+    quantized.train(vectors)
+    quantized.add(vectors)
+    return quantized
+
+
+def save_index(store: FAISS, directory: str) -> None:
+    """
+    Write a store as a FAISS index file plus an offset-indexed docstore.
+    The flat index stays the editable copy; large ones also get a quantized
+    copy that mapped loads serve from.
+    """
+    os.makedirs(directory, exist_ok=True)
+    faiss.write_index(store.index, os.path.join(directory, VECTORS_FILE))
+    quantized_path = os.path.join(directory, QUANTIZED_FILE)
+    quantized = None
+    if _should_quantize(store.index):
+        try:
+            quantized = _quantize(store.index)
+        except RuntimeError as e:
+            # The flat index is complete on its own; serve from it instead
+            logger.warning(f"Could not build quantized index, keeping the flat one: {e}")
+    if quantized is not None:
+        faiss.write_index(quantized, quantized_path)
+    elif os.path.exists(quantized_path):
+        os.remove(quantized_path)
+
+    ids = [store.index_to_docstore_id[position] for position in range(store.index.ntotal)]
+    offsets = [0]
+    with open(os.path.join(directory, DOCSTORE_FILE), "wb") as f:
+        for chunk_id in ids:
+            doc = store.docstore.search(chunk_id)
+            record = json.dumps({"text": doc.page_content, "metadata": doc.metadata}).encode("utf-8")
+            f.write(record)
+            offsets.append(offsets[-1] + len(record))
+    np.save(os.path.join(directory, OFFSETS_FILE), np.asarray(offsets, dtype=np.int64))
+    with open(os.path.join(directory, IDS_FILE), "w") as f:
+        json.dump(ids, f)
+
+
+def _mmap_flags(path: str) -> int:
+    # IVF inverted lists are mapped through faiss' on-disk lists, flat codes in place;
+    # the two readers can't be combined, so pick by the index type's fourcc
+    with open(path, "rb") as f:
+        ivf = f.read(4).startswith(b"Iw")
+    return (faiss.IO_FLAG_MMAP if ivf else faiss.IO_FLAG_MMAP_IFC) | faiss.IO_FLAG_READ_ONLY
+
+
+def load_index(directory: str, embeddings, mapped: bool = True) -> FAISS:
+    """
+    Load a store written by save_index. With mapped=True vectors and text stay
+    on disk and are paged in as queries touch them, using the quantized index
+    when there is one; use mapped=False for a private in-memory copy that can
+    be modified.
+    """
+    if os.path.exists(os.path.join(directory, LEGACY_PICKLE_FILE)):
+        # Pre-mmap format, only read so it can be rewritten in the new one
+        return FAISS.load_local(directory, embeddings, allow_dangerous_deserialization=True)
+
+    path = os.path.join(directory, VECTORS_FILE)
+    if mapped and os.path.exists(os.path.join(directory, QUANTIZED_FILE)):
+        path = os.path.join(directory, QUANTIZED_FILE)
+    index = faiss.read_index(path, _mmap_flags(path) if mapped else 0)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = IVF_NPROBE
+
+    with open(os.path.join(directory, IDS_FILE)) as f:
+        ids = json.load(f)
+    if mapped:
+        docstore = OffsetDocstore(directory, ids)
+    else:
+        mapped_docstore = OffsetDocstore(directory, ids)
+        docstore = InMemoryDocstore({chunk_id: mapped_docstore.search(chunk_id) for chunk_id in ids})
+
+    store = FAISS(embeddings, index, docstore, dict(enumerate(ids)))
+    store.mapped = mapped
+    return store
+
+
+def is_legacy_format(directory: str) -> bool:
+    return os.path.exists(os.path.join(directory, LEGACY_PICKLE_FILE))
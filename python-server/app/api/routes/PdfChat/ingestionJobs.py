@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any, Callable, Optional
+
+from .helper import get_embeddings, get_page_chunks
+from .userIndex import add_documents
+from app.api.services.pdfExtractor import extract_pdf_pages
+from app.api.services.logger import request_id
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = {"done", "failed"}
+
+
+class IngestionQueueFull(Exception):
+    """Raised by submit when the parse stage already has max_queued jobs waiting."""
+
+
+class IngestionJob:
+    def __init__(self, user_id: str, files: list[tuple[str, bytes]]):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.files = files
+        self.status = "queued"
+        self.stage_progress: dict[str, float] = {}
+        self.error: Optional[str] = None
+        self.documents: list[dict] = []
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        # Id of the upload request, so the pipeline's log lines can be tied back to it
+        self.request_id = request_id.get()
+        self._listeners: set[asyncio.Queue] = set()
+        # Stage outputs handed to the next stage
+        self.pages: list[tuple[str, list[str]]] = []
+        self.chunks: list[tuple[str, list]] = []
+        self.vectors: list[list[float]] = []
+
+    def snapshot(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "files": [filename for filename, _ in self.files],
+            "progress": self.stage_progress,
+            "documents": self.documents,
+            "error": self.error,
+        }
+
+    def publish(self) -> None:
+        event = self.snapshot()
+        for listener in self._listeners:
+            listener.put_nowait(event)
+
+    def subscribe(self) -> asyncio.Queue:
+        listener: asyncio.Queue = asyncio.Queue()
+        self._listeners.add(listener)
+        listener.put_nowait(self.snapshot())
+        return listener
+
+    def unsubscribe(self, listener: asyncio.Queue) -> None:
+        self._listeners.discard(listener)
+
+
+class IngestionQueue:
+    """
+    In-process ingestion pipeline. Each stage (parse, chunk, embed, index) has
+    its own queue and workers, so different uploads overlap: one job can be
+    embedding while the next is still being parsed. Each stage queue holds
+    at most max_queued jobs (0 for no limit); a full parse queue rejects new
+    uploads, and a full later queue holds the previous stage back.
+    """
+
+    def __init__(self, workers: int = 2, retention_seconds: float = 3600, max_queued: int = 32,
+                 on_indexed: Optional[Callable[[str, Optional[str], Any], None]] = None,
+                 loaded_index: Optional[Callable[[str], Optional[tuple[str, Any]]]] = None):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.retention_seconds = retention_seconds
+        self.on_indexed = on_indexed
+        # The (version, index) already in memory for a user, which the new chunks are appended to
+        self.loaded_index = loaded_index
+        self.jobs: dict[str, IngestionJob] = {}
+        self._stages = [
+            ("parsing", self._parse),
+            ("chunking", self._chunk),
+            ("embedding", self._embed),
+            ("indexing", self._index),
+        ]
+        self._queues: list[asyncio.Queue] = []
+        self._tasks: list[asyncio.Task] = []
+
+    @property
+    def started(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self) -> None:
+        if self.started:
+            return
+        self._queues = [asyncio.Queue(maxsize=self.max_queued) for _ in self._stages]
+        for position in range(len(self._stages)):
+            for _ in range(self.workers):
+                self._tasks.append(asyncio.create_task(self._run_stage(position)))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, user_id: str, files: list[tuple[str, bytes]]) -> IngestionJob:
+        if not self.started:
+            await self.start()
+        self._prune()
+        job = IngestionJob(user_id, files)
+        try:
+            # Queued jobs hold the raw upload bytes, so a burst is turned away rather than buffered
+            self._queues[0].put_nowait(job)
+        except asyncio.QueueFull:
+            raise IngestionQueueFull(f"{self.max_queued} uploads are already waiting to be processed")
+        self.jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        return self.jobs.get(job_id)
+
+    def stats(self) -> dict:
+        return {
+            "workers_per_stage": self.workers,
+            "max_queued": self.max_queued,
+            "queue_depths": {name: queue.qsize() for (name, _), queue in zip(self._stages, self._queues)},
+            "jobs": len(self.jobs),
+        }
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.retention_seconds
+        for job_id in [job_id for job_id, job in self.jobs.items()
+                       if job.finished_at is not None and job.finished_at < cutoff]:
+            del self.jobs[job_id]
+
+    async def _run_stage(self, position: int) -> None:
+        name, handler = self._stages[position]
+        queue = self._queues[position]
+        while True:
+            job = await queue.get()
+            context = request_id.set(job.request_id)
+            try:
+                job.status = name
+                job.stage_progress[name] = 0.0
+                job.publish()
+                await handler(job)
+                job.stage_progress[name] = 1.0
+                if position + 1 < len(self._stages):
+                    await self._queues[position + 1].put(job)
+                else:
+                    job.status = "done"
+                    job.finished_at = time.time()
+                    job.publish()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ingestion job {job.id} failed while {name}: {e}")
+                job.status = "failed"
+                job.error = str(e)
+                job.finished_at = time.time()
+                job.publish()
+            finally:
+                request_id.reset(context)
+                queue.task_done()
+
+    async def _parse(self, job: IngestionJob) -> None:
+        for done, (filename, data) in enumerate(job.files, start=1):
+            job.pages.append((filename, await extract_pdf_pages(data)))
+            job.stage_progress["parsing"] = done / len(job.files)
+            job.publish()
+        # Raw bytes are no longer needed once the text is out
+        job.files = [(filename, b"") for filename, _ in job.files]
+
+    async def _chunk(self, job: IngestionJob) -> None:
+        # Splitting a long document is CPU work; keep it off the event loop
+        job.chunks = [(filename, await asyncio.to_thread(get_page_chunks, pages, filename)) for filename, pages in job.pages]
+        job.pages = []
+
+    async def _embed(self, job: IngestionJob) -> None:
+        texts = [chunk.page_content for _, chunks in job.chunks for chunk in chunks]
+        embeddings = get_embeddings()
+        # Embed in slices so progress can be reported on long documents; the shared
+        # dispatcher regroups slices from concurrent jobs into provider-sized batches
+        step = 64
+        for start in range(0, len(texts), step):
+            job.vectors.extend(await asyncio.to_thread(embeddings.embed_documents, texts[start:start + step]))
+            job.stage_progress["embedding"] = min(1.0, (start + step) / len(texts))
+            job.publish()
+
+    async def _index(self, job: IngestionJob) -> None:
+        loaded = self.loaded_index(job.user_id) if self.loaded_index is not None else None
+        store, version, added = await asyncio.to_thread(add_documents, job.user_id, job.chunks, job.vectors, loaded)
+        job.documents = [{"document_id": d["document_id"], "filename": d["filename"]} for d in added]
+        job.chunks = []
+        job.vectors = []
+        if self.on_indexed is not None and added:
+            self.on_indexed(job.user_id, version, store)
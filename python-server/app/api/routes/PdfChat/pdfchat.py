@@ -1,54 +1,214 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse
 from typing import List
+import asyncio
+import json
 import os
 
-from .helper import get_pdf_text, get_text_chunks, get_vector_store, get_conversational_chain
+from .helper import apply_context_budget, get_conversational_chain, get_embeddings, get_embedding_dispatcher, RETRIEVAL_K, RERANK_K
+from .userIndex import index_version, load_user_index, delete_document, list_documents, compact_index
+from .indexCache import IndexCache
+from .answerCache import AnswerCache
+from .embeddingCache import CachedEmbeddings
+from .ingestionJobs import IngestionQueue, IngestionQueueFull, TERMINAL_STATUSES
 from app.api.middlewares import authUser
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_community.vectorstores import FAISS
+from app.api.services.uploads import read_upload, UploadRejected
 
 router = APIRouter()
 
-# Upload PDF files and store embeddings in FAISS
-@router.post("/upload-pdfs")
-async def upload_pdfs(request: Request, files: List[UploadFile] = File(...)):
-    user = authUser.authenticateUser(request.cookies.get("refreshToken"))
-    pdf_docs = [pdf.file for pdf in files]
-    
-    raw_text = get_pdf_text(pdf_docs)
-    text_chunks = get_text_chunks(raw_text)
-    get_vector_store(text_chunks, user["id"])
-    
-    return {"message": "PDFs processed and vector store created successfully."}
-
-# Ask a question based on the latest uploaded PDFs
-@router.get("/ask-question")
-async def ask_question(request: Request, question: str):
-    user = authUser.authenticateUser(request.cookies.get("refreshToken"))
-    embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
+# Per-file limit and files per request for PDF chat uploads
+PDF_CHAT_UPLOAD_MAX_BYTES = int(float(os.getenv("PDF_CHAT_UPLOAD_MAX_MB", "20")) * 1024 * 1024)
+PDF_CHAT_UPLOAD_MAX_FILES = int(os.getenv("PDF_CHAT_UPLOAD_MAX_FILES", "10"))
 
-    user_directory = os.path.join("faissDatabase", user["id"])
-    if not os.path.exists(user_directory):
-        raise HTTPException(status_code=404, detail="User ID not found")
+# Loaded FAISS indexes, reused across questions until the user's index changes
+index_cache = IndexCache(
+    resolve_version=index_version,
+    loader=load_user_index,
+    max_bytes=int(os.getenv("PDF_CHAT_INDEX_CACHE_MB", "512")) * 1024 * 1024,
+    revalidate_seconds=float(os.getenv("PDF_CHAT_INDEX_REVALIDATE_SECONDS", "30"))
+)
 
-    subdirectories = sorted(
-        [d for d in os.listdir(user_directory) if os.path.isdir(os.path.join(user_directory, d))],
-        reverse=True
-    )
-    if not subdirectories:
+# Answers to repeat questions, dropped whenever the user's index version changes
+answer_cache = AnswerCache(
+    max_entries_per_index=int(os.getenv("PDF_CHAT_ANSWER_CACHE_ENTRIES", "64")),
+    ttl_seconds=float(os.getenv("PDF_CHAT_ANSWER_CACHE_TTL", "3600")),
+    similarity_threshold=float(os.getenv("PDF_CHAT_ANSWER_SIMILARITY", "0"))
+)
+
+# Swap in a freshly written index; answers given against the old one no longer apply
+def install_index(user_id, version, store):
+    index_cache.put(user_id, version, store)
+    answer_cache.invalidate(user_id)
+
+# Background parse -> chunk -> embed -> index pipeline for uploads
+ingestion_queue = IngestionQueue(
+    workers=int(os.getenv("PDF_CHAT_INGEST_WORKERS", "2")),
+    # Jobs waiting per stage before new uploads are refused with 503
+    max_queued=int(os.getenv("PDF_CHAT_INGEST_QUEUE_SIZE", "32")),
+    on_indexed=install_index,
+    loaded_index=index_cache.loaded
+)
+
+# Upload PDF files; ingestion runs in the background and the job id is returned right away
+@router.post("/upload-pdfs", status_code=202)
+async def upload_pdfs(files: List[UploadFile] = File(...), user: dict = Depends(authUser.current_user)):
+    if len(files) > PDF_CHAT_UPLOAD_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {PDF_CHAT_UPLOAD_MAX_FILES} files can be uploaded at once")
+    try:
+        pdf_files = [(pdf.filename, await read_upload(pdf, "pdf", max_bytes=PDF_CHAT_UPLOAD_MAX_BYTES)) for pdf in files]
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    try:
+        job = await ingestion_queue.submit(user["id"], pdf_files)
+    except IngestionQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    return {
+        "message": "PDFs queued for processing.",
+        "job_id": job.id,
+        "status": job.status
+    }
+
+# Current state of an ingestion job
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str, user: dict = Depends(authUser.current_user)):
+    job = ingestion_queue.get(job_id)
+    if job is None or job.user_id != user["id"]:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.snapshot()
+
+# Push ingestion progress to the client until the job finishes
+@router.websocket("/jobs/{job_id}/ws")
+async def job_progress(websocket: WebSocket, job_id: str):
+    try:
+        user = authUser.authenticateUser(websocket.cookies.get("refreshToken"))
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+    job = ingestion_queue.get(job_id)
+    if job is None or job.user_id != user["id"]:
+        await websocket.close(code=1008)
+        return
+
+    await websocket.accept()
+    listener = job.subscribe()
+    try:
+        while True:
+            event = await listener.get()
+            await websocket.send_json(event)
+            if event["status"] in TERMINAL_STATUSES:
+                break
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        job.unsubscribe(listener)
+
+# List the documents in the user's index
+@router.get("/documents")
+async def get_documents(user: dict = Depends(authUser.current_user)):
+    documents = await asyncio.to_thread(list_documents, user["id"])
+    return {"documents": documents}
+
+# Remove one document from the user's index
+@router.delete("/documents/{document_id}")
+async def remove_document(document_id: str, user: dict = Depends(authUser.current_user)):
+    found, store, version = await asyncio.to_thread(delete_document, user["id"], document_id)
+    if not found:
+        raise HTTPException(status_code=404, detail="Document not found")
+    install_index(user["id"], version, store)
+    return {"message": "Document deleted successfully."}
+
+# Merge old per-upload indexes and reclaim space in the user's index
+@router.post("/compact")
+async def compact(user: dict = Depends(authUser.current_user)):
+    store, version, stats = await asyncio.to_thread(compact_index, user["id"])
+    install_index(user["id"], version, store)
+    return stats
+
+# Load the user's index and check for a cached answer to the question.
+# The question embedding is only computed when semantic matching is on; it
+# lands in the embedding cache, so retrieval reuses it on a miss.
+async def lookup_answer(user_id, question):
+    hybrid_index = await index_cache.get(user_id)
+    if hybrid_index is None:
         raise HTTPException(status_code=404, detail="No vector stores found for the user")
+    version = index_cache.version(user_id)
+    vector = None
+    if answer_cache.semantic:
+        vector = await asyncio.to_thread(get_embeddings().embed_query, question)
+    return hybrid_index, version, vector, answer_cache.get(user_id, version, question, vector)
 
-    latest_subdirectory = subdirectories[0]
-    index_path = os.path.join(user_directory, latest_subdirectory, "faiss_index")
+# Retrieve the chunks relevant to a question: vector and BM25 candidates, fused and re-ranked locally
+async def retrieve_documents(hybrid_index, question):
+    docs = await asyncio.to_thread(hybrid_index.search, question, RERANK_K, RETRIEVAL_K)
+    return apply_context_budget(docs)
 
-    vector_store = FAISS.load_local(index_path, embeddings, allow_dangerous_deserialization=True)
-    docs = vector_store.similarity_search(question)
+# Ask a question across all of the user's uploaded PDFs
+@router.get("/ask-question")
+async def ask_question(question: str, user: dict = Depends(authUser.current_user)):
+    hybrid_index, version, vector, answer = await lookup_answer(user["id"], question)
+    if answer is not None:
+        return JSONResponse(content={"reply": answer, "cached": True})
 
+    docs = await retrieve_documents(hybrid_index, question)
     chain = get_conversational_chain()
-    response = chain.invoke({
+    response = await chain.ainvoke({
         "input_documents": docs,
         "question": question
     })
+    answer_cache.set(user["id"], version, question, response.content, vector)
+
+    return JSONResponse(content={"reply": response.content, "cached": False})
+
+# Same as ask-question, but streams the answer as Server-Sent Events while the model generates it
+@router.get("/ask-question/stream")
+async def ask_question_stream(request: Request, question: str, user: dict = Depends(authUser.current_user)):
+    hybrid_index, version, vector, answer = await lookup_answer(user["id"], question)
 
-    return JSONResponse(content={"reply": response})
+    async def cached_stream():
+        yield f"data: {json.dumps({'token': answer})}\n\n"
+        yield f"event: done\ndata: {json.dumps({'cached': True})}\n\n"
+
+    if answer is not None:
+        return StreamingResponse(
+            cached_stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    docs = await retrieve_documents(hybrid_index, question)
+    chain = get_conversational_chain()
+
+    async def event_stream():
+        tokens = []
+        try:
+            # Leaving the loop closes the model stream, which cancels generation
+            async for chunk in chain.astream({"input_documents": docs, "question": question}):
+                if await request.is_disconnected():
+                    return
+                if chunk.content:
+                    tokens.append(chunk.content)
+                    yield f"data: {json.dumps({'token': chunk.content})}\n\n"
+            # Only complete answers are cached
+            answer_cache.set(user["id"], version, question, "".join(tokens), vector)
+            yield f"event: done\ndata: {json.dumps({'cached': False})}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Loaded index and embedding cache usage
+@router.get("/index-cache-stats")
+async def index_cache_stats():
+    embeddings = get_embeddings()
+    return JSONResponse(content={
+        "indexes": index_cache.stats(),
+        "answers": answer_cache.stats(),
+        "ingestion": ingestion_queue.stats(),
+        "embeddings": embeddings.stats() if isinstance(embeddings, CachedEmbeddings) else None,
+        "embedding_requests": get_embedding_dispatcher().stats()
+    })
@@ -0,0 +1,175 @@
+import json
+import logging
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Optional
+
+from langchain_core.documents import Document
+
+BM25_FILE = "bm25.json"
+
+logger = logging.getLogger(__name__)
+
+# Keeps terms like "c++", "node.js", "2021-2023" and "b.e" intact
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.+#\-/][a-z0-9+#]+)*\+*")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "did", "do", "does", "for", "from", "how", "in",
+    "is", "it", "of", "on", "or", "that", "the", "this", "to", "was", "what", "when", "where", "which",
+    "who", "why", "with", "list", "listed", "mentioned", "tell", "me", "about", "any", "there",
+}
+
+
+def tokenize(text: str) -> list[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """Inverted index over chunk ids with Okapi BM25 scoring."""
+
+    def __init__(self, ids: list[str], lengths: list[int], postings: dict[str, list[list[int]]],
+                 k1: float = 1.5, b: float = 0.75):
+        self.ids = ids
+        self.lengths = lengths
+        self.postings = postings
+        self.k1 = k1
+        self.b = b
+        self.average_length = sum(lengths) / len(lengths) if lengths else 0.0
+
+    @classmethod
+    def build(cls, chunks: dict[str, str]) -> "BM25Index":
+        ids, lengths = [], []
+        postings: dict[str, list[list[int]]] = defaultdict(list)
+        for position, (chunk_id, text) in enumerate(chunks.items()):
+            tokens = tokenize(text)
+            ids.append(chunk_id)
+            lengths.append(len(tokens))
+            for term, frequency in Counter(tokens).items():
+                postings[term].append([position, frequency])
+        return cls(ids, lengths, dict(postings))
+
+    @classmethod
+    def merge(cls, indexes: list["BM25Index"]) -> "BM25Index":
+        """One index over the chunks of several, in order, as if built from all of them at once."""
+        if len(indexes) == 1:
+            return indexes[0]
+        ids, lengths = [], []
+        postings: dict[str, list[list[int]]] = defaultdict(list)
+        for index in indexes:
+            offset = len(ids)
+            ids.extend(index.ids)
+            lengths.extend(index.lengths)
+            for term, term_postings in index.postings.items():
+                postings[term].extend([position + offset, frequency] for position, frequency in term_postings)
+        return cls(ids, lengths, dict(postings))
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["BM25Index"]:
+        try:
+            with open(os.path.join(directory, BM25_FILE)) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        return cls(data["ids"], data["lengths"], data["postings"])
+
+    def save(self, directory: str) -> None:
+        with open(os.path.join(directory, BM25_FILE), "w") as f:
+            json.dump({"ids": self.ids, "lengths": self.lengths, "postings": self.postings}, f)
+
+    def search(self, query: str, k: int) -> list[tuple[str, float]]:
+        count = len(self.ids)
+        if not count:
+            return []
+        scores: dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for position, frequency in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[position] / (self.average_length or 1))
+                scores[position] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.ids[position], score) for position, score in best]
+
+    def size_bytes(self) -> int:
+        return sum(len(term) + 16 * len(postings) for term, postings in self.postings.items()) + 64 * len(self.ids)
+
+
+def rerank(question: str, docs: list[Document], fused_scores: list[float], k: int) -> list[Document]:
+    """
+    Cheap local re-ranker: blends the fused retrieval score with how many of the
+    question's terms the chunk actually contains, plus a bonus for exact phrases.
+    """
+    terms = set(tokenize(question))
+    phrase = " ".join(tokenize(question))
+    top_fused = max(fused_scores) if fused_scores else 1.0
+    scored = []
+    for doc, fused in zip(docs, fused_scores):
+        chunk_terms = set(tokenize(doc.page_content))
+        coverage = len(terms & chunk_terms) / len(terms) if terms else 0.0
+        phrase_bonus = 1.0 if len(terms) > 1 and phrase in " ".join(tokenize(doc.page_content)) else 0.0
+        scored.append((0.5 * fused / top_fused + 0.4 * coverage + 0.1 * phrase_bonus, doc))
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return [doc for _, doc in scored[:k]]
+
+
+class HybridIndex:
+    """A user's FAISS store together with the BM25 index over the same chunks."""
+
+    def __init__(self, vector_store, bm25: BM25Index):
+        self.vector_store = vector_store
+        self.bm25 = bm25
+
+    @classmethod
+    def from_store(cls, vector_store) -> "HybridIndex":
+        chunks = {chunk_id: vector_store.docstore.search(chunk_id).page_content
+                  for chunk_id in vector_store.index_to_docstore_id.values()}
+        return cls(vector_store, BM25Index.build(chunks))
+
+    # Same shape as a FAISS store for memory accounting
+    @property
+    def index(self):
+        return self.vector_store.index
+
+    @property
+    def docstore(self):
+        return self.vector_store.docstore
+
+    def resident_bytes(self) -> int:
+        """Memory held in-process; memory-mapped vectors and text are left to the page cache."""
+        size = self.bm25.size_bytes()
+        store = self.vector_store
+        if getattr(store, "mapped", False):
+            return size + store.docstore.resident_bytes()
+        size += store.index.ntotal * store.index.d * 4
+        for doc in getattr(store.docstore, "_dict", {}).values():
+            size += len(doc.page_content)
+        return size
+
+    def search(self, question: str, k: int, candidates: int = 20, rrf_k: int = 60) -> list[Document]:
+        vector_hits = self.vector_store.similarity_search(question, k=candidates)
+        keyword_hits = self.bm25.search(question, candidates)
+
+        # Reciprocal rank fusion: robust to the two retrievers' very different score scales
+        # keyed on chunk id: distinct chunks with the same text must stay separate candidates
+        fused: dict[str, float] = defaultdict(float)
+        docs: dict[str, Document] = {}
+        for rank, doc in enumerate(vector_hits):
+            if doc.id is None:
+                # Left by indexes written before chunks carried their id; still answerable from the rest
+                logger.warning("Skipping retrieved chunk without an id")
+                continue
+            fused[doc.id] += 1 / (rrf_k + rank + 1)
+            docs[doc.id] = doc
+        for rank, (chunk_id, _) in enumerate(keyword_hits):
+            doc = docs.get(chunk_id) or self.vector_store.docstore.search(chunk_id)
+            if not isinstance(doc, Document):
+                continue
+            fused[chunk_id] += 1 / (rrf_k + rank + 1)
+            docs[chunk_id] = doc
+
+        keys = list(fused)
+        return rerank(question, [docs[key] for key in keys], [fused[key] for key in keys], k)
@@ -0,0 +1,58 @@
+from app.api.routes.PdfChat import answerCache
+from app.api.routes.PdfChat.answerCache import AnswerCache, question_key
+
+
+def test_questions_match_after_normalizing_case_and_spacing():
+    assert question_key("What  is their  GPA?") == question_key("what is their gpa")
+    assert question_key("what is their gpa") != question_key("what was their gpa")
+
+
+def test_answer_is_served_for_the_same_index_version():
+    cache = AnswerCache()
+    cache.set("u1", "v1", "What is their GPA?", "3.8")
+
+    assert cache.get("u1", "v1", "what is their gpa") == "3.8"
+    assert cache.get("u1", "v1", "where did they study") is None
+    assert cache.get("u2", "v1", "what is their gpa") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+
+
+def test_new_index_version_drops_every_answer():
+    cache = AnswerCache()
+    cache.set("u1", "v1", "what is their gpa", "3.8")
+
+    assert cache.get("u1", "v2", "what is their gpa") is None
+    assert cache.get("u1", "v1", "what is their gpa") is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_answers_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answerCache.time, "time", lambda: now[0])
+    cache = AnswerCache(ttl_seconds=10)
+    cache.set("u1", "v1", "what is their gpa", "3.8")
+
+    now[0] += 11
+    assert cache.get("u1", "v1", "what is their gpa") is None
+
+
+def test_oldest_answers_and_indexes_are_evicted():
+    cache = AnswerCache(max_indexes=2, max_entries_per_index=2)
+    for question in ("one", "two", "three"):
+        cache.set("u1", "v1", question, question)
+    cache.set("u2", "v1", "q", "a")
+    cache.set("u3", "v1", "q", "a")
+
+    assert cache.stats()["indexes"] == 2
+    assert cache.get("u1", "v1", "one") is None
+    assert cache.get("u3", "v1", "q") == "a"
+
+
+def test_similar_question_is_served_above_threshold():
+    cache = AnswerCache(similarity_threshold=0.95)
+    cache.set("u1", "v1", "what is their gpa", "3.8", vector=[1.0, 0.0])
+
+    assert cache.get("u1", "v1", "what grade average did they get", vector=[0.99, 0.05]) == "3.8"
+    assert cache.get("u1", "v1", "where do they live", vector=[0.0, 1.0]) is None
+    assert cache.stats()["semantic_hits"] == 1
@@ -0,0 +1,79 @@
+from langchain_core.embeddings import Embeddings
+
+from app.api.routes.PdfChat.embeddingCache import CachedEmbeddings, EmbeddingStore, embedding_key, store_directory
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self):
+        self.embedded: list[str] = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(text)), 1.0, 0.0] for text in texts]
+
+    def embed_query(self, text):
+        self.embedded.append(text)
+        return [float(len(text)), 0.0, 1.0]
+
+
+def test_only_unseen_texts_reach_the_model(tmp_path):
+    model = CountingEmbeddings()
+    cached = CachedEmbeddings(model, "test-model", EmbeddingStore(str(tmp_path)))
+
+    first = cached.embed_documents(["alpha", "beta", "alpha"])
+    second = cached.embed_documents(["beta", "gamma"])
+
+    assert first == [[5.0, 1.0, 0.0], [4.0, 1.0, 0.0], [5.0, 1.0, 0.0]]
+    assert second == [[4.0, 1.0, 0.0], [5.0, 1.0, 0.0]]
+    assert model.embedded == ["alpha", "beta", "gamma"]
+    stats = cached.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 3, 3)
+
+
+def test_queries_and_documents_are_cached_separately(tmp_path):
+    model = CountingEmbeddings()
+    cached = CachedEmbeddings(model, "test-model", EmbeddingStore(str(tmp_path)))
+
+    cached.embed_documents(["alpha"])
+    assert cached.embed_query("alpha") == [5.0, 0.0, 1.0]
+    assert cached.embed_query("alpha") == [5.0, 0.0, 1.0]
+    assert model.embedded == ["alpha", "alpha"]
+    assert embedding_key("m", "query", "x") != embedding_key("m", "document", "x")
+
+
+def test_full_store_evicts_a_tenth_least_recently_used_first(tmp_path):
+    store = EmbeddingStore(str(tmp_path), max_entries=20)
+    store.put_many({f"key-{i}": [float(i), 0.0] for i in range(20)})
+    for i in range(19, 1, -1):
+        # Touch everything except key-0 and key-1, newest first so key-19 ends up oldest of these
+        store.get_many([f"key-{i}"])
+
+    store.put_many({"new": [1.0, 1.0]})
+
+    assert len(store) == 19
+    assert store.get_many(["key-0", "key-1"]) == {}
+    assert store.get_many(["key-2", "new"]) == {"key-2": [2.0, 0.0], "new": [1.0, 1.0]}
+
+
+def test_reopened_store_keeps_its_vectors(tmp_path):
+    store = EmbeddingStore(str(tmp_path), max_entries=10)
+    store.put_many({"a": [1.0, 2.0], "b": [3.0, 4.0]})
+
+    reopened = EmbeddingStore(str(tmp_path), max_entries=10)
+    assert len(reopened) == 2
+    assert reopened.get_many(["a", "b"]) == {"a": [1.0, 2.0], "b": [3.0, 4.0]}
+    # Slots in use aren't handed out again
+    reopened.put_many({"c": [5.0, 6.0]})
+    assert reopened.get_many(["a", "c"]) == {"a": [1.0, 2.0], "c": [5.0, 6.0]}
+
+
+def test_vectors_of_another_dimension_are_ignored(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    store.put_many({"a": [1.0, 2.0]})
+    store.put_many({"b": [1.0, 2.0, 3.0]})
+
+    assert len(store) == 1
+
+
+def test_store_directory_is_safe_for_model_names(tmp_path):
+    assert store_directory("root", "org/model:v1") == "root/org_model_v1"
@@ -0,0 +1,117 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from app.api.routes.PdfChat.embeddingDispatcher import DispatchingEmbeddings, TokenBucket, is_transient
+
+
+class RecordingEmbeddings(Embeddings):
+    def __init__(self, failures=(), drop=0):
+        self.calls: list[list[str]] = []
+        self.failures = list(failures)
+        self.drop = drop
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.calls.append(list(texts))
+            if self.failures:
+                raise self.failures.pop(0)
+        vectors = [[float(len(text)), 1.0] for text in texts]
+        return vectors[:len(vectors) - self.drop]
+
+    def embed_query(self, text):
+        return [float(len(text)), 1.0]
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+def dispatcher(embeddings, **kwargs):
+    options = {"requests_per_minute": 60000, "backoff_base": 0.001, "backoff_cap": 0.01, "max_wait": 0.02}
+    options.update(kwargs)
+    return DispatchingEmbeddings(embeddings, **options)
+
+
+def test_token_bucket_allows_burst_then_waits():
+    bucket = TokenBucket(rate=20, capacity=2)
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == 0
+    started = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - started >= 0.04
+
+
+def test_concurrent_callers_are_coalesced_into_batches():
+    embeddings = RecordingEmbeddings()
+    front = dispatcher(embeddings, batch_size=100, max_wait=0.1)
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        results = list(pool.map(lambda i: front.embed_documents([f"text {i}", f"more {i}"]), range(5)))
+
+    assert results[0] == [[6.0, 1.0], [6.0, 1.0]]
+    assert sum(len(call) for call in embeddings.calls) == 10
+    assert len(embeddings.calls) < 5
+
+
+def test_batches_are_capped_at_batch_size():
+    embeddings = RecordingEmbeddings()
+    front = dispatcher(embeddings, batch_size=3)
+
+    vectors = front.embed_documents([str(i) for i in range(7)])
+
+    assert len(vectors) == 7
+    assert max(len(call) for call in embeddings.calls) <= 3
+
+
+def test_short_provider_response_fails_every_caller():
+    front = dispatcher(RecordingEmbeddings(drop=1))
+
+    with pytest.raises(ValueError):
+        front.embed_documents(["a", "b", "c"])
+
+
+def test_transient_errors_are_retried():
+    embeddings = RecordingEmbeddings(failures=[StatusError(429), TimeoutError("slow")])
+    front = dispatcher(embeddings)
+
+    assert front.embed_documents(["abc"]) == [[3.0, 1.0]]
+    assert front.stats()["retries"] == 2
+
+
+def test_client_errors_fail_without_retrying():
+    embeddings = RecordingEmbeddings(failures=[StatusError(401)])
+    front = dispatcher(embeddings)
+
+    with pytest.raises(StatusError):
+        front.embed_documents(["abc"])
+    assert len(embeddings.calls) == 1
+    assert front.stats()["failures"] == 1
+
+
+def test_retries_give_up_after_max_retries():
+    embeddings = RecordingEmbeddings(failures=[StatusError(503)] * 3)
+    front = dispatcher(embeddings, max_retries=2)
+
+    with pytest.raises(StatusError):
+        front.embed_documents(["abc"])
+    assert len(embeddings.calls) == 3
+
+
+def test_is_transient_follows_wrapped_causes():
+    try:
+        try:
+            raise ConnectionError("reset")
+        except ConnectionError as e:
+            raise RuntimeError("provider call failed") from e
+    except RuntimeError as wrapped:
+        assert is_transient(wrapped)
+    assert not is_transient(ValueError("bad input"))
+    assert is_transient(StatusError(500))
+    assert not is_transient(StatusError(400))
@@ -0,0 +1,84 @@
+import asyncio
+
+from app.api.routes.PdfChat.indexCache import IndexCache
+
+
+class FakeStore:
+    def __init__(self, name: str, size: int):
+        self.name = name
+        self.size = size
+
+    def resident_bytes(self) -> int:
+        return self.size
+
+
+def make_cache(versions: dict, max_bytes: int = 100, revalidate_seconds: float = 30):
+    loads = []
+
+    def loader(user_id, version):
+        loads.append((user_id, version))
+        return FakeStore(f"{user_id}@{version}", 40)
+
+    cache = IndexCache(versions.get, loader, max_bytes=max_bytes, revalidate_seconds=revalidate_seconds)
+    return cache, loads
+
+
+def test_store_is_loaded_once_then_served_from_memory():
+    cache, loads = make_cache({"u1": "v1"})
+
+    async def run():
+        first = await cache.get("u1")
+        second = await cache.get("u1")
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first is second
+    assert loads == [("u1", "v1")]
+    assert cache.stats()["hits"] == 1
+
+
+def test_new_version_is_loaded_after_invalidate():
+    versions = {"u1": "v1"}
+    cache, loads = make_cache(versions)
+
+    async def run():
+        await cache.get("u1")
+        versions["u1"] = "v2"
+        cache.invalidate("u1")
+        return await cache.get("u1")
+
+    assert asyncio.run(run()).name == "u1@v2"
+    assert cache.loaded("u1")[0] == "v2"
+
+
+def test_least_recently_used_store_is_evicted_over_budget():
+    cache, _ = make_cache({"u1": "v1", "u2": "v1", "u3": "v1"})
+
+    async def run():
+        for user_id in ("u1", "u2", "u1", "u3"):
+            await cache.get(user_id)
+
+    asyncio.run(run())
+    assert cache.version("u1") == "v1"
+    assert cache.version("u2") is None
+    assert cache.stats()["bytes"] <= 100
+
+
+def test_user_without_an_index_is_dropped():
+    versions = {"u1": "v1"}
+    cache, _ = make_cache(versions, revalidate_seconds=0)
+
+    async def run():
+        await cache.get("u1")
+        del versions["u1"]
+        return await cache.get("u1")
+
+    assert asyncio.run(run()) is None
+    assert cache.loaded("u1") is None
+
+
+def test_load_locks_are_released_after_use():
+    cache, _ = make_cache({"u1": "v1"})
+    asyncio.run(cache.get("u1"))
+
+    assert "u1" not in cache._locks
@@ -0,0 +1,68 @@
+import faiss
+import numpy as np
+import pytest
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from app.api.routes.PdfChat import indexStorage
+from app.api.routes.PdfChat.indexStorage import QUANTIZED_FILE, load_index, save_index
+
+DIM = 16
+
+
+def make_store(count: int) -> FAISS:
+    embeddings = DeterministicFakeEmbedding(size=DIM)
+    texts = [f"chunk {i}" for i in range(count)]
+    return FAISS.from_texts(texts, embeddings, ids=[f"id-{i}" for i in range(count)])
+
+
+def test_round_trip_keeps_vectors_and_text(tmp_path):
+    store = make_store(10)
+    save_index(store, str(tmp_path))
+
+    loaded = load_index(str(tmp_path), store.embeddings, mapped=True)
+    assert loaded.index.ntotal == 10
+    assert loaded.docstore.search("id-3").page_content == "chunk 3"
+    assert loaded.similarity_search("chunk 7", k=1)[0].page_content == "chunk 7"
+
+
+def test_small_index_is_not_quantized_below_training_minimum(tmp_path, monkeypatch):
+    monkeypatch.setattr(indexStorage, "QUANTIZE_MIN_VECTORS", 40)
+    save_index(make_store(60), str(tmp_path))
+
+    assert not (tmp_path / QUANTIZED_FILE).exists()
+
+
+def test_large_index_gets_quantized_copy(tmp_path, monkeypatch):
+    monkeypatch.setattr(indexStorage, "QUANTIZE_MIN_VECTORS", 40)
+    store = make_store(300)
+    save_index(store, str(tmp_path))
+
+    assert (tmp_path / QUANTIZED_FILE).exists()
+    loaded = load_index(str(tmp_path), store.embeddings, mapped=True)
+    assert faiss.try_extract_index_ivf(loaded.index) is not None
+    assert loaded.index.ntotal == 300
+
+
+def test_training_failure_keeps_flat_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(indexStorage, "QUANTIZE_MIN_VECTORS", 40)
+
+    def fail(index):
+        raise RuntimeError("training failed")
+    monkeypatch.setattr(indexStorage, "_quantize", fail)
+    store = make_store(300)
+    save_index(store, str(tmp_path))
+
+    assert not (tmp_path / QUANTIZED_FILE).exists()
+    loaded = load_index(str(tmp_path), store.embeddings, mapped=True)
+    assert isinstance(loaded.index, faiss.IndexFlat)
+    np.testing.assert_allclose(loaded.index.reconstruct(5), store.index.reconstruct(5))
+
+
+@pytest.mark.parametrize("mapped", [True, False])
+def test_mapped_and_private_loads_agree(tmp_path, mapped):
+    store = make_store(5)
+    save_index(store, str(tmp_path))
+
+    loaded = load_index(str(tmp_path), store.embeddings, mapped=mapped)
+    assert [loaded.index_to_docstore_id[i] for i in range(5)] == [f"id-{i}" for i in range(5)]
@@ -0,0 +1,158 @@
+import asyncio
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from app.api.routes.PdfChat import ingestionJobs, userIndex
+from app.api.routes.PdfChat.ingestionJobs import IngestionQueue, IngestionQueueFull
+from app.api.services.logger import request_id
+
+
+@pytest.fixture(autouse=True)
+def pipeline(tmp_path, monkeypatch):
+    embeddings = DeterministicFakeEmbedding(size=8)
+    monkeypatch.setattr(userIndex, "FAISS_ROOT", str(tmp_path))
+    monkeypatch.setattr(userIndex, "get_embeddings", lambda: embeddings)
+    monkeypatch.setattr(ingestionJobs, "get_embeddings", lambda: embeddings)
+
+    async def extract(data):
+        if data == b"broken":
+            raise ValueError("not a pdf")
+        return [data.decode()]
+    monkeypatch.setattr(ingestionJobs, "extract_pdf_pages", extract)
+
+
+async def finish(jobs, queue: IngestionQueue):
+    try:
+        for job in jobs:
+            events = job.subscribe()
+            while job.status not in ingestionJobs.TERMINAL_STATUSES:
+                await asyncio.wait_for(events.get(), timeout=10)
+    finally:
+        await queue.stop()
+    return jobs
+
+
+async def run_jobs(queue: IngestionQueue, uploads):
+    return await finish([await queue.submit(user_id, files) for user_id, files in uploads], queue)
+
+
+def test_upload_runs_through_every_stage_into_the_index():
+    indexed = []
+    queue = IngestionQueue(workers=1, on_indexed=lambda user_id, version, store: indexed.append((user_id, version)))
+
+    [job] = asyncio.run(run_jobs(queue, [("u1", [("a.pdf", b"alpha one"), ("b.pdf", b"bravo two")])]))
+
+    assert job.status == "done"
+    assert [d["filename"] for d in job.documents] == ["a.pdf", "b.pdf"]
+    assert set(job.stage_progress) == {"parsing", "chunking", "embedding", "indexing"}
+    assert all(progress == 1.0 for progress in job.stage_progress.values())
+    assert job.files == [("a.pdf", b""), ("b.pdf", b"")]
+    assert indexed == [("u1", userIndex.index_version("u1"))]
+    assert sorted(d["filename"] for d in userIndex.list_documents("u1")) == ["a.pdf", "b.pdf"]
+
+
+def test_failed_stage_marks_only_that_job_failed():
+    queue = IngestionQueue(workers=1)
+
+    broken, good = asyncio.run(run_jobs(queue, [("u1", [("bad.pdf", b"broken")]), ("u2", [("a.pdf", b"alpha")])]))
+
+    assert (broken.status, broken.error) == ("failed", "not a pdf")
+    assert broken.finished_at is not None
+    assert good.status == "done"
+    assert userIndex.index_version("u1") is None
+
+
+def test_empty_upload_does_not_reload_the_index():
+    indexed = []
+    queue = IngestionQueue(workers=1, on_indexed=lambda *args: indexed.append(args))
+
+    [job] = asyncio.run(run_jobs(queue, [("u1", [("blank.pdf", b"   ")])]))
+
+    assert job.status == "done"
+    assert job.documents == []
+    assert indexed == []
+
+
+def test_new_chunks_extend_the_loaded_index():
+    requested = []
+
+    def loaded(user_id):
+        requested.append(user_id)
+        return None
+    queue = IngestionQueue(workers=1, loaded_index=loaded)
+
+    asyncio.run(run_jobs(queue, [("u1", [("a.pdf", b"alpha")])]))
+
+    assert requested == ["u1"]
+
+
+def test_stage_workers_run_with_the_submitting_request_id(monkeypatch):
+    seen = []
+
+    async def extract(data):
+        seen.append(request_id.get())
+        return [data.decode()]
+    monkeypatch.setattr(ingestionJobs, "extract_pdf_pages", extract)
+    queue = IngestionQueue(workers=1)
+
+    async def scenario():
+        token = request_id.set("req-1")
+        try:
+            await run_jobs(queue, [("u1", [("a.pdf", b"alpha")])])
+        finally:
+            request_id.reset(token)
+
+    asyncio.run(scenario())
+    assert seen == ["req-1"]
+
+
+def test_finished_jobs_are_pruned_after_retention():
+    queue = IngestionQueue(workers=1, retention_seconds=0)
+
+    async def scenario():
+        [first] = await run_jobs(queue, [("u1", [("a.pdf", b"alpha")])])
+        second = await queue.submit("u1", [("b.pdf", b"bravo")])
+        await queue.stop()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert queue.get(first.id) is None
+    assert queue.get(second.id) is second
+
+
+def test_chunking_runs_off_the_event_loop(monkeypatch):
+    threads = []
+    to_thread = asyncio.to_thread
+
+    async def record(func, *args):
+        threads.append(func)
+        return await to_thread(func, *args)
+    monkeypatch.setattr(ingestionJobs.asyncio, "to_thread", record)
+
+    asyncio.run(run_jobs(IngestionQueue(workers=1), [("u1", [("a.pdf", b"alpha"), ("b.pdf", b"bravo")])]))
+
+    assert threads.count(ingestionJobs.get_page_chunks) == 2
+
+
+def test_upload_is_refused_once_the_parse_queue_is_full(monkeypatch):
+    release = asyncio.Event()
+
+    async def extract(data):
+        await release.wait()
+        return [data.decode()]
+    monkeypatch.setattr(ingestionJobs, "extract_pdf_pages", extract)
+    queue = IngestionQueue(workers=1, max_queued=1)
+
+    async def scenario():
+        parsing = await queue.submit("u1", [("a.pdf", b"alpha")])
+        await asyncio.sleep(0)
+        waiting = await queue.submit("u1", [("b.pdf", b"bravo")])
+        with pytest.raises(IngestionQueueFull):
+            await queue.submit("u1", [("c.pdf", b"charlie")])
+        assert len(queue.jobs) == 2
+        release.set()
+        return await finish([parsing, waiting], queue)
+
+    parsing, waiting = asyncio.run(scenario())
+    assert (parsing.status, waiting.status) == ("done", "done")
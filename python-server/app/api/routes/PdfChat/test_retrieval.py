@@ -0,0 +1,85 @@
+import logging
+
+import pytest
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from app.api.routes.PdfChat.retrieval import BM25Index, HybridIndex, rerank, tokenize
+
+CHUNKS = {
+    "doc:0": "Python developer with Django and FastAPI experience",
+    "doc:1": "Led a team of five C++ engineers on embedded systems",
+    "doc:2": "Education: B.E in computer science, 2016-2020",
+    "doc:3": "Hobbies include hiking and photography",
+}
+
+
+def make_store(chunks: dict[str, str]) -> FAISS:
+    return FAISS.from_texts(list(chunks.values()), DeterministicFakeEmbedding(size=16), ids=list(chunks))
+
+
+def test_tokenize_keeps_technical_terms_and_drops_stopwords():
+    assert tokenize("What is the C++ and Node.js experience in 2021-2023?") == ["c++", "node.js", "experience", "2021-2023"]
+
+
+def test_bm25_ranks_matching_chunks_first():
+    index = BM25Index.build(CHUNKS)
+
+    assert index.search("C++ engineers", 2)[0][0] == "doc:1"
+    assert [chunk_id for chunk_id, _ in index.search("django", 4)] == ["doc:0"]
+    assert index.search("unrelated words", 4) == []
+    assert BM25Index.build({}).search("anything", 4) == []
+
+
+def test_bm25_round_trips_through_disk(tmp_path):
+    index = BM25Index.build(CHUNKS)
+    index.save(str(tmp_path))
+
+    assert BM25Index.load(str(tmp_path)).search("hiking", 1) == index.search("hiking", 1)
+    assert BM25Index.load(str(tmp_path / "missing")) is None
+
+
+def test_merged_bm25_scores_like_one_built_at_once():
+    items = list(CHUNKS.items())
+    merged = BM25Index.merge([BM25Index.build(dict(items[:2])), BM25Index.build(dict(items[2:]))])
+    whole = BM25Index.build(CHUNKS)
+
+    for query in ("C++ engineers", "computer science education", "hiking python"):
+        assert merged.search(query, 4) == pytest.approx(whole.search(query, 4))
+
+
+def test_rerank_prefers_chunks_covering_the_question():
+    docs = [Document(page_content=text, id=chunk_id) for chunk_id, text in CHUNKS.items()]
+    # Fused scores favour the wrong chunk; term coverage and the exact phrase win it back
+    ranked = rerank("embedded systems", docs, [1.0, 0.9, 0.8, 0.7], k=2)
+
+    assert ranked[0].id == "doc:1"
+    assert len(ranked) == 2
+
+
+def test_identical_text_in_distinct_chunks_stays_separate():
+    chunks = {"a:0": "Skills: Python, SQL", "b:0": "Skills: Python, SQL", "c:0": "Hobbies include hiking"}
+    hybrid = HybridIndex.from_store(make_store(chunks))
+
+    results = hybrid.search("python sql skills", k=3)
+    assert sorted(doc.id for doc in results) == ["a:0", "b:0", "c:0"]
+
+
+def test_chunk_without_id_is_skipped(caplog):
+    caplog.set_level(logging.WARNING)
+    chunks = {"a:0": "Skills: Python", "b:0": "Python projects"}
+    store = make_store(chunks)
+    # A docstore entry written without its id, as old pickled indexes were
+    store.docstore = InMemoryDocstore({
+        "a:0": Document(page_content="Skills: Python"),
+        "b:0": Document(page_content="Python projects", id="b:0"),
+    })
+    hybrid = HybridIndex(store, BM25Index.build(chunks))
+
+    results = hybrid.search("python", k=2)
+
+    # The id-less vector hit is dropped; BM25 still finds the chunk by its docstore key
+    assert sorted(doc.page_content for doc in results) == ["Python projects", "Skills: Python"]
+    assert "without an id" in caplog.text
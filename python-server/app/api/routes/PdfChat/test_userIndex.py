@@ -0,0 +1,119 @@
+import os
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from app.api.routes.PdfChat import userIndex
+from app.api.routes.PdfChat.userIndex import (
+    CURRENT_FILE, add_documents, compact_index, delete_document, index_version, list_documents, load_user_index
+)
+
+USER = "user-1"
+
+
+@pytest.fixture(autouse=True)
+def index_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(userIndex, "FAISS_ROOT", str(tmp_path))
+    monkeypatch.setattr(userIndex, "get_embeddings", lambda: DeterministicFakeEmbedding(size=8))
+    return tmp_path
+
+
+def upload(filename, *texts, loaded=None):
+    return add_documents(USER, [(filename, [Document(page_content=text) for text in texts])], loaded=loaded)
+
+
+def live_directories(root):
+    with open(root / USER / CURRENT_FILE) as f:
+        return f.read().split()
+
+
+def chunk_texts(hybrid):
+    store = hybrid.vector_store
+    return {store.docstore.search(chunk_id).page_content for chunk_id in store.index_to_docstore_id.values()}
+
+
+def test_second_upload_only_writes_its_own_chunks(index_root):
+    upload("a.pdf", "alpha one", "alpha two")
+    base = live_directories(index_root)[0]
+    base_files = {name: os.path.getmtime(index_root / USER / base / name) for name in os.listdir(index_root / USER / base)}
+
+    hybrid, version, _ = upload("b.pdf", "bravo three")
+
+    assert live_directories(index_root) == [base, version]
+    assert {name: os.path.getmtime(index_root / USER / base / name) for name in base_files} == base_files
+    assert hybrid.index.ntotal == 3
+    assert chunk_texts(hybrid) == {"alpha one", "alpha two", "bravo three"}
+    assert hybrid.bm25.search("bravo", 1)[0][0] == hybrid.vector_store.index_to_docstore_id[2]
+
+
+def test_reloaded_index_serves_base_and_segments(index_root):
+    upload("a.pdf", "alpha one")
+    upload("b.pdf", "bravo two")
+
+    hybrid = load_user_index(USER)
+    assert chunk_texts(hybrid) == {"alpha one", "bravo two"}
+    assert [doc.page_content for doc in hybrid.search("bravo two", k=1)] == ["bravo two"]
+    assert sorted(entry["filename"] for entry in list_documents(USER)) == ["a.pdf", "b.pdf"]
+
+
+def test_append_extends_the_index_the_caller_holds(index_root, monkeypatch):
+    first, version, _ = upload("a.pdf", "alpha one")
+
+    def reload(user_id, directories):
+        raise AssertionError("the loaded index should be extended, not reloaded")
+    monkeypatch.setattr(userIndex, "_open", reload)
+
+    hybrid, _, _ = upload("b.pdf", "bravo two", loaded=(version, first))
+    assert chunk_texts(hybrid) == {"alpha one", "bravo two"}
+
+
+def test_segments_are_folded_back_past_the_limit(index_root, monkeypatch):
+    monkeypatch.setattr(userIndex, "MAX_SEGMENTS", 2)
+    for i in range(4):
+        upload(f"{i}.pdf", f"text {i}")
+
+    # base + 2 segments, then the fourth upload rewrites everything as one directory
+    assert len(live_directories(index_root)) == 1
+    assert chunk_texts(load_user_index(USER)) == {f"text {i}" for i in range(4)}
+
+
+def test_replaced_directories_are_kept_for_other_readers(index_root):
+    _, _, added = upload("a.pdf", "alpha one")
+    old = index_version(USER)
+
+    delete_document(USER, added[0]["document_id"])
+
+    assert index_version(USER) is None
+    assert (index_root / USER / old).is_dir()
+
+
+def test_replaced_directories_are_pruned_after_retention(index_root, monkeypatch):
+    upload("a.pdf", "alpha one")
+    upload("b.pdf", "bravo two")
+    old = live_directories(index_root)
+    monkeypatch.setattr(userIndex, "INDEX_RETENTION_SECONDS", 0)
+
+    _, version, stats = compact_index(USER)
+
+    assert stats["documents"] == 2
+    assert live_directories(index_root) == [version]
+    assert not any((index_root / USER / directory).exists() for directory in old)
+
+
+def test_deleting_a_document_from_a_segment(index_root):
+    upload("a.pdf", "alpha one")
+    _, _, added = upload("b.pdf", "bravo two")
+
+    found, hybrid, _ = delete_document(USER, added[0]["document_id"])
+
+    assert found
+    assert chunk_texts(hybrid) == {"alpha one"}
+    assert [entry["filename"] for entry in list_documents(USER)] == ["a.pdf"]
+
+
+def test_user_locks_are_released_after_use(index_root):
+    upload("a.pdf", "alpha one")
+    list_documents(USER)
+
+    assert USER not in userIndex._locks
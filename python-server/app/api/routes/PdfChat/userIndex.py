@@ -0,0 +1,345 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+import weakref
+from datetime import datetime
+from typing import Optional
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from .helper import get_embeddings
+from .retrieval import BM25Index, HybridIndex
+from .indexStorage import combine_stores, load_index, save_index, is_legacy_format
+
+FAISS_ROOT = "faissDatabase"
+# Small pointer file naming the live index directories, one per line: the base index, then
+# the segments appended to it by later uploads. Replacing it is atomic.
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "documents.json"
+
+# Uploads only write their own chunks as a new segment; past this many segments the
+# next upload rewrites the index as a single base again
+MAX_SEGMENTS = int(os.getenv("PDF_CHAT_MAX_INDEX_SEGMENTS", "8"))
+# Directories that stopped being live are kept this long, since other workers may
+# still be reading the old pointer or have the old files mapped
+INDEX_RETENTION_SECONDS = float(os.getenv("PDF_CHAT_INDEX_RETENTION_SECONDS", "600"))
+
+# Held only while some caller is using a user's lock, so the map doesn't grow with every user ever seen
+_locks: "weakref.WeakValueDictionary[str, threading.Lock]" = weakref.WeakValueDictionary()
+_locks_guard = threading.Lock()
+
+
+def _user_lock(user_id: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(user_id, threading.Lock())
+
+
+def _user_directory(user_id: str) -> str:
+    return os.path.join(FAISS_ROOT, user_id)
+
+
+# Directories written by the old one-index-per-upload layout
+def _legacy_indexes(user_id: str) -> list[str]:
+    user_directory = _user_directory(user_id)
+    if not os.path.isdir(user_directory):
+        return []
+    return sorted(
+        os.path.join(user_directory, d, "faiss_index") for d in os.listdir(user_directory)
+        if not d.startswith("index-") and os.path.isdir(os.path.join(user_directory, d, "faiss_index"))
+    )
+
+
+def _live_directories(user_id: str) -> Optional[list[str]]:
+    """Base index then segments, as named by the pointer file; None if there is no pointer."""
+    try:
+        with open(os.path.join(_user_directory(user_id), CURRENT_FILE)) as f:
+            return [line.strip() for line in f if line.strip()]
+    except FileNotFoundError:
+        return None
+
+
+def index_version(user_id: str) -> Optional[str]:
+    """Name of the user's newest live index directory, or None if they have no documents."""
+    directories = _live_directories(user_id)
+    if directories is None:
+        return "legacy" if _legacy_indexes(user_id) else None
+    return directories[-1] if directories else None
+
+
+def _new_directory() -> str:
+    return f"index-{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+
+def _set_live(user_id: str, directories: list[str]) -> None:
+    user_directory = _user_directory(user_id)
+    previous = _live_directories(user_id) or []
+    current = os.path.join(user_directory, CURRENT_FILE)
+    if directories:
+        pointer = os.path.join(user_directory, f"{CURRENT_FILE}.{uuid.uuid4().hex[:8]}")
+        with open(pointer, "w") as f:
+            f.write("\n".join(directories))
+        os.replace(pointer, current)
+    elif os.path.exists(current):
+        os.remove(current)
+
+    # Stamp replaced directories with the time they stopped being live, which is what _prune goes by
+    now = time.time()
+    for directory in set(previous) - set(directories):
+        try:
+            os.utime(os.path.join(user_directory, directory), (now, now))
+        except OSError:
+            pass
+    _prune(user_id, directories)
+
+
+def _prune(user_id: str, live: list[str]) -> None:
+    """Remove index directories that haven't been live for INDEX_RETENTION_SECONDS, including interrupted writes."""
+    user_directory = _user_directory(user_id)
+    if not os.path.isdir(user_directory):
+        return
+    cutoff = time.time() - INDEX_RETENTION_SECONDS
+    for d in os.listdir(user_directory):
+        path = os.path.join(user_directory, d)
+        try:
+            stale = d.startswith("index-") and d not in live and os.path.getmtime(path) <= cutoff
+        except OSError:
+            continue
+        if stale:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def _manifest(user_id: str, directories: list[str]) -> dict:
+    manifest = {"documents": {}}
+    for directory in directories:
+        with open(os.path.join(_user_directory(user_id), directory, MANIFEST_FILE)) as f:
+            manifest["documents"].update(json.load(f)["documents"])
+    return manifest
+
+
+def _read(user_id: str) -> tuple[Optional[FAISS], dict]:
+    """Private, editable copy of the whole index with its segments merged in."""
+    directories = _live_directories(user_id)
+    if not directories:
+        return None, {"documents": {}}
+    store = None
+    for directory in directories:
+        segment = load_index(os.path.join(_user_directory(user_id), directory), get_embeddings(), mapped=False)
+        if store is None:
+            store = segment
+        else:
+            store.merge_from(segment)
+    return store, _manifest(user_id, directories)
+
+
+def _open(user_id: str, directories: list[str]) -> HybridIndex:
+    """Memory-mapped view over the base index and its segments, for serving queries."""
+    stores, keyword_indexes = [], []
+    for directory in directories:
+        path = os.path.join(_user_directory(user_id), directory)
+        store = load_index(path, get_embeddings(), mapped=True)
+        bm25 = BM25Index.load(path)
+        if bm25 is None:
+            # Index written before keyword search existed
+            bm25 = HybridIndex.from_store(store).bm25
+            bm25.save(path)
+        stores.append(store)
+        keyword_indexes.append(bm25)
+    return HybridIndex(combine_stores(stores), BM25Index.merge(keyword_indexes))
+
+
+def _save(path: str, store: FAISS, manifest: dict) -> HybridIndex:
+    save_index(store, path)
+    with open(os.path.join(path, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f)
+    # Keyword index for hybrid retrieval lives next to the vectors it describes
+    bm25 = HybridIndex.from_store(store).bm25
+    bm25.save(path)
+    # Serve queries from the memory-mapped copy rather than the private one just written
+    return HybridIndex(load_index(path, get_embeddings(), mapped=True), bm25)
+
+
+def _write(user_id: str, store: Optional[FAISS], manifest: dict) -> tuple[Optional[str], Optional[HybridIndex]]:
+    """Rewrite the whole index as a single base directory."""
+    os.makedirs(_user_directory(user_id), exist_ok=True)
+    if store is None or store.index.ntotal == 0:
+        _set_live(user_id, [])
+        return None, None
+    version = _new_directory()
+    hybrid = _save(os.path.join(_user_directory(user_id), version), store, manifest)
+    _set_live(user_id, [version])
+    return version, hybrid
+
+
+def _migrate_legacy(user_id: str, store: Optional[FAISS], manifest: dict) -> Optional[FAISS]:
+    """
+    Fold indexes from the old per-upload layout into the single user index.
+    Those were pickled by FAISS.save_local, so this is the one remaining place
+    that has to unpickle them.
+    """
+    for legacy_path in _legacy_indexes(user_id):
+        legacy = FAISS.load_local(legacy_path, get_embeddings(), allow_dangerous_deserialization=True)
+        document_id = uuid.uuid4().hex
+        chunk_ids = list(legacy.index_to_docstore_id.values())
+        for chunk_id in chunk_ids:
+            doc = legacy.docstore.search(chunk_id)
+            # Pickled chunks may predate Document ids
+            doc.id = chunk_id
+            doc.metadata.update({"document_id": document_id, "filename": None})
+        manifest["documents"][document_id] = {
+            "filename": None,
+            "uploaded_at": os.path.basename(os.path.dirname(legacy_path)),
+            "chunk_ids": chunk_ids,
+        }
+        if store is None:
+            store = legacy
+        else:
+            store.merge_from(legacy)
+    return store
+
+
+def _remove_legacy(user_id: str) -> None:
+    for legacy_path in _legacy_indexes(user_id):
+        shutil.rmtree(os.path.dirname(legacy_path), ignore_errors=True)
+
+
+def load_user_index(user_id: str, version: Optional[str] = None) -> Optional[HybridIndex]:
+    """Load the user's index, migrating any indexes from the old layout on first use."""
+    with _user_lock(user_id):
+        if index_version(user_id) == "legacy":
+            manifest = {"documents": {}}
+            store = _migrate_legacy(user_id, None, manifest)
+            _, hybrid = _write(user_id, store, manifest)
+            _remove_legacy(user_id)
+            return hybrid
+
+        directories = _live_directories(user_id)
+        if not directories:
+            return None
+        if is_legacy_format(os.path.join(_user_directory(user_id), directories[0])):
+            # Rewrite pickled indexes in the memory-mapped format on first use
+            store, manifest = _read(user_id)
+            _, hybrid = _write(user_id, store, manifest)
+            return hybrid
+        return _open(user_id, directories)
+
+
+def add_documents(user_id: str, documents: list[tuple[str, list[Document]]],
+                  vectors: Optional[list[list[float]]] = None,
+                  loaded: Optional[tuple[str, HybridIndex]] = None) -> tuple[Optional[HybridIndex], Optional[str], list[dict]]:
+    """
+    Append documents, given as (filename, chunks), to the user's index.
+    Pass vectors when the chunks have already been embedded, in chunk order,
+    and loaded as the (version, index) the caller already holds, so only the
+    new chunks need loading afterwards.
+    Returns the updated store, its version and the manifest entries added.
+    """
+    texts, metadatas, ids, added = [], [], [], []
+    uploaded_at = datetime.now().isoformat()
+    for filename, chunks in documents:
+        if not chunks:
+            continue
+        document_id = uuid.uuid4().hex
+        chunk_ids = [f"{document_id}:{i}" for i in range(len(chunks))]
+        texts.extend(chunk.page_content for chunk in chunks)
+        ids.extend(chunk_ids)
+        metadatas.extend(
+            {**chunk.metadata, "document_id": document_id, "filename": filename, "chunk": i}
+            for i, chunk in enumerate(chunks)
+        )
+        added.append({"document_id": document_id, "filename": filename, "uploaded_at": uploaded_at, "chunk_ids": chunk_ids})
+
+    # Embed before taking the lock so concurrent uploads only serialize on the index write
+    embeddings = get_embeddings()
+    if vectors is None:
+        vectors = embeddings.embed_documents(texts) if texts else []
+    if not vectors:
+        return None, index_version(user_id), []
+
+    pairs = list(zip(texts, vectors))
+    entries = {
+        entry["document_id"]: {"filename": entry["filename"], "uploaded_at": entry["uploaded_at"], "chunk_ids": entry["chunk_ids"]}
+        for entry in added
+    }
+    with _user_lock(user_id):
+        directories = _live_directories(user_id)
+        if (not directories or len(directories) > MAX_SEGMENTS
+                or is_legacy_format(os.path.join(_user_directory(user_id), directories[0]))):
+            # Nothing to append to, or time to fold the segments back into one index
+            store, manifest = _read(user_id)
+            if store is None:
+                store = FAISS.from_embeddings(pairs, embeddings, metadatas=metadatas, ids=ids)
+            else:
+                store.add_embeddings(pairs, metadatas=metadatas, ids=ids)
+            manifest["documents"].update(entries)
+            version, hybrid = _write(user_id, store, manifest)
+            return hybrid, version, added
+
+        version = _new_directory()
+        segment = _save(os.path.join(_user_directory(user_id), version),
+                        FAISS.from_embeddings(pairs, embeddings, metadatas=metadatas, ids=ids),
+                        {"documents": entries})
+        if loaded is not None and loaded[0] == directories[-1]:
+            current = loaded[1]
+        else:
+            current = _open(user_id, directories)
+        hybrid = HybridIndex(combine_stores([current.vector_store, segment.vector_store]),
+                             BM25Index.merge([current.bm25, segment.bm25]))
+        _set_live(user_id, directories + [version])
+    return hybrid, version, added
+
+
+def delete_document(user_id: str, document_id: str) -> tuple[bool, Optional[HybridIndex], Optional[str]]:
+    """Remove one document's vectors and metadata. Returns (found, index, version)."""
+    with _user_lock(user_id):
+        store, manifest = _read(user_id)
+        entry = manifest["documents"].pop(document_id, None)
+        if store is None or entry is None:
+            return False, None, None
+        store.delete(entry["chunk_ids"])
+        version, hybrid = _write(user_id, store, manifest)
+        return True, hybrid, version
+
+
+def list_documents(user_id: str) -> list[dict]:
+    with _user_lock(user_id):
+        manifest = _manifest(user_id, _live_directories(user_id) or [])
+    return [
+        {"document_id": document_id, "filename": entry["filename"],
+         "uploaded_at": entry["uploaded_at"], "chunks": len(entry["chunk_ids"])}
+        for document_id, entry in manifest["documents"].items()
+    ]
+
+
+def compact_index(user_id: str) -> tuple[Optional[HybridIndex], Optional[str], dict]:
+    """
+    Merge any old-layout indexes and appended segments, drop docstore entries
+    that no longer have a vector, and rewrite the index as one directory.
+    Replaced directories are reclaimed once INDEX_RETENTION_SECONDS have passed.
+    """
+    with _user_lock(user_id):
+        store, manifest = _read(user_id)
+        store = _migrate_legacy(user_id, store, manifest)
+        orphaned = 0
+        if store is not None:
+            live_ids = set(store.index_to_docstore_id.values())
+            for chunk_id in list(store.docstore._dict):
+                if chunk_id not in live_ids:
+                    del store.docstore._dict[chunk_id]
+                    orphaned += 1
+            for document_id in list(manifest["documents"]):
+                entry = manifest["documents"][document_id]
+                entry["chunk_ids"] = [chunk_id for chunk_id in entry["chunk_ids"] if chunk_id in live_ids]
+                if not entry["chunk_ids"]:
+                    del manifest["documents"][document_id]
+        version, hybrid = _write(user_id, store, manifest)
+        _remove_legacy(user_id)
+
+        return hybrid, version, {
+            "documents": len(manifest["documents"]),
+            "vectors": store.index.ntotal if store is not None else 0,
+            "orphaned_chunks_removed": orphaned,
+        }
@@ -1,37 +1,31 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException, Request
+from fastapi import APIRouter, Depends, File, UploadFile, HTTPException
 from fastapi.responses import JSONResponse
 from app.api.middlewares import authUser
+from app.api.services import mongo
+from app.api.services.uploads import save_upload, UploadRejected
 import os
-import shutil
-from pymongo import MongoClient
 from bson import ObjectId
 
 router = APIRouter()
 
-MONOGO_URI = os.getenv("MONGODB_CONNECTION_STRING")
-
-client = MongoClient(MONOGO_URI)
-db = client["nextHire"]
-users_collection = db["User"]
-
 UPLOAD_FOLDER = "uploads"
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 @router.post("/upload-pdf")
-async def upload_resume(request: Request, resume: UploadFile = File(...)):
+async def upload_resume(resume: UploadFile = File(...), user: dict = Depends(authUser.current_user)):
     if not resume.filename.endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
-    print(request.cookies)
-    user = authUser.authenticateUser(request.cookies.get('refreshToken'))
 
     save_path = os.path.join(UPLOAD_FOLDER, user['id']+'.pdf')
 
-    with open(save_path, "wb") as buffer:
-        shutil.copyfileobj(resume.file, buffer)
+    try:
+        await save_upload(resume, save_path, "pdf")
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
 
     object_id = ObjectId(user['id'])
-    print(object_id)
-    result = users_collection.update_one(
+    users_collection = mongo.get_database()["User"]
+    result = await users_collection.update_one(
         {"_id": object_id},
         {"$set": {"isResumeUploaded": True}}
     )
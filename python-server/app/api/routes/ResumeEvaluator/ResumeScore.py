@@ -2,14 +2,12 @@ from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 import os
+import asyncio
 import logging
 import json
 from werkzeug.utils import secure_filename
-import PyPDF2
 from groq import Groq
 from dotenv import load_dotenv
-import docx
-import pypandoc
 from io import BytesIO
 from fastapi import APIRouter, Cookie, Request
 from fastapi.responses import JSONResponse
@@ -17,6 +15,9 @@ import re
 
 # Import the helper functions including the new is_resume_ai function
 from .resumeHelper import allowed_file, extract_text, extract_json_from_response, is_resume_ai
+from .evaluationCache import EvaluationCache, make_cache_key
+from .converterPool import converter_pool
+from app.api.services.uploads import read_upload, UploadRejected
 
 router = APIRouter()
 
@@ -24,78 +25,46 @@ load_dotenv()
 
 # Configuration for file uploads
 UPLOAD_FOLDER = 'uploads'
-ALLOWED_EXTENSIONS = {'pdf', 'docx', 'txt', 'odt', 'tex', 'html', 'rtf'}
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# Evaluation pipeline limits (per worker process)
+EVALUATION_TIMEOUT = float(os.getenv("RESUME_EVALUATION_TIMEOUT", "60"))
+# wait_for can't stop a call already running in a thread, so each Groq request is
+# bounded by the client itself; retrying past the evaluation timeout would be wasted
+GROQ_REQUEST_TIMEOUT = float(os.getenv("RESUME_GROQ_TIMEOUT", str(EVALUATION_TIMEOUT)))
+
 # Initialize Groq client
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-client = Groq(api_key=GROQ_API_KEY)
-
-# Logging configuration
-logging.basicConfig(level=logging.INFO)
-
-
-# Utility to check allowed file types
-def allowed_file(filename: str) -> bool:
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
-
-
-# Utility to extract text from file based on extension
-def extract_text(file: BytesIO, file_extension: str) -> str:
-    if file_extension == 'pdf':
-        return extract_text_from_pdf(file)
-    elif file_extension == 'docx':
-        return extract_text_from_docx(file)
-    elif file_extension == 'odt':
-        return extract_text_from_odt(file)
-    elif file_extension == 'tex':
-        return extract_text_from_tex(file)
-    elif file_extension == 'html':
-        return extract_text_from_html(file)
-    elif file_extension == 'rtf':
-        return extract_text_from_rtf(file)
-    else:
-        file.seek(0)
-        return file.read().decode('utf-8')
-
-
-# Function to extract text from PDF
-def extract_text_from_pdf(file: BytesIO) -> str:
-    text = ""
-    try:
-        reader = PyPDF2.PdfReader(file)
-        for page in reader.pages:
-            text += page.extract_text() or ""
-    except Exception as e:
-        logging.error(f"Error extracting PDF text: {e}")
-        raise HTTPException(status_code=500, detail="Error extracting text from PDF")
-    return text
-
+client = Groq(api_key=GROQ_API_KEY, timeout=GROQ_REQUEST_TIMEOUT, max_retries=0)
 
-# Function to extract text from DOCX
-def extract_text_from_docx(file: BytesIO) -> str:
-    doc = docx.Document(file)
-    return '\n'.join([paragraph.text for paragraph in doc.paragraphs])
+MAX_CONCURRENT_EVALUATIONS = int(os.getenv("RESUME_MAX_CONCURRENT_EVALUATIONS", "8"))
+evaluation_semaphore = asyncio.Semaphore(MAX_CONCURRENT_EVALUATIONS)
 
+# Bump whenever the classification or evaluation prompts change so stale results are not served
+PROMPT_VERSION = "1"
 
-# Function to extract text from ODT
-def extract_text_from_odt(file: BytesIO) -> str:
-    return pypandoc.convert_file(file, 'plain', format='odt')
+# Result cache for repeat uploads of the same resume (set RESUME_CACHE_DB to persist across restarts)
+evaluation_cache = EvaluationCache(
+    max_entries=int(os.getenv("RESUME_CACHE_MAX_ENTRIES", "512")),
+    ttl_seconds=float(os.getenv("RESUME_CACHE_TTL", "86400")),
+    db_path=os.getenv("RESUME_CACHE_DB") or None
+)
 
+logger = logging.getLogger(__name__)
 
-# Function to extract text from TEX
-def extract_text_from_tex(file: BytesIO) -> str:
-    return pypandoc.convert_file(file, 'plain', format='tex')
 
-
-# Function to extract text from HTML
-def extract_text_from_html(file: BytesIO) -> str:
-    return pypandoc.convert_file(file, 'plain', format='html')
-
-
-# Function to extract text from RTF
-def extract_text_from_rtf(file: BytesIO) -> str:
-    return pypandoc.convert_file(file, 'plain', format='rtf')
+# Run a single Groq chat completion without blocking the event loop
+async def run_completion(system_content: str, user_content: str) -> str:
+    # Using asyncio.to_thread because the groq client is synchronous
+    response = await asyncio.to_thread(
+        client.chat.completions.create,
+        model="llama-3.1-8b-instant",
+        messages=[
+            {"role": "system", "content": system_content},
+            {"role": "user", "content": user_content}
+        ]
+    )
+    return response.choices[0].message.content
 
 
 # Endpoint to test server
@@ -104,9 +73,21 @@ async def test():
     return JSONResponse(content={"message": "Server is running"}, status_code=200)
 
 
+# Endpoint to inspect document conversion worker pool and queue depth
+@router.get("/converter-stats")
+async def converter_stats():
+    return JSONResponse(content=converter_pool.stats(), status_code=200)
+
+
+# Endpoint to inspect result cache hit/miss counters
+@router.get("/cache-stats")
+async def cache_stats():
+    return JSONResponse(content=evaluation_cache.stats(), status_code=200)
+
+
 @router.post("/evaluate-resume")
 async def evaluate_resume(file: UploadFile = File(...)):
-    logging.info('Received request to evaluate resume')
+    logger.info('Received request to evaluate resume')
 
     try:
         # File processing code remains the same
@@ -119,20 +100,15 @@ async def evaluate_resume(file: UploadFile = File(...)):
                 "is_resume": False
             }, status_code=400)
 
-        file_content = await file.read()
-        resume_text = extract_text(BytesIO(file_content), file_extension)
-        
-        # Check if the uploaded file is actually a resume using AI
-        is_resume, reason = await is_resume_ai(resume_text)
-        
-        if not is_resume:
-            logging.info(f"Non-resume document detected: {reason}")
+        try:
+            file_content = await read_upload(file, file_extension)
+        except UploadRejected as e:
             return JSONResponse(content={
-                "error": f"The uploaded file does not appear to be a resume. {reason}",
+                "error": str(e),
                 "is_resume": False
-            }, status_code=400)
-            
-        logging.info("Resume validation passed, proceeding with evaluation")
+            }, status_code=e.status_code)
+        resume_text = await extract_text(BytesIO(file_content), file_extension)
+        
         role = os.getenv("ROLE", "Web Developer")
 
         ats_prompt = f"""
@@ -237,34 +213,70 @@ async def evaluate_resume(file: UploadFile = File(...)):
                     return json.loads(json_str_match.group())
                 raise ValueError("No JSON object found in response")
             except json.JSONDecodeError as e:
-                logging.error(f"JSON decoding error: {e}")
+                logger.error(f"JSON decoding error: {e}")
                 raise HTTPException(status_code=500, detail="Invalid JSON in AI response")
             except Exception as e:
-                logging.error(f"Error extracting JSON: {e}")
+                logger.error(f"Error extracting JSON: {e}")
                 raise HTTPException(status_code=500, detail=str(e))
 
-        try:
-            ats_response = client.chat.completions.create(
-                model="llama-3.1-8b-instant",
-                messages=[
-                    {"role": "system", "content": "You are an ATS compliance expert."},
-                    {"role": "user", "content": ats_prompt}
-                ]
-            )
-            ats_evaluation = extract_json_from_response(ats_response.choices[0].message.content)
-
-            normal_response = client.chat.completions.create(
-                model="llama-3.1-8b-instant",
-                messages=[
-                    {"role": "system", "content": "You are an expert resume evaluator."},
-                    {"role": "user", "content": normal_prompt}
-                ]
-            )
-            normal_evaluation = extract_json_from_response(normal_response.choices[0].message.content)
-
-        except Exception as api_error:
-            logging.error(f"API Error: {api_error}. Using fallback responses.")
-            raise HTTPException(status_code=500, detail=f"Error with AI service: {str(api_error)}")
+        evaluation_key = make_cache_key("evaluation", resume_text, role, PROMPT_VERSION)
+        cached_evaluation = await evaluation_cache.get(evaluation_key)
+        if cached_evaluation is not None:
+            logger.info("Serving resume evaluation from cache")
+            return JSONResponse(content={
+                "ats_evaluation": cached_evaluation["ats_evaluation"],
+                "normal_evaluation": cached_evaluation["normal_evaluation"],
+                "is_resume": True
+            }, status_code=200)
+
+        async def run_pipeline():
+            # Check if the uploaded file is actually a resume using AI
+            classification_key = make_cache_key("classification", resume_text, "", PROMPT_VERSION)
+            # Part of the same request as the evaluation lookup, so not counted again
+            cached_classification = await evaluation_cache.get(classification_key, track=False)
+            if cached_classification is not None:
+                is_resume, reason = cached_classification
+            else:
+                is_resume, reason, verified = await is_resume_ai(resume_text)
+                # Don't remember transient AI failures, only actual verdicts
+                if verified:
+                    await evaluation_cache.set(classification_key, [is_resume, reason])
+            if not is_resume:
+                return False, reason, None, None
+
+            logger.info("Resume validation passed, proceeding with evaluation")
+            try:
+                # Both evaluations only depend on the resume text, so run them together
+                ats_content, normal_content = await asyncio.gather(
+                    run_completion("You are an ATS compliance expert.", ats_prompt),
+                    run_completion("You are an expert resume evaluator.", normal_prompt)
+                )
+            except Exception as api_error:
+                logger.error(f"API Error: {api_error}. Using fallback responses.")
+                raise HTTPException(status_code=500, detail=f"Error with AI service: {str(api_error)}")
+
+            return True, reason, extract_json_from_response(ats_content), extract_json_from_response(normal_content)
+
+        async with evaluation_semaphore:
+            try:
+                is_resume, reason, ats_evaluation, normal_evaluation = await asyncio.wait_for(
+                    run_pipeline(), timeout=EVALUATION_TIMEOUT
+                )
+            except asyncio.TimeoutError:
+                logger.error(f"Resume evaluation timed out after {EVALUATION_TIMEOUT}s")
+                raise HTTPException(status_code=504, detail="Resume evaluation timed out")
+
+        if not is_resume:
+            logger.info(f"Non-resume document detected: {reason}")
+            return JSONResponse(content={
+                "error": f"The uploaded file does not appear to be a resume. {reason}",
+                "is_resume": False
+            }, status_code=400)
+
+        await evaluation_cache.set(evaluation_key, {
+            "ats_evaluation": ats_evaluation,
+            "normal_evaluation": normal_evaluation
+        })
 
         return JSONResponse(content={
             "ats_evaluation": ats_evaluation,
@@ -272,8 +284,11 @@ async def evaluate_resume(file: UploadFile = File(...)):
             "is_resume": True
         }, status_code=200)
 
+    except HTTPException:
+        # Timeouts and AI service errors keep their status code
+        raise
     except Exception as e:
-        logging.error(f"Error during evaluation: {e}")
+        logger.error(f"Error during evaluation: {e}")
         return JSONResponse(content={
             "error": f"Error processing file: {str(e)}",
             "is_resume": False
@@ -0,0 +1,209 @@
+import asyncio
+import base64
+import logging
+import os
+import socket
+from typing import Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+# Input formats the conversion workers will accept; anything else is rejected before dispatch
+ALLOWED_INPUT_FORMATS = {'odt', 'latex', 'html', 'rtf'}
+BINARY_INPUT_FORMATS = {'odt'}
+
+# A freshly picked port can be taken before pandoc binds it, so startup retries on a new port
+START_ATTEMPTS = 3
+
+
+class ConverterUnavailable(Exception):
+    """The pool could not reach a worker; the caller should convert another way."""
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class PandocWorker:
+    """A long-lived `pandoc server` process listening on a local port."""
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.port: Optional[int] = None
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.jobs = 0
+
+    async def start(self, http: httpx.AsyncClient) -> None:
+        for attempt in range(1, START_ATTEMPTS + 1):
+            try:
+                await self._start_once(http)
+                return
+            except RuntimeError as e:
+                if attempt == START_ATTEMPTS:
+                    raise
+                logger.warning(f"Pandoc worker on port {self.port} failed to start, retrying: {e}")
+
+    async def _start_once(self, http: httpx.AsyncClient) -> None:
+        self.port = _free_port()
+        self.jobs = 0
+        self.process = await asyncio.create_subprocess_exec(
+            'pandoc', 'server', '--port', str(self.port), '--timeout', str(int(self.timeout)),
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        # Wait until the server answers so the first real job doesn't pay for startup
+        for _ in range(50):
+            if self.process.returncode is not None:
+                # Most often the port was taken between _free_port and pandoc binding it
+                self.process = None
+                raise RuntimeError("pandoc server exited during startup")
+            try:
+                await http.get(f"{self.url}/version")
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+        await self.stop()
+        raise RuntimeError("pandoc server did not become ready")
+
+    async def stop(self) -> None:
+        if self.process is not None and self.process.returncode is None:
+            self.process.kill()
+            await self.process.wait()
+        self.process = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+
+class ConverterPool:
+    """
+    Pool of warm pandoc server workers. Jobs wait for an idle worker, and each
+    worker is restarted after max_jobs conversions to bound memory growth.
+    """
+
+    def __init__(self, size: int = 2, max_jobs: int = 200, timeout: float = 30):
+        self.size = size
+        self.max_jobs = max_jobs
+        self.timeout = timeout
+        self._idle: Optional[asyncio.Queue] = None
+        self._workers: list[PandocWorker] = []
+        self._http: Optional[httpx.AsyncClient] = None
+        self.waiting = 0
+        self.busy = 0
+        self.completed = 0
+        self.failed = 0
+        self.recycled = 0
+
+    @property
+    def started(self) -> bool:
+        return self._idle is not None
+
+    async def start(self) -> None:
+        if self.started:
+            return
+        self._http = httpx.AsyncClient(timeout=self.timeout)
+        self._idle = asyncio.Queue()
+        for _ in range(self.size):
+            worker = PandocWorker(self.timeout)
+            try:
+                await worker.start(self._http)
+            except (OSError, RuntimeError) as e:
+                # Keep whichever workers did start; a smaller pool still beats none
+                logger.warning(f"Failed to start pandoc worker: {e}")
+                continue
+            self._workers.append(worker)
+            self._idle.put_nowait(worker)
+
+        if not self._workers:
+            logger.warning("Pandoc worker pool unavailable, using one-shot converters")
+            await self.stop()
+            return
+        logger.info(f"Started {len(self._workers)} of {self.size} pandoc conversion workers")
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            await worker.stop()
+        self._workers = []
+        self._idle = None
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def convert(self, data: bytes, input_format: str) -> str:
+        if input_format not in ALLOWED_INPUT_FORMATS:
+            raise ValueError(f"Unsupported input format: {input_format}")
+
+        payload = {"from": input_format, "to": "plain"}
+        if input_format in BINARY_INPUT_FORMATS:
+            payload["text"] = base64.b64encode(data).decode('ascii')
+        else:
+            payload["text"] = data.decode('utf-8', errors='replace')
+
+        idle = self._idle
+        self.waiting += 1
+        try:
+            worker = await idle.get()
+        finally:
+            self.waiting -= 1
+
+        self.busy += 1
+        try:
+            try:
+                if not worker.alive:
+                    await self._recycle(worker)
+                response = await self._http.post(worker.url, json=payload, headers={"Accept": "application/json"})
+            except (OSError, RuntimeError, httpx.TransportError) as e:
+                raise ConverterUnavailable(f"pandoc worker unreachable: {e}") from e
+            if response.status_code != 200:
+                raise ConverterUnavailable(f"pandoc worker returned {response.status_code}: {response.text}")
+            result = response.json()
+            if result.get("error"):
+                raise Exception(result["error"])
+            self.completed += 1
+            return result.get("output", "")
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.busy -= 1
+            worker.jobs += 1
+            if worker.jobs >= self.max_jobs or not worker.alive:
+                try:
+                    await self._recycle(worker)
+                except (OSError, RuntimeError) as e:
+                    logger.error(f"Failed to recycle pandoc worker: {e}")
+            idle.put_nowait(worker)
+
+    async def _recycle(self, worker: PandocWorker) -> None:
+        await worker.stop()
+        await worker.start(self._http)
+        self.recycled += 1
+
+    def stats(self) -> dict:
+        return {
+            "started": self.started,
+            "workers": len(self._workers),
+            "idle": self._idle.qsize() if self._idle is not None else 0,
+            "busy": self.busy,
+            "queue_depth": self.waiting,
+            "completed": self.completed,
+            "failed": self.failed,
+            "recycled": self.recycled,
+        }
+
+
+converter_pool = ConverterPool(
+    size=int(os.getenv("RESUME_CONVERTER_WORKERS", "2")),
+    max_jobs=int(os.getenv("RESUME_CONVERTER_MAX_JOBS", "200")),
+    timeout=float(os.getenv("RESUME_CONVERTER_TIMEOUT", "30"))
+)
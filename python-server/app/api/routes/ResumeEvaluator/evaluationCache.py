@@ -0,0 +1,127 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+# Build a content-addressed key from the extracted text and everything that shapes the LLM output
+def make_cache_key(kind: str, text: str, role: str, prompt_version: str) -> str:
+    digest = hashlib.sha256()
+    for part in (kind, prompt_version, role, text):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class EvaluationCache:
+    """
+    Two-tier cache for resume classification and evaluation results.
+    Entries live in an in-memory LRU with a TTL; when db_path is set they are
+    also written to SQLite so they survive restarts. SQLite is only consulted
+    on a memory miss, and always from a worker thread.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 86400, db_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if db_path:
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS evaluation_cache ("
+                "key TEXT PRIMARY KEY, expires_at REAL NOT NULL, value TEXT NOT NULL)"
+            )
+            self._db.commit()
+
+    async def get(self, key: str, track: bool = True) -> Optional[Any]:
+        """
+        Look up a result. Pass track=False for secondary lookups made while
+        serving the same request, so each request counts once in stats().
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    if track:
+                        self.hits += 1
+                    return value
+                del self._entries[key]
+
+        if self._db is not None:
+            row = await asyncio.to_thread(self._read, key)
+            if row is not None and row[0] > now:
+                value = json.loads(row[1])
+                with self._lock:
+                    self._remember(key, row[0], value)
+                    if track:
+                        self.hits += 1
+                        self.disk_hits += 1
+                return value
+
+        if track:
+            with self._lock:
+                self.misses += 1
+        return None
+
+    async def set(self, key: str, value: Any) -> None:
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._remember(key, expires_at, value)
+        if self._db is not None:
+            await asyncio.to_thread(self._write, key, expires_at, json.dumps(value))
+
+    def _read(self, key: str) -> Optional[tuple[float, str]]:
+        with self._db_lock:
+            return self._db.execute(
+                "SELECT expires_at, value FROM evaluation_cache WHERE key = ?", (key,)
+            ).fetchone()
+
+    def _write(self, key: str, expires_at: float, data: str) -> None:
+        with self._db_lock:
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO evaluation_cache (key, expires_at, value) VALUES (?, ?, ?)",
+                    (key, expires_at, data)
+                )
+                self._db.execute("DELETE FROM evaluation_cache WHERE expires_at <= ?", (time.time(),))
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Error writing evaluation cache entry: {e}")
+
+    def _remember(self, key: str, expires_at: float, value: Any) -> None:
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "persistent": self._db is not None,
+            }
@@ -1,11 +1,17 @@
+import asyncio
 import json
+import logging
 import re
 from werkzeug.utils import secure_filename
 from io import BytesIO
-import PyPDF2
-import subprocess
+import docx
+import tempfile
 import os
 from groq import Groq
+from .converterPool import ConverterUnavailable, converter_pool
+from app.api.services.pdfExtractor import extract_pdf_text
+
+logger = logging.getLogger(__name__)
 
 # Initialize Groq client (will be used in is_resume_ai function)
 def get_groq_client():
@@ -13,7 +19,9 @@ def get_groq_client():
     from dotenv import load_dotenv
     load_dotenv()
     GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-    return Groq(api_key=GROQ_API_KEY)
+    # Bounded like the evaluation calls, so a timed out request doesn't leave the thread hanging
+    timeout = float(os.getenv("RESUME_GROQ_TIMEOUT", os.getenv("RESUME_EVALUATION_TIMEOUT", "60")))
+    return Groq(api_key=GROQ_API_KEY, timeout=timeout, max_retries=0)
 
 # Utility to check allowed file types
 def allowed_file(filename: str) -> bool:
@@ -21,13 +29,14 @@ def allowed_file(filename: str) -> bool:
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 # Function to validate if the text is from a resume using AI
-async def is_resume_ai(text: str) -> tuple[bool, str]:
+async def is_resume_ai(text: str) -> tuple[bool, str, bool]:
     """
     Use AI to determine if the extracted text is from a resume.
-    Returns a tuple of (is_resume, reason)
+    Returns a tuple of (is_resume, reason, verified); verified is False when
+    no verdict could be reached (e.g. the AI call failed).
     """
     if not text or len(text.strip()) < 100:
-        return False, "The document is too short to be a valid resume."
+        return False, "The document is too short to be a valid resume.", True
     
     # Check for common educational document keywords
     educational_keywords = [
@@ -41,7 +50,7 @@ async def is_resume_ai(text: str) -> tuple[bool, str]:
     text_upper = text.upper()
     educational_keyword_matches = [keyword for keyword in educational_keywords if keyword in text_upper]
     if len(educational_keyword_matches) >= 2:
-        return False, f"This appears to be an educational document (contains {', '.join(educational_keyword_matches[:3])})."
+        return False, f"This appears to be an educational document (contains {', '.join(educational_keyword_matches[:3])}).", True
     
     # Truncate text if it's too long (to save tokens)
     max_length = 4000
@@ -83,7 +92,9 @@ async def is_resume_ai(text: str) -> tuple[bool, str]:
     """
     
     try:
-        response = client.chat.completions.create(
+        # Using asyncio.to_thread because the groq client is synchronous
+        response = await asyncio.to_thread(
+            client.chat.completions.create,
             model="llama-3.1-8b-instant",
             messages=[
                 {"role": "system", "content": "You are a document classification expert with a focus on identifying resumes. You MUST be extremely strict and conservative - only identify documents as resumes if they contain ALL the required elements of a resume/CV. When in doubt, classify as NOT a resume."},
@@ -97,137 +108,167 @@ async def is_resume_ai(text: str) -> tuple[bool, str]:
         
         # More robust parsing of the response
         if result.upper().startswith("YES:"):
-            return True, result[4:].strip()
+            return True, result[4:].strip(), True
         else:
             # Default to NO for any response that doesn't clearly start with YES
             explanation = result[3:].strip() if result.upper().startswith("NO:") else result
-            return False, f"This doesn't appear to be a resume. {explanation}"
+            return False, f"This doesn't appear to be a resume. {explanation}", True
         
     except Exception as e:
         # If AI fails, be conservative and reject the document
-        return False, f"Unable to verify if this is a resume: {str(e)}"
+        return False, f"Unable to verify if this is a resume: {str(e)}", False
+
+# Limits for external converter processes (per worker process)
+CONVERTER_TIMEOUT = float(os.getenv("RESUME_CONVERTER_TIMEOUT", "30"))
+MAX_CONVERTER_PROCESSES = int(os.getenv("RESUME_MAX_CONVERTER_PROCESSES", "4"))
+converter_semaphore = asyncio.Semaphore(MAX_CONVERTER_PROCESSES)
+
+# Pandoc reader for each extension; text formats are piped through stdin,
+# binary (zip based) formats need a real file on disk
+PANDOC_FORMATS = {'odt': 'odt', 'tex': 'latex', 'html': 'html', 'rtf': 'rtf'}
+PANDOC_BINARY_FORMATS = {'odt'}
+
 
 # Utility to extract text from file based on extension
-def extract_text(file: BytesIO, file_extension: str) -> str:
+async def extract_text(file: BytesIO, file_extension: str) -> str:
     if file_extension == 'pdf':
-        return extract_text_from_pdf(file)
+        return await extract_text_from_pdf(file)
     elif file_extension == 'docx':
-        return extract_text_from_docx(file)
+        return await extract_text_from_docx(file)
     elif file_extension == 'odt':
-        return extract_text_from_odt(file)
+        return await extract_text_from_odt(file)
     elif file_extension == 'tex':
-        return extract_text_from_tex(file)
+        return await extract_text_from_tex(file)
     elif file_extension == 'html':
-        return extract_text_from_html(file)
+        return await extract_text_from_html(file)
     elif file_extension == 'rtf':
-        return extract_text_from_rtf(file)
+        return await extract_text_from_rtf(file)
     else:
         file.seek(0)
         return file.read().decode('utf-8')
 
 
-# Function to extract text from PDF
-def extract_text_from_pdf(file: BytesIO) -> str:
-    text = ""
+# Function to extract text from PDF on the shared extraction process pool
+async def extract_text_from_pdf(file: BytesIO) -> str:
     try:
-        reader = PyPDF2.PdfReader(file)
-        for page in reader.pages:
-            text += page.extract_text() or ""
+        file.seek(0)
+        return await extract_pdf_text(file.read())
     except Exception as e:
         raise Exception(f"Error extracting PDF text: {e}")
-    return text
 
 
-# Function to extract text from DOCX using docx2txt
-def extract_text_from_docx(file: BytesIO) -> str:
+# Paragraphs of a document body or table cell, with tables walked row by row.
+# Merged cells repeat across the row, so each cell is only read once.
+def _docx_block_lines(block) -> list[str]:
+    lines = [paragraph.text for paragraph in block.paragraphs]
+    for table in block.tables:
+        seen = set()
+        for row in table.rows:
+            for cell in row.cells:
+                if cell._tc in seen:
+                    continue
+                seen.add(cell._tc)
+                lines.extend(_docx_block_lines(cell))
+    return lines
+
+
+def _docx_text(data: bytes) -> str:
+    document = docx.Document(BytesIO(data))
+    lines = _docx_block_lines(document)
+    # Many resumes keep contact details in the page header or footer
+    for section in document.sections:
+        for part in (section.header, section.first_page_header, section.footer, section.first_page_footer):
+            if not part.is_linked_to_previous:
+                lines.extend(_docx_block_lines(part))
+    return '\n'.join(line for line in lines if line.strip())
+
+
+# Function to extract text from DOCX in memory using python-docx, off the event loop
+async def extract_text_from_docx(file: BytesIO) -> str:
     try:
-        # Save the file temporarily for docx2txt processing
-        with open("temp.docx", "wb") as temp_file:
-            temp_file.write(file.read())
-        # Use subprocess to run docx2txt
-        result = subprocess.run(
-            ['docx2txt', 'temp.docx'], 
-            stdout=subprocess.PIPE, 
-            stderr=subprocess.PIPE
-        )
-        if result.returncode != 0:
-            raise Exception(f"Error extracting text from DOCX: {result.stderr.decode()}")
-        return result.stdout.decode('utf-8')
+        file.seek(0)
+        return await asyncio.to_thread(_docx_text, file.read())
     except Exception as e:
         raise Exception(f"Error extracting DOCX text: {e}")
+
+
+# Run an external converter with a bounded number of concurrent processes and a timeout
+async def run_converter(args: list[str], input_bytes: bytes | None = None) -> str:
+    async with converter_semaphore:
+        process = await asyncio.create_subprocess_exec(
+            *args,
+            stdin=asyncio.subprocess.PIPE if input_bytes is not None else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(input_bytes), timeout=CONVERTER_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise Exception(f"{args[0]} timed out after {CONVERTER_TIMEOUT}s")
+        finally:
+            # Also reached when the request is cancelled, so no converter outlives it
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+
+    if process.returncode != 0:
+        raise Exception(stderr.decode('utf-8', errors='replace'))
+    return stdout.decode('utf-8', errors='replace')
+
+
+# Convert a document to plain text with pandoc, from memory where the format allows it
+async def convert_with_pandoc(file: BytesIO, file_extension: str) -> str:
+    input_format = PANDOC_FORMATS[file_extension]
+    file.seek(0)
+    data = file.read()
+
+    # Prefer the warm worker pool; fall back to a one-shot process when it isn't running or can't be reached
+    if converter_pool.started:
+        try:
+            return await converter_pool.convert(data, input_format)
+        except ConverterUnavailable as e:
+            logger.warning(f"Falling back to one-shot pandoc: {e}")
+
+    if file_extension not in PANDOC_BINARY_FORMATS:
+        return await run_converter(['pandoc', '-f', input_format, '-t', 'plain'], data)
+
+    # Unique temp file per upload so concurrent requests never share a path
+    with tempfile.NamedTemporaryFile(suffix=f".{file_extension}", delete=False) as temp_file:
+        temp_file.write(data)
+    try:
+        return await run_converter(['pandoc', temp_file.name, '-f', input_format, '-t', 'plain'])
     finally:
-        # Clean up temporary file
-        if os.path.exists("temp.docx"):
-            os.remove("temp.docx")
+        os.remove(temp_file.name)
+
 
-# Function to extract text from ODT using pandoc (alternative to pypandoc)
-def extract_text_from_odt(file: BytesIO) -> str:
+# Function to extract text from ODT using pandoc
+async def extract_text_from_odt(file: BytesIO) -> str:
     try:
-        # Save the file temporarily for pandoc processing
-        with open("temp.odt", "wb") as temp_file:
-            temp_file.write(file.read())
-        # Extract text using pandoc (requires pandoc installed)
-        result = subprocess.run(
-            ['pandoc', 'temp.odt', '-t', 'plain'], 
-            stdout=subprocess.PIPE, stderr=subprocess.PIPE
-        )
-        if result.returncode != 0:
-            raise Exception(f"Error extracting text from ODT: {result.stderr.decode()}")
-        return result.stdout.decode('utf-8')
+        return await convert_with_pandoc(file, 'odt')
     except Exception as e:
         raise Exception(f"Error extracting ODT text: {e}")
 
 
 # Function to extract text from TEX using pandoc
-def extract_text_from_tex(file: BytesIO) -> str:
+async def extract_text_from_tex(file: BytesIO) -> str:
     try:
-        # Save the file temporarily for pandoc processing
-        with open("temp.tex", "wb") as temp_file:
-            temp_file.write(file.read())
-        # Extract text using pandoc (requires pandoc installed)
-        result = subprocess.run(
-            ['pandoc', 'temp.tex', '-t', 'plain'], 
-            stdout=subprocess.PIPE, stderr=subprocess.PIPE
-        )
-        if result.returncode != 0:
-            raise Exception(f"Error extracting text from TEX: {result.stderr.decode()}")
-        return result.stdout.decode('utf-8')
+        return await convert_with_pandoc(file, 'tex')
     except Exception as e:
         raise Exception(f"Error extracting TEX text: {e}")
 
 
 # Function to extract text from HTML using pandoc
-def extract_text_from_html(file: BytesIO) -> str:
+async def extract_text_from_html(file: BytesIO) -> str:
     try:
-        # Save the file temporarily for pandoc processing
-        with open("temp.html", "wb") as temp_file:
-            temp_file.write(file.read())
-        # Extract text using pandoc (requires pandoc installed)
-        result = subprocess.run(
-            ['pandoc', 'temp.html', '-t', 'plain'], 
-            stdout=subprocess.PIPE, stderr=subprocess.PIPE
-        )
-        if result.returncode != 0:
-            raise Exception(f"Error extracting text from HTML: {result.stderr.decode()}")
-        return result.stdout.decode('utf-8')
+        return await convert_with_pandoc(file, 'html')
     except Exception as e:
         raise Exception(f"Error extracting HTML text: {e}")
 
 
 # Function to extract text from RTF using pandoc
-def extract_text_from_rtf(file: BytesIO) -> str:
+async def extract_text_from_rtf(file: BytesIO) -> str:
     try:
-        # Save the file temporarily for pandoc processing
-        with open("temp.rtf", "wb") as temp_file:
-            temp_file.write(file.read())
-        # Extract text using pandoc (requires pandoc installed)
-        result = subprocess.run(
-            ['pandoc', 'temp.rtf', '-t', 'plain'], 
-            stdout=subprocess.PIPE, stderr=subprocess.PIPE
-        )
-        if result.returncode != 0:
-            raise Exception(f"Error extracting text from RTF: {result.stderr.decode()}")
-        return result.stdout.decode('utf-8')
+        return await convert_with_pandoc(file, 'rtf')
     except Exception as e:
         raise Exception(f"Error extracting RTF text: {e}")
 
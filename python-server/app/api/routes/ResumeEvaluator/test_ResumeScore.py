@@ -0,0 +1,96 @@
+import asyncio
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+os.environ.setdefault("GROQ_API_KEY", "test")
+
+from app.api.routes.ResumeEvaluator import ResumeScore  # noqa: E402
+from app.api.routes.ResumeEvaluator.evaluationCache import EvaluationCache  # noqa: E402
+
+RESUME_TEXT = "Jane Doe jane@example.com Experience Engineer at Acme 2020-2024 Education BSc Skills Python " * 3
+
+
+@pytest.fixture
+def client(monkeypatch):
+    async def extract_text(stream, extension):
+        return RESUME_TEXT
+
+    monkeypatch.setattr(ResumeScore, "extract_text", extract_text)
+    monkeypatch.setattr(ResumeScore, "evaluation_cache", EvaluationCache(max_entries=16))
+    app = FastAPI()
+    app.include_router(ResumeScore.router)
+    return TestClient(app)
+
+
+def upload(client):
+    return client.post("/evaluate-resume", files={"file": ("resume.txt", RESUME_TEXT.encode(), "text/plain")})
+
+
+def test_timeout_is_returned_as_504(client, monkeypatch):
+    async def slow_classification(text):
+        await asyncio.sleep(1)
+        return True, "resume", True
+
+    monkeypatch.setattr(ResumeScore, "is_resume_ai", slow_classification)
+    monkeypatch.setattr(ResumeScore, "EVALUATION_TIMEOUT", 0.05)
+
+    response = upload(client)
+    assert response.status_code == 504
+
+
+def test_ai_service_error_keeps_its_status(client, monkeypatch):
+    async def classification(text):
+        return True, "resume", True
+
+    async def failing_completion(system_content, user_content):
+        raise RuntimeError("service down")
+
+    monkeypatch.setattr(ResumeScore, "is_resume_ai", classification)
+    monkeypatch.setattr(ResumeScore, "run_completion", failing_completion)
+
+    response = upload(client)
+    assert response.status_code == 500
+
+
+def test_evaluation_is_returned(client, monkeypatch):
+    async def classification(text):
+        return True, "resume", True
+
+    async def completion(system_content, user_content):
+        return '{"score": "80"}'
+
+    monkeypatch.setattr(ResumeScore, "is_resume_ai", classification)
+    monkeypatch.setattr(ResumeScore, "run_completion", completion)
+
+    response = upload(client)
+    assert response.status_code == 200
+    assert response.json()["ats_evaluation"] == {"score": "80"}
+
+
+def test_each_request_counts_one_cache_lookup(client, monkeypatch):
+    async def classification(text):
+        return False, "not a resume", True
+
+    monkeypatch.setattr(ResumeScore, "is_resume_ai", classification)
+
+    upload(client)
+    stats = ResumeScore.evaluation_cache.stats()
+    assert stats["misses"] == 1
+    assert stats["hits"] == 0
+
+
+def test_unverified_classification_is_not_cached(client, monkeypatch):
+    calls = []
+
+    async def classification(text):
+        calls.append(text)
+        return False, "Unable to verify if this is a resume: service down", False
+
+    monkeypatch.setattr(ResumeScore, "is_resume_ai", classification)
+
+    upload(client)
+    upload(client)
+    assert len(calls) == 2
@@ -0,0 +1,124 @@
+import asyncio
+from io import BytesIO
+
+import httpx
+import pytest
+
+from app.api.routes.ResumeEvaluator import converterPool, resumeHelper
+from app.api.routes.ResumeEvaluator.converterPool import ConverterPool, ConverterUnavailable, PandocWorker
+
+
+class FakeProcess:
+    returncode = None
+
+    def kill(self):
+        self.returncode = -9
+
+    async def wait(self):
+        return self.returncode
+
+
+def fake_starts(monkeypatch, outcomes):
+    """Make PandocWorker._start_once succeed or raise according to outcomes, in call order."""
+    calls = []
+
+    async def start_once(self, http):
+        calls.append(self)
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        self.port = 9000 + len(calls)
+        self.process = FakeProcess()
+
+    monkeypatch.setattr(PandocWorker, "_start_once", start_once)
+    return calls
+
+
+def test_pool_keeps_workers_that_started(monkeypatch):
+    monkeypatch.setattr(converterPool, "START_ATTEMPTS", 1)
+    fake_starts(monkeypatch, [RuntimeError("port taken"), None, None])
+    pool = ConverterPool(size=3)
+
+    async def run():
+        await pool.start()
+        stats = pool.stats()
+        await pool.stop()
+        return stats
+
+    stats = asyncio.run(run())
+    assert stats["started"]
+    assert stats["workers"] == 2
+
+
+def test_pool_stays_stopped_when_no_worker_starts(monkeypatch):
+    monkeypatch.setattr(converterPool, "START_ATTEMPTS", 1)
+    fake_starts(monkeypatch, [OSError("no pandoc"), OSError("no pandoc")])
+    pool = ConverterPool(size=2)
+
+    asyncio.run(pool.start())
+    assert not pool.started
+
+
+def test_worker_start_retries_on_a_new_port(monkeypatch):
+    calls = fake_starts(monkeypatch, [RuntimeError("pandoc server exited during startup"), None])
+    worker = PandocWorker(timeout=1)
+
+    asyncio.run(worker.start(http=None))
+    assert len(calls) == 2
+    assert worker.alive
+
+
+def test_worker_start_gives_up_after_attempts(monkeypatch):
+    monkeypatch.setattr(converterPool, "START_ATTEMPTS", 2)
+    fake_starts(monkeypatch, [RuntimeError("exited"), RuntimeError("exited")])
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(PandocWorker(timeout=1).start(http=None))
+
+
+def test_unreachable_worker_falls_back_to_one_shot_pandoc(monkeypatch):
+    fake_starts(monkeypatch, [None])
+    pool = ConverterPool(size=1)
+    one_shot = []
+
+    async def post(*args, **kwargs):
+        raise httpx.ConnectError("connection refused")
+
+    async def run_converter(args, input_bytes=None):
+        one_shot.append(args)
+        return "converted"
+
+    monkeypatch.setattr(resumeHelper, "converter_pool", pool)
+    monkeypatch.setattr(resumeHelper, "run_converter", run_converter)
+
+    async def run():
+        await pool.start()
+        monkeypatch.setattr(pool._http, "post", post)
+        try:
+            return await resumeHelper.convert_with_pandoc(BytesIO(b"<p>hello</p>"), "html")
+        finally:
+            await pool.stop()
+
+    assert asyncio.run(run()) == "converted"
+    assert one_shot == [["pandoc", "-f", "html", "-t", "plain"]]
+    assert pool.failed == 1
+
+
+def test_conversion_errors_are_not_retried_one_shot(monkeypatch):
+    fake_starts(monkeypatch, [None])
+    pool = ConverterPool(size=1)
+
+    async def post(*args, **kwargs):
+        return httpx.Response(200, json={"error": "unknown reader"})
+
+    async def run():
+        await pool.start()
+        monkeypatch.setattr(pool._http, "post", post)
+        try:
+            await pool.convert(b"\\begin{document}", "latex")
+        finally:
+            await pool.stop()
+
+    with pytest.raises(Exception) as excinfo:
+        asyncio.run(run())
+    assert not isinstance(excinfo.value, ConverterUnavailable)
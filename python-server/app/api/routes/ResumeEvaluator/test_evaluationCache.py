@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+from app.api.routes.ResumeEvaluator.evaluationCache import EvaluationCache, make_cache_key
+
+
+def test_keys_depend_on_every_input():
+    base = make_cache_key("evaluation", "text", "Web Developer", "1")
+    assert base == make_cache_key("evaluation", "text", "Web Developer", "1")
+    assert base != make_cache_key("classification", "text", "Web Developer", "1")
+    assert base != make_cache_key("evaluation", "text", "Data Engineer", "1")
+    assert base != make_cache_key("evaluation", "text", "Web Developer", "2")
+    # Parts are delimited, so shifting text between them changes the key
+    assert make_cache_key("a", "bc", "", "1") != make_cache_key("ab", "c", "", "1")
+
+
+def test_hit_and_miss_are_counted():
+    async def scenario():
+        cache = EvaluationCache(max_entries=4)
+        assert await cache.get("key") is None
+        await cache.set("key", {"score": 1})
+        assert await cache.get("key") == {"score": 1}
+        return cache.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
+
+
+def test_untracked_lookups_are_not_counted():
+    async def scenario():
+        cache = EvaluationCache()
+        await cache.get("missing", track=False)
+        return cache.stats()
+
+    assert asyncio.run(scenario())["misses"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    async def scenario():
+        cache = EvaluationCache(max_entries=2)
+        await cache.set("a", 1)
+        await cache.set("b", 2)
+        await cache.get("a")
+        await cache.set("c", 3)
+        return [await cache.get(key) for key in ("a", "b", "c")]
+
+    assert asyncio.run(scenario()) == [1, None, 3]
+
+
+def test_entries_expire_after_ttl():
+    async def scenario():
+        cache = EvaluationCache(ttl_seconds=0.05)
+        await cache.set("key", "value")
+        time.sleep(0.1)
+        return await cache.get("key")
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_entries_survive_restart_with_sqlite(tmp_path):
+    db_path = str(tmp_path / "cache.sqlite")
+
+    async def write():
+        await EvaluationCache(db_path=db_path).set("key", ["a", 1])
+
+    async def read():
+        cache = EvaluationCache(db_path=db_path)
+        value = await cache.get("key")
+        return value, cache.stats()
+
+    asyncio.run(write())
+    value, stats = asyncio.run(read())
+    assert value == ["a", 1]
+    assert stats["disk_hits"] == 1
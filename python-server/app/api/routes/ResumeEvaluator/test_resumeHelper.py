@@ -0,0 +1,76 @@
+import asyncio
+import sys
+from io import BytesIO
+
+import docx
+import pytest
+
+from app.api.routes.ResumeEvaluator import resumeHelper
+from app.api.routes.ResumeEvaluator.resumeHelper import extract_text, run_converter
+
+
+def make_docx() -> BytesIO:
+    document = docx.Document()
+    document.add_paragraph("Jane Doe")
+    table = document.add_table(rows=2, cols=2)
+    table.cell(0, 0).text = "Skills"
+    table.cell(0, 1).text = "Python, SQL"
+    merged = table.cell(1, 0).merge(table.cell(1, 1))
+    merged.text = "Experience: five years"
+    merged.add_table(rows=1, cols=1).cell(0, 0).text = "Nested detail"
+    section = document.sections[0]
+    section.header.paragraphs[0].text = "jane@example.com"
+    section.footer.paragraphs[0].text = "References on request"
+    file = BytesIO()
+    document.save(file)
+    return file
+
+
+def test_docx_text_includes_tables_headers_and_footers():
+    lines = asyncio.run(extract_text(make_docx(), "docx")).splitlines()
+
+    assert lines[0] == "Jane Doe"
+    for text in ("Skills", "Python, SQL", "Nested detail", "jane@example.com", "References on request"):
+        assert text in lines
+    assert lines.count("Experience: five years") == 1
+
+
+def test_docx_is_parsed_off_the_event_loop(monkeypatch):
+    threads = []
+
+    async def to_thread(func, *args):
+        threads.append(func)
+        return func(*args)
+    monkeypatch.setattr(resumeHelper.asyncio, "to_thread", to_thread)
+
+    asyncio.run(extract_text(make_docx(), "docx"))
+    assert threads == [resumeHelper._docx_text]
+
+
+def test_converter_is_killed_when_the_request_is_cancelled(monkeypatch):
+    started = []
+    original = asyncio.create_subprocess_exec
+
+    async def create_subprocess_exec(*args, **kwargs):
+        process = await original(*args, **kwargs)
+        started.append(process)
+        return process
+
+    async def scenario():
+        task = asyncio.create_task(run_converter([sys.executable, "-c", "import time; time.sleep(30)"]))
+        while not started:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return started[0].returncode
+
+    monkeypatch.setattr(resumeHelper.asyncio, "create_subprocess_exec", create_subprocess_exec)
+    assert asyncio.run(scenario()) is not None
+
+
+def test_converter_timeout_kills_the_process(monkeypatch):
+    monkeypatch.setattr(resumeHelper, "CONVERTER_TIMEOUT", 0.1)
+
+    with pytest.raises(Exception, match="timed out"):
+        asyncio.run(run_converter([sys.executable, "-c", "import time; time.sleep(30)"]))
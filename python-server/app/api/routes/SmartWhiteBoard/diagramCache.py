@@ -0,0 +1,199 @@
+import copy
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, every worker warms its own cache
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Words that don't change which diagram is drawn ("draw me a flowchart of binary search")
+STOPWORDS = frozenset({
+    "a", "an", "the", "of", "for", "to", "in", "on", "and", "with", "about", "how", "what", "is", "are",
+    "me", "my", "i", "we", "us", "our", "please", "can", "you", "could", "would", "show", "draw", "make",
+    "create", "generate", "give", "build", "explain", "illustrate",
+})
+
+
+def normalize_prompt(prompt: str) -> str:
+    words = re.findall(r"\w+", prompt.casefold())
+    kept = [word for word in words if word not in STOPWORDS]
+    # Word order is kept: "celsius to fahrenheit" and "fahrenheit to celsius" are different
+    # diagrams. A prompt made only of stopwords is still keyed on its own words.
+    return " ".join(kept or words)
+
+
+def prompt_key(prompt: str) -> str:
+    return hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest()
+
+
+def regenerate_ids(shapes: list[dict]) -> list[dict]:
+    """
+    Deep copy of the shapes with fresh ids, so a cached diagram can be
+    drawn next to another copy of itself. Arrow bindings follow their shapes.
+    """
+    shapes = copy.deepcopy(shapes)
+    ids = {}
+    for shape in shapes:
+        old_id = shape.get("id")
+        if isinstance(old_id, str):
+            stem = old_id.split(":", 1)[-1].rsplit("-", 1)[0] or "shape"
+            ids[old_id] = f"shape:{stem}-{uuid.uuid4().hex[:6]}"
+            shape["id"] = ids[old_id]
+    for shape in shapes:
+        if shape.get("type") != "arrow":
+            continue
+        props = shape.get("props") or {}
+        for end in ("start", "end"):
+            binding = props.get(end)
+            if isinstance(binding, dict) and binding.get("boundShapeId") in ids:
+                binding["boundShapeId"] = ids[binding["boundShapeId"]]
+    return shapes
+
+
+class DiagramEntry:
+    def __init__(self, prompt: str, shapes: list[dict], vector: Optional[list[float]]):
+        self.prompt = prompt
+        self.shapes = shapes
+        self.vector = np.asarray(vector, dtype=np.float32) if vector is not None else None
+        self.created_at = time.time()
+
+
+class DiagramCache:
+    """
+    Generated diagrams keyed by normalized prompt, evicted least recently
+    used beyond max_entries and after ttl_seconds. Lookups match the
+    normalized prompt exactly, then optionally the closest cached prompt
+    whose embedding has cosine similarity of at least similarity_threshold
+    (0 disables). Every hit is returned with new shape ids.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 86400, similarity_threshold: float = 0.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._entries: OrderedDict[str, DiagramEntry] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @property
+    def semantic(self) -> bool:
+        return self.similarity_threshold > 0
+
+    def __contains__(self, prompt: str) -> bool:
+        with self._lock:
+            self._expire()
+            return prompt_key(prompt) in self._entries
+
+    def get(self, prompt: str, vector: Optional[list[float]] = None, count_miss: bool = True) -> Optional[list[dict]]:
+        """
+        Cached shapes for the prompt, or None. count_miss=False leaves a miss
+        uncounted, for an exact-only check that a similarity lookup follows.
+        """
+        with self._lock:
+            self._expire()
+            key = prompt_key(prompt)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.hits += 1
+            elif self.semantic and vector is not None:
+                key = self._closest(np.asarray(vector, dtype=np.float32))
+                if key is not None:
+                    entry = self._entries[key]
+                    self.semantic_hits += 1
+            if entry is None:
+                if count_miss:
+                    self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            shapes = entry.shapes
+        return regenerate_ids(shapes)
+
+    def _closest(self, vector: np.ndarray) -> Optional[str]:
+        keys = [key for key, entry in self._entries.items() if entry.vector is not None]
+        if not keys:
+            return None
+        matrix = np.stack([self._entries[key].vector for key in keys])
+        norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(vector) or 1.0)
+        similarities = matrix @ vector / np.where(norms == 0, 1.0, norms)
+        best = int(np.argmax(similarities))
+        return keys[best] if similarities[best] >= self.similarity_threshold else None
+
+    def set(self, prompt: str, shapes: list[dict], vector: Optional[list[float]] = None) -> None:
+        key = prompt_key(prompt)
+        with self._lock:
+            self._entries[key] = DiagramEntry(prompt, copy.deepcopy(shapes), vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.ttl_seconds
+        for key in [key for key, entry in self._entries.items() if entry.created_at < cutoff]:
+            del self._entries[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.semantic_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.semantic_hits) / lookups if lookups else 0.0,
+                "similarity_threshold": self.similarity_threshold,
+            }
+
+
+# Held open for the life of the process once acquired; the OS releases the lock when it exits
+_warmup_lock_file = None
+
+
+def acquire_warmup_lock(path: str) -> bool:
+    """
+    True in the one process on the host that should generate the seed
+    prompts, so N uvicorn workers don't each spend len(seeds) Groq calls.
+    """
+    global _warmup_lock_file
+    if _warmup_lock_file is not None:
+        return True
+    if fcntl is None:
+        return True
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        lock_file = open(path, "a")
+    except OSError as e:
+        logger.warning(f"Could not open diagram cache warm-up lock, warming anyway: {e}")
+        return True
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    _warmup_lock_file = lock_file
+    return True
+
+
+def load_seed_prompts(path: str) -> list[str]:
+    """One prompt per line; blank lines and lines starting with # are skipped."""
+    try:
+        with open(path, encoding="utf-8") as seed_file:
+            lines = [line.strip() for line in seed_file]
+    except OSError as e:
+        logger.warning(f"Could not read diagram cache seed list: {e}")
+        return []
+    return [line for line in lines if line and not line.startswith("#")]
@@ -0,0 +1,610 @@
+import logging
+import math
+import re
+import textwrap
+import uuid
+from collections import defaultdict
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+FLOWCHART = "flowchart"
+MINDMAP = "mindmap"
+ORGCHART = "orgchart"
+
+GEO_TYPES = {"rectangle", "oval", "ellipse", "diamond", "triangle", "hexagon", "cloud", "star", "trapezoid"}
+COLORS = {"black", "grey", "light-violet", "violet", "blue", "light-blue", "yellow", "orange", "green",
+          "light-green", "light-red", "red", "white"}
+# Colors cycled through for nodes that don't name a valid one
+PALETTE = ["light-blue", "light-green", "yellow", "orange", "light-violet", "light-red", "blue", "green", "violet"]
+
+# Text metrics for tldraw's "m" size draw font
+CHAR_WIDTH = 11
+LINE_HEIGHT = 28
+WRAP_CHARS = 24
+PADDING_X = 48
+PADDING_Y = 32
+MIN_WIDTH = 120
+MIN_HEIGHT = 60
+# Geos whose label area is smaller than their bounding box
+GEO_SCALE = {
+    "diamond": (1.5, 1.5),
+    "oval": (1.2, 1.2),
+    "ellipse": (1.2, 1.2),
+    "cloud": (1.4, 1.4),
+    "hexagon": (1.2, 1.0),
+    "triangle": (1.6, 1.8),
+    "star": (1.8, 1.8),
+    "trapezoid": (1.3, 1.0),
+}
+
+NODE_GAP = 60
+LAYER_GAP = 100
+RING_GAP = 80
+MARGIN = 50
+TITLE_HEIGHT = 80
+TITLE_WIDTH = 500
+# Width and spacing of the placeholders that route long edges through intermediate layers
+DUMMY_WIDTH = 20
+DUMMY_GAP = 20
+ORDERING_SWEEPS = 8
+POSITIONING_PASSES = 4
+
+
+def diagram_kind(name: Optional[str], default: str = FLOWCHART) -> str:
+    """Map the diagram type named by the model ("Mind map", "org-chart", "tree", ...) to a layout."""
+    name = re.sub(r"[^a-z]", "", (name or "").lower())
+    if name.startswith(("mind", "concept", "radial")):
+        return MINDMAP
+    if name.startswith(("org", "tree", "hierarch")):
+        return ORGCHART
+    if name.startswith(("flow", "process", "sequence", "layer")):
+        return FLOWCHART
+    return default
+
+
+def guess_kind(prompt: str) -> str:
+    """Diagram type from the wording of the prompt, for when the model doesn't say."""
+    words = set(re.findall(r"\w+", prompt.lower()))
+    if words & {"mind", "mindmap", "concept", "idea", "ideas", "brainstorm"}:
+        return MINDMAP
+    if words & {"org", "organization", "organisation", "orgchart", "hierarchy", "reporting", "team", "tree"}:
+        return ORGCHART
+    return FLOWCHART
+
+
+def node_size(text: str, geo: str = "rectangle") -> tuple[int, int]:
+    """Width and height that fit the wrapped text inside the geo."""
+    lines = []
+    for paragraph in text.splitlines() or [""]:
+        lines.extend(textwrap.wrap(paragraph, WRAP_CHARS) or [""])
+    width = max(MIN_WIDTH, max(len(line) for line in lines) * CHAR_WIDTH + PADDING_X)
+    height = max(MIN_HEIGHT, len(lines) * LINE_HEIGHT + PADDING_Y)
+    scale_x, scale_y = GEO_SCALE.get(geo, (1.0, 1.0))
+    return round(width * scale_x), round(height * scale_y)
+
+
+def _successors(order: list[str], edges: list[tuple[str, str]]) -> dict[str, list[str]]:
+    successors = {node: [] for node in order}
+    for source, target in edges:
+        if source != target and target not in successors[source]:
+            successors[source].append(target)
+    return successors
+
+
+def _break_cycles(order: list[str], successors: dict[str, list[str]]) -> set[tuple[str, str]]:
+    """Edges to reverse so the graph is acyclic: those closing a cycle in a DFS taken in input order."""
+    reversed_edges = set()
+    state = dict.fromkeys(order, 0)  # 0 unvisited, 1 on the DFS stack, 2 finished
+    for root in order:
+        if state[root]:
+            continue
+        state[root] = 1
+        stack = [(root, iter(successors[root]))]
+        while stack:
+            node, remaining = stack[-1]
+            target = next(remaining, None)
+            if target is None:
+                state[node] = 2
+                stack.pop()
+            elif state[target] == 1:
+                reversed_edges.add((node, target))
+            elif state[target] == 0:
+                state[target] = 1
+                stack.append((target, iter(successors[target])))
+    return reversed_edges
+
+
+def _crossings(upper: list[str], lower: list[str], successors: dict[str, list[str]]) -> int:
+    position = {node: index for index, node in enumerate(lower)}
+    links = [(i, position[target]) for i, node in enumerate(upper) for target in successors[node] if target in position]
+    return sum(
+        1
+        for a in range(len(links))
+        for b in range(a + 1, len(links))
+        if (links[a][0] - links[b][0]) * (links[a][1] - links[b][1]) < 0
+    )
+
+
+def _pack(layer: list[str], desired: dict[str, float], widths: dict[str, float], gap) -> dict[str, float]:
+    """
+    x centres as close to desired as the layer's order and spacing allow:
+    the average of packing against the left and against the right, which
+    both keep the minimum spacing.
+    """
+    separation = [(widths[a] + widths[b]) / 2 + gap(a, b) for a, b in zip(layer, layer[1:])]
+    left = [desired[layer[0]]]
+    for i in range(1, len(layer)):
+        left.append(max(desired[layer[i]], left[-1] + separation[i - 1]))
+    right = [desired[layer[-1]]]
+    for i in range(len(layer) - 2, -1, -1):
+        right.append(min(desired[layer[i]], right[-1] - separation[i]))
+    right.reverse()
+    return {node: (l + r) / 2 for node, l, r in zip(layer, left, right)}
+
+
+def layered_layout(order: list[str], sizes: dict[str, tuple[int, int]],
+                   edges: list[tuple[str, str]]) -> dict[str, tuple[float, float]]:
+    """
+    Sugiyama-style top-to-bottom layout: cycles are broken, nodes are put
+    on longest-path layers, long edges get placeholder nodes, layers are
+    reordered by barycentre to cut crossings, and nodes are then pulled
+    towards the nodes they connect to. Returns centre points.
+    """
+    successors = _successors(order, edges)
+    reversed_edges = _break_cycles(order, successors)
+    dag = [(t, s) if (s, t) in reversed_edges else (s, t) for s in order for t in successors[s]]
+
+    layer_of = dict.fromkeys(order, 0)
+    incoming = {node: 0 for node in order}
+    for _, target in dag:
+        incoming[target] += 1
+    ready = [node for node in order if incoming[node] == 0]
+    forward = defaultdict(list)
+    for source, target in dag:
+        forward[source].append(target)
+    while ready:
+        node = ready.pop(0)
+        for target in forward[node]:
+            layer_of[target] = max(layer_of[target], layer_of[node] + 1)
+            incoming[target] -= 1
+            if incoming[target] == 0:
+                ready.append(target)
+
+    # Split edges spanning several layers into single-layer hops through placeholders
+    widths = {node: sizes[node][0] for node in order}
+    dummies = set()
+    down = defaultdict(list)
+    up = defaultdict(list)
+    for index, (source, target) in enumerate(dag):
+        previous = source
+        for layer in range(layer_of[source] + 1, layer_of[target]):
+            dummy = f"\0dummy-{index}-{layer}"
+            dummies.add(dummy)
+            layer_of[dummy] = layer
+            widths[dummy] = DUMMY_WIDTH
+            down[previous].append(dummy)
+            up[dummy].append(previous)
+            previous = dummy
+        down[previous].append(target)
+        up[target].append(previous)
+
+    layers = [[] for _ in range(max(layer_of.values(), default=0) + 1)]
+    for node in layer_of:
+        layers[layer_of[node]].append(node)
+
+    def total_crossings(candidate):
+        return sum(_crossings(candidate[i], candidate[i + 1], down) for i in range(len(candidate) - 1))
+
+    def reorder(layer, neighbours, adjacent):
+        position = {node: index for index, node in enumerate(adjacent)}
+        current = {node: index for index, node in enumerate(layer)}
+
+        def barycentre(node):
+            linked = [position[other] for other in neighbours[node] if other in position]
+            return sum(linked) / len(linked) if linked else current[node]
+        return sorted(layer, key=barycentre)
+
+    best, best_crossings = [list(layer) for layer in layers], total_crossings(layers)
+    for _ in range(ORDERING_SWEEPS):
+        if best_crossings == 0:
+            break
+        for i in range(1, len(layers)):
+            layers[i] = reorder(layers[i], up, layers[i - 1])
+        for i in range(len(layers) - 2, -1, -1):
+            layers[i] = reorder(layers[i], down, layers[i + 1])
+        crossings = total_crossings(layers)
+        if crossings < best_crossings:
+            best, best_crossings = [list(layer) for layer in layers], crossings
+    layers = best
+
+    def gap(a, b):
+        return DUMMY_GAP if a in dummies or b in dummies else NODE_GAP
+
+    x = {}
+    for layer in layers:
+        x.update(_pack(layer, dict.fromkeys(layer, 0.0), widths, gap))
+    for _ in range(POSITIONING_PASSES):
+        for sweep, neighbours in ((range(1, len(layers)), up), (range(len(layers) - 2, -1, -1), down)):
+            for i in sweep:
+                desired = {}
+                for node in layers[i]:
+                    linked = [x[other] for other in neighbours[node]]
+                    desired[node] = sum(linked) / len(linked) if linked else x[node]
+                x.update(_pack(layers[i], desired, widths, gap))
+
+    positions = {}
+    top = 0.0
+    for layer in layers:
+        height = max((sizes[node][1] for node in layer if node not in dummies), default=0)
+        for node in layer:
+            if node not in dummies:
+                positions[node] = (x[node], top + height / 2)
+        top += height + LAYER_GAP
+    return positions
+
+
+def _spanning_tree(order: list[str], edges: list[tuple[str, str]], root: str) -> dict[str, list[str]]:
+    """Children of each node in a breadth-first tree from root; unreachable nodes hang off the root."""
+    neighbours = defaultdict(list)
+    for source, target in edges:
+        neighbours[source].append(target)
+        neighbours[target].append(source)
+    children = {node: [] for node in order}
+    seen = {root}
+    queue = [root]
+    while queue:
+        node = queue.pop(0)
+        for other in neighbours[node]:
+            if other not in seen:
+                seen.add(other)
+                children[node].append(other)
+                queue.append(other)
+    for node in order:
+        if node not in seen:
+            children[root].append(node)
+            seen.add(node)
+    return children
+
+
+def tree_layout(order: list[str], sizes: dict[str, tuple[int, int]],
+                edges: list[tuple[str, str]]) -> dict[str, tuple[float, float]]:
+    """
+    Top-down tree for hierarchies. Each node sits centred above the block
+    of its children's subtrees; nodes with no parent become separate roots
+    placed side by side. Returns centre points.
+    """
+    has_parent = {target for source, target in edges if source != target}
+    roots = [node for node in order if node not in has_parent] or order[:1]
+    outgoing = defaultdict(list)
+    for source, target in edges:
+        outgoing[source].append(target)
+    children = {node: [] for node in order}
+    seen = set(roots)
+
+    def grow(queue):
+        while queue:
+            node = queue.pop(0)
+            for target in outgoing[node]:
+                if target not in seen:
+                    seen.add(target)
+                    children[node].append(target)
+                    queue.append(target)
+
+    grow(list(roots))
+    # Nodes only reachable through a cycle start trees of their own
+    for node in order:
+        if node not in seen:
+            roots.append(node)
+            seen.add(node)
+            grow([node])
+
+    depth = {}
+    stack = [(root, 0) for root in roots]
+    while stack:
+        node, level = stack.pop()
+        depth[node] = level
+        stack.extend((child, level + 1) for child in children[node])
+
+    subtree_width = {}
+
+    def measure(node):
+        child_total = sum(measure(child) for child in children[node]) + NODE_GAP * max(0, len(children[node]) - 1)
+        subtree_width[node] = max(sizes[node][0], child_total)
+        return subtree_width[node]
+
+    row_height = defaultdict(int)
+    for node, level in depth.items():
+        row_height[level] = max(row_height[level], sizes[node][1])
+    row_top = {}
+    top = 0.0
+    for level in sorted(row_height):
+        row_top[level] = top
+        top += row_height[level] + LAYER_GAP
+
+    positions = {}
+
+    def place(node, left):
+        positions[node] = (left + subtree_width[node] / 2, row_top[depth[node]] + row_height[depth[node]] / 2)
+        child_total = sum(subtree_width[child] for child in children[node]) + NODE_GAP * max(0, len(children[node]) - 1)
+        child_left = left + (subtree_width[node] - child_total) / 2
+        for child in children[node]:
+            place(child, child_left)
+            child_left += subtree_width[child] + NODE_GAP
+
+    left = 0.0
+    for root in roots:
+        measure(root)
+        place(root, left)
+        left += subtree_width[root] + NODE_GAP
+    return positions
+
+
+def radial_layout(order: list[str], sizes: dict[str, tuple[int, int]],
+                  edges: list[tuple[str, str]]) -> dict[str, tuple[float, float]]:
+    """
+    Mind map around the best-connected node. Each ring is one step further
+    from the centre, and every branch gets an arc proportional to the
+    number of leaves under it. Returns centre points.
+    """
+    degree = defaultdict(int)
+    for source, target in edges:
+        if source != target:
+            degree[source] += 1
+            degree[target] += 1
+    root = max(order, key=lambda node: degree[node])
+    children = _spanning_tree(order, edges, root)
+
+    leaves = {}
+    rings = defaultdict(list)
+    stack = [(root, 0)]
+    visit_order = []
+    while stack:
+        node, level = stack.pop()
+        visit_order.append(node)
+        rings[level].append(node)
+        stack.extend((child, level + 1) for child in children[node])
+    for node in reversed(visit_order):
+        leaves[node] = sum(leaves[child] for child in children[node]) or 1
+
+    span = {root: 2 * math.pi}
+    for node in visit_order:
+        for child in children[node]:
+            span[child] = span[node] * leaves[child] / leaves[node]
+
+    # Rings far enough apart for the largest node, long enough to hold their nodes, and wide
+    # enough that each node's own arc clears its diagonal: neighbours on a ring then never touch
+    step = max(max(sizes[node]) for node in order) + RING_GAP
+    radius = {0: 0.0}
+    for level in range(1, len(rings)):
+        circumference = sum(sizes[node][0] + NODE_GAP for node in rings[level])
+        radius[level] = max(radius[level - 1] + step, circumference / (2 * math.pi))
+        for node in rings[level]:
+            chord = 2 * math.sin(min(span[node], math.pi) / 2)
+            radius[level] = max(radius[level], (math.hypot(*sizes[node]) + NODE_GAP) / chord)
+
+    positions = {root: (0.0, 0.0)}
+    stack = [(root, 0, -math.pi / 2, 3 * math.pi / 2)]
+    while stack:
+        node, level, start, end = stack.pop()
+        angle = start
+        for child in children[node]:
+            span = (end - start) * leaves[child] / leaves[node]
+            middle = angle + span / 2
+            positions[child] = (radius[level + 1] * math.cos(middle), radius[level + 1] * math.sin(middle))
+            stack.append((child, level + 1, angle, angle + span))
+            angle += span
+    return positions
+
+
+LAYOUTS = {FLOWCHART: layered_layout, MINDMAP: radial_layout, ORGCHART: tree_layout}
+
+
+class DiagramBuilder:
+    """
+    Nodes and edges of a diagram, which may arrive a few at a time while a
+    completion streams, laid out into tldraw shapes on demand. Shape ids are
+    fixed when a node or edge is added, so each render extends the last.
+    Edges are only drawn once both of their nodes are known.
+    """
+
+    def __init__(self, title: str, kind: str = FLOWCHART):
+        self.title = title
+        self.kind = kind
+        self.nodes: dict[str, dict] = {}
+        self.edges: list[dict] = []
+        self._edge_keys: set[tuple[str, str]] = set()
+        self._title_id = f"shape:title-{uuid.uuid4().hex[:6]}"
+
+    def add(self, item: dict) -> bool:
+        """Returns whether the item changed what would be drawn."""
+        if not isinstance(item, dict):
+            return False
+        if "from" in item or "to" in item:
+            return self._add_edge(item)
+        return self._add_node(item)
+
+    def _add_node(self, item: dict) -> bool:
+        node_id = str(item.get("id") or "").strip()
+        text = str(item.get("text") or item.get("label") or "").strip()
+        if not node_id or not text or node_id in self.nodes:
+            logger.debug(f"Skipping invalid or duplicate node {node_id!r}")
+            return False
+        geo = str(item.get("shape") or item.get("geo") or "rectangle").lower()
+        color = str(item.get("color") or "").lower()
+        self.nodes[node_id] = {
+            "shape_id": f"shape:node-{uuid.uuid4().hex[:6]}",
+            "text": text,
+            "geo": geo if geo in GEO_TYPES else "rectangle",
+            "color": color if color in COLORS else PALETTE[len(self.nodes) % len(PALETTE)],
+        }
+        return True
+
+    def _add_edge(self, item: dict) -> bool:
+        source = str(item.get("from") or "").strip()
+        target = str(item.get("to") or "").strip()
+        if not source or not target or source == target or (source, target) in self._edge_keys:
+            logger.debug(f"Skipping invalid or duplicate edge {source!r} -> {target!r}")
+            return False
+        self._edge_keys.add((source, target))
+        self.edges.append({
+            "shape_id": f"shape:arrow-{uuid.uuid4().hex[:6]}",
+            "from": source,
+            "to": target,
+            "label": str(item.get("label") or "").strip(),
+        })
+        return source in self.nodes and target in self.nodes
+
+    def shapes(self) -> list[dict]:
+        if not self.nodes:
+            return []
+        order = list(self.nodes)
+        edges = [edge for edge in self.edges if edge["from"] in self.nodes and edge["to"] in self.nodes]
+        sizes = {node_id: node_size(node["text"], node["geo"]) for node_id, node in self.nodes.items()}
+        centres = LAYOUTS.get(self.kind, layered_layout)(order, sizes, [(edge["from"], edge["to"]) for edge in edges])
+
+        # Shift the drawing below the title, with its left edge at the margin
+        left = min(x - sizes[node_id][0] / 2 for node_id, (x, _) in centres.items())
+        top = min(y - sizes[node_id][1] / 2 for node_id, (_, y) in centres.items())
+        right = max(x + sizes[node_id][0] / 2 for node_id, (x, _) in centres.items())
+        # A drawing narrower than the title is centred under it, so nothing starts left of the margin
+        width = max(right - left, TITLE_WIDTH)
+        offset_x = MARGIN - left + (width - (right - left)) / 2
+        offset_y = MARGIN + TITLE_HEIGHT - top
+        centres = {node_id: (x + offset_x, y + offset_y) for node_id, (x, y) in centres.items()}
+
+        shapes = [self._title_shape(MARGIN + width / 2)]
+        for index, node_id in enumerate(order):
+            shapes.append(self._node_shape(self.nodes[node_id], centres[node_id], sizes[node_id], index + 1))
+        for index, edge in enumerate(edges):
+            shapes.append(self._edge_shape(edge, centres, index + 1))
+        return shapes
+
+    def _title_shape(self, centre_x: float) -> dict:
+        return {
+            "id": self._title_id,
+            "typeName": "shape",
+            "type": "text",
+            "x": round(centre_x - TITLE_WIDTH / 2),
+            "y": MARGIN,
+            "rotation": 0,
+            "isLocked": False,
+            "opacity": 1,
+            "index": "a0",
+            "parentId": "page:page",
+            "props": {
+                "text": self.title[:1].upper() + self.title[1:],
+                "color": "black",
+                "size": "l",
+                "font": "draw",
+                "textAlign": "middle",
+                "w": TITLE_WIDTH,
+                "autoSize": True,
+                "scale": 1,
+            },
+        }
+
+    @staticmethod
+    def _node_shape(node: dict, centre: tuple[float, float], size: tuple[int, int], index: int) -> dict:
+        width, height = size
+        return {
+            "id": node["shape_id"],
+            "typeName": "shape",
+            "type": "geo",
+            "x": round(centre[0] - width / 2),
+            "y": round(centre[1] - height / 2),
+            "rotation": 0,
+            "isLocked": False,
+            "opacity": 1,
+            "index": f"a{index}",
+            "parentId": "page:page",
+            "props": {
+                "geo": node["geo"],
+                "w": width,
+                "h": height,
+                "text": node["text"],
+                "color": node["color"],
+                "labelColor": "black",
+                "size": "m",
+                "font": "draw",
+                "align": "middle",
+                "verticalAlign": "middle",
+                "fill": "solid",
+                "dash": "draw",
+                "url": "",
+                "growY": 0,
+                "scale": 1,
+            },
+        }
+
+    def _anchors(self, source: tuple[float, float], target: tuple[float, float]) -> tuple[dict, dict]:
+        if self.kind == MINDMAP:
+            return {"x": 0.5, "y": 0.5}, {"x": 0.5, "y": 0.5}
+        if target[1] > source[1]:
+            return {"x": 0.5, "y": 1.0}, {"x": 0.5, "y": 0.0}
+        if target[1] < source[1]:
+            # Loops back up the chart
+            return {"x": 1.0, "y": 0.5}, {"x": 1.0, "y": 0.5}
+        if target[0] > source[0]:
+            return {"x": 1.0, "y": 0.5}, {"x": 0.0, "y": 0.5}
+        return {"x": 0.0, "y": 0.5}, {"x": 1.0, "y": 0.5}
+
+    def _edge_shape(self, edge: dict, centres: dict[str, tuple[float, float]], index: int) -> dict:
+        source, target = centres[edge["from"]], centres[edge["to"]]
+        start_anchor, end_anchor = self._anchors(source, target)
+        return {
+            "id": edge["shape_id"],
+            "typeName": "shape",
+            "type": "arrow",
+            "x": round(source[0]),
+            "y": round(source[1]),
+            "rotation": 0,
+            "isLocked": False,
+            "opacity": 1,
+            "index": f"az{index}",
+            "parentId": "page:page",
+            "props": {
+                "dash": "draw",
+                "size": "m",
+                "fill": "none",
+                "color": "black",
+                "labelColor": "black",
+                "bend": 0,
+                "start": {
+                    "type": "binding",
+                    "boundShapeId": self.nodes[edge["from"]]["shape_id"],
+                    "normalizedAnchor": start_anchor,
+                    "isExact": False
+                },
+                "end": {
+                    "type": "binding",
+                    "boundShapeId": self.nodes[edge["to"]]["shape_id"],
+                    "normalizedAnchor": end_anchor,
+                    "isExact": False
+                },
+                "arrowheadStart": "none",
+                "arrowheadEnd": "arrow",
+                "text": edge["label"],
+                "font": "draw"
+            },
+        }
+
+
+def build_diagram(topology, title: str, default_kind: str = FLOWCHART) -> list[dict]:
+    """
+    Lay out a complete topology: {"diagram": type, "nodes": [...], "edges": [...]},
+    or a bare list mixing nodes and edges.
+    """
+    if isinstance(topology, dict):
+        kind = diagram_kind(topology.get("diagram") or topology.get("type"), default_kind)
+        items = list(topology.get("nodes") or []) + list(topology.get("edges") or [])
+    elif isinstance(topology, list):
+        kind, items = default_kind, topology
+    else:
+        raise ValueError("Diagram topology must be a JSON object or list.")
+    builder = DiagramBuilder(title, kind)
+    for item in items:
+        builder.add(item)
+    if not builder.nodes:
+        raise ValueError("Diagram topology has no valid nodes.")
+    return builder.shapes()
@@ -0,0 +1,287 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi import WebSocket
+
+logger = logging.getLogger(__name__)
+
+# Client ids per query when polling versions, under SQLite's bound parameter limit
+VERSION_QUERY_BATCH = 500
+
+
+def next_version(previous: int = 0) -> int:
+    """
+    Session versions come from the nanosecond clock, so a session written again
+    after eviction still gets a newer version than anything already sent.
+    """
+    return max(time.time_ns(), previous + 1)
+
+
+class DiagramSession:
+    def __init__(self, shapes: list[dict], version: int, updated_at: float, size: int):
+        self.shapes = shapes
+        self.version = version
+        self.updated_at = updated_at
+        self.size = size
+
+
+class MemorySessionStore:
+    """
+    Per-process diagram results, evicted least recently written once either
+    max_entries or max_bytes (JSON size of the shapes) is exceeded, and
+    after ttl_seconds without an update.
+    """
+
+    shared = False
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 64 * 1024 * 1024, ttl_seconds: float = 900):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._sessions: OrderedDict[str, DiagramSession] = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.evictions = 0
+
+    def versions(self, client_ids: list[str]) -> dict[str, int]:
+        versions = {}
+        for client_id in client_ids:
+            session = self.get(client_id)
+            if session is not None:
+                versions[client_id] = session.version
+        return versions
+
+    def get(self, client_id: str) -> Optional[DiagramSession]:
+        with self._lock:
+            session = self._sessions.get(client_id)
+            if session is not None and session.updated_at + self.ttl_seconds <= time.time():
+                self._drop(client_id)
+                return None
+            return session
+
+    def set(self, client_id: str, shapes: list[dict]) -> DiagramSession:
+        size = len(json.dumps(shapes))
+        with self._lock:
+            previous = self._sessions.get(client_id)
+            version = next_version(previous.version if previous is not None else 0)
+            self._drop(client_id)
+            session = DiagramSession(shapes, version, time.time(), size)
+            self._sessions[client_id] = session
+            self.total_bytes += size
+            self._evict()
+            return session
+
+    def delete(self, client_id: str) -> None:
+        with self._lock:
+            self._drop(client_id)
+
+    def _drop(self, client_id: str) -> None:
+        session = self._sessions.pop(client_id, None)
+        if session is not None:
+            self.total_bytes -= session.size
+
+    def _evict(self) -> None:
+        cutoff = time.time() - self.ttl_seconds
+        # Keep the session just written, even if it alone exceeds the budget
+        while len(self._sessions) > 1:
+            client_id, oldest = next(iter(self._sessions.items()))
+            if (oldest.updated_at > cutoff and len(self._sessions) <= self.max_entries
+                    and self.total_bytes <= self.max_bytes):
+                break
+            self._drop(client_id)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "entries": len(self._sessions),
+                "bytes": self.total_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+            }
+
+
+class SqliteSessionStore:
+    """
+    Diagram results in a SQLite file shared by every worker process on the
+    host, so a result generated in one worker can be delivered by another.
+    Same limits as MemorySessionStore; the shapes themselves stay on disk.
+    """
+
+    shared = True
+
+    def __init__(self, db_path: str, max_entries: int = 1000, max_bytes: int = 64 * 1024 * 1024,
+                 ttl_seconds: float = 900):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self.evictions = 0
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS diagram_sessions ("
+            "client_id TEXT PRIMARY KEY, shapes TEXT NOT NULL, version INTEGER NOT NULL, "
+            "updated_at REAL NOT NULL, size INTEGER NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS diagram_sessions_updated ON diagram_sessions (updated_at)")
+        self._db.commit()
+
+    def versions(self, client_ids: list[str]) -> dict[str, int]:
+        """Cheap check for newer results, for every socket on this process at once, without loading shapes."""
+        versions = {}
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            for start in range(0, len(client_ids), VERSION_QUERY_BATCH):
+                batch = client_ids[start:start + VERSION_QUERY_BATCH]
+                rows = self._db.execute(
+                    f"SELECT client_id, version FROM diagram_sessions "
+                    f"WHERE client_id IN ({', '.join('?' * len(batch))}) AND updated_at > ?",
+                    (*batch, cutoff)
+                ).fetchall()
+                versions.update(rows)
+        return versions
+
+    def get(self, client_id: str) -> Optional[DiagramSession]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT shapes, version, updated_at, size FROM diagram_sessions WHERE client_id = ? AND updated_at > ?",
+                (client_id, time.time() - self.ttl_seconds)
+            ).fetchone()
+        if row is None:
+            return None
+        return DiagramSession(json.loads(row[0]), row[1], row[2], row[3])
+
+    def set(self, client_id: str, shapes: list[dict]) -> DiagramSession:
+        data = json.dumps(shapes)
+        now = time.time()
+        with self._lock:
+            try:
+                self._db.execute(
+                    "INSERT INTO diagram_sessions (client_id, shapes, version, updated_at, size) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(client_id) DO UPDATE SET shapes = excluded.shapes, "
+                    "version = MAX(version + 1, excluded.version), "
+                    "updated_at = excluded.updated_at, size = excluded.size",
+                    (client_id, data, next_version(), now, len(data))
+                )
+                version = self._db.execute(
+                    "SELECT version FROM diagram_sessions WHERE client_id = ?", (client_id,)
+                ).fetchone()[0]
+                self._evict(client_id)
+                self._db.commit()
+            except sqlite3.Error as e:
+                self._db.rollback()
+                logger.error(f"Error writing diagram session: {e}")
+                version = 0
+        return DiagramSession(shapes, version, now, len(data))
+
+    def delete(self, client_id: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM diagram_sessions WHERE client_id = ?", (client_id,))
+            self._db.commit()
+
+    def _evict(self, keep: str) -> None:
+        removed = self._db.execute(
+            "DELETE FROM diagram_sessions WHERE updated_at <= ? AND client_id != ?",
+            (time.time() - self.ttl_seconds, keep)
+        ).rowcount
+        count, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM diagram_sessions").fetchone()
+        if count > self.max_entries or total > self.max_bytes:
+            # Oldest first until both limits hold again
+            rows = self._db.execute(
+                "SELECT client_id, size FROM diagram_sessions WHERE client_id != ? ORDER BY updated_at", (keep,)
+            ).fetchall()
+            stale = []
+            for client_id, size in rows:
+                if count <= self.max_entries and total <= self.max_bytes:
+                    break
+                stale.append((client_id,))
+                count -= 1
+                total -= size
+            self._db.executemany("DELETE FROM diagram_sessions WHERE client_id = ?", stale)
+            removed += len(stale)
+        self.evictions += removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, total = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM diagram_sessions"
+            ).fetchone()
+        return {
+            "backend": "sqlite",
+            "entries": count,
+            "bytes": total,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
+
+
+class SocketRegistry:
+    """
+    WebSockets connected to this process, capped at max_connections. Sockets
+    are local to a process whatever the session backend is.
+    """
+
+    def __init__(self, max_connections: int = 1000):
+        self.max_connections = max_connections
+        self._sockets: dict[str, WebSocket] = {}
+        # Last session version pushed to each socket, so a result is never sent twice
+        self._sent: dict[str, int] = {}
+        self.rejected = 0
+
+    def register(self, client_id: str, websocket: WebSocket) -> bool:
+        """
+        False when the process is at max_connections. A socket already
+        registered for client_id is replaced; the caller closes it.
+        """
+        if client_id not in self._sockets and len(self._sockets) >= self.max_connections:
+            self.rejected += 1
+            return False
+        if self._sockets.get(client_id) is not websocket:
+            # The new socket hasn't been sent anything yet
+            self._sent.pop(client_id, None)
+        self._sockets[client_id] = websocket
+        return True
+
+    def get(self, client_id: str) -> Optional[WebSocket]:
+        return self._sockets.get(client_id)
+
+    def unregister(self, client_id: str, websocket: WebSocket) -> None:
+        # A reconnect may already have replaced this socket
+        if self._sockets.get(client_id) is websocket:
+            del self._sockets[client_id]
+            self._sent.pop(client_id, None)
+
+    def sent_version(self, client_id: str) -> int:
+        return self._sent.get(client_id, 0)
+
+    def mark_sent(self, client_id: str, version: int) -> None:
+        if client_id in self._sockets:
+            self._sent[client_id] = max(version, self._sent.get(client_id, 0))
+
+    def client_ids(self) -> list[str]:
+        return list(self._sockets)
+
+    def __contains__(self, client_id: str) -> bool:
+        return client_id in self._sockets
+
+    def stats(self) -> dict:
+        return {"connections": len(self._sockets), "max_connections": self.max_connections, "rejected": self.rejected}
+
+
+def create_session_store(backend: str, db_path: str, max_entries: int, max_bytes: int, ttl_seconds: float):
+    if backend == "sqlite":
+        return SqliteSessionStore(db_path, max_entries, max_bytes, ttl_seconds)
+    if backend != "memory":
+        logger.warning(f"Unknown whiteboard session backend '{backend}', using memory")
+    return MemorySessionStore(max_entries, max_bytes, ttl_seconds)
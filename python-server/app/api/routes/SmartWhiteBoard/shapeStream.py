@@ -0,0 +1,78 @@
+import json
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ShapeStreamParser:
+    """
+    Incremental JSON scanner for streamed lists of objects. Text is fed as it
+    arrives and every object that completes inside an array is returned.
+    The arrays may be the whole document or sit side by side in an object
+    (e.g. {"nodes": [...], "edges": [...]}); prose or code fences around
+    them are skipped.
+    """
+
+    def __init__(self):
+        self._stack: list[str] = []
+        self._in_string = False
+        self._escaped = False
+        # Depth of the arrays holding the objects, fixed by the first object found in an array
+        self._shape_depth: Optional[int] = None
+        self._object_start: Optional[int] = None
+        self._text = ""
+        self._position = 0
+
+    def feed(self, chunk: str) -> list[dict]:
+        self._text += chunk
+        shapes = []
+        text = self._text
+        for position in range(self._position, len(text)):
+            char = text[position]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            if not self._stack and char not in "[{":
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in "[{":
+                if (char == "{" and self._stack and self._stack[-1] == "["
+                        and self._shape_depth in (None, len(self._stack))):
+                    self._shape_depth = len(self._stack)
+                    self._object_start = position
+                self._stack.append(char)
+            elif char in "]}":
+                if not self._stack:
+                    continue
+                self._stack.pop()
+                if char == "}" and self._object_start is not None and len(self._stack) == self._shape_depth:
+                    shape = self._parse(text[self._object_start:position + 1])
+                    if shape is not None:
+                        shapes.append(shape)
+                    self._object_start = None
+
+        # Drop text that can no longer be part of an unfinished shape
+        keep_from = self._object_start if self._object_start is not None else len(text)
+        self._text = text[keep_from:]
+        if self._object_start is not None:
+            self._object_start = 0
+        self._position = len(self._text)
+        return shapes
+
+    @staticmethod
+    def _parse(raw: str) -> Optional[dict]:
+        try:
+            shape = json.loads(raw)
+        except json.JSONDecodeError:
+            logger.debug("Skipping shape that is not valid JSON")
+            return None
+        return shape if isinstance(shape, dict) else None
+
@@ -0,0 +1,112 @@
+import pytest
+
+from app.api.routes.SmartWhiteBoard import diagramCache
+from app.api.routes.SmartWhiteBoard.diagramCache import (
+    DiagramCache, acquire_warmup_lock, load_seed_prompts, normalize_prompt, prompt_key, regenerate_ids
+)
+
+SHAPES = [
+    {"id": "shape:node-abc123", "type": "geo", "props": {"text": "Start"}},
+    {"id": "shape:node-def456", "type": "geo", "props": {"text": "End"}},
+    {
+        "id": "shape:arrow-0001", "type": "arrow",
+        "props": {
+            "start": {"type": "binding", "boundShapeId": "shape:node-abc123"},
+            "end": {"type": "binding", "boundShapeId": "shape:node-def456"},
+        },
+    },
+]
+
+
+def test_case_spacing_and_stopwords_share_a_key():
+    assert normalize_prompt("Draw a  Flowchart of binary search") == normalize_prompt("flowchart binary search")
+    assert prompt_key("Please show me the flowchart of binary search!") == prompt_key("flowchart  binary SEARCH")
+    assert prompt_key("binary search flowchart") != prompt_key("linear search flowchart")
+
+
+def test_word_order_gives_a_different_key():
+    assert prompt_key("flowchart to convert celsius to fahrenheit") != prompt_key("flowchart to convert fahrenheit to celsius")
+    assert prompt_key("engineering reporting to sales") != prompt_key("sales reporting to engineering")
+
+
+def test_stopword_only_prompt_keeps_its_words():
+    assert normalize_prompt("show me") == "show me"
+
+
+def test_regenerate_ids_gives_fresh_ids_and_rebinds_arrows():
+    copied = regenerate_ids(SHAPES)
+
+    ids = [shape["id"] for shape in copied]
+    assert len(set(ids)) == 3
+    assert not set(ids) & {shape["id"] for shape in SHAPES}
+    assert ids[0].startswith("shape:node-")
+    arrow = copied[2]["props"]
+    assert arrow["start"]["boundShapeId"] == ids[0]
+    assert arrow["end"]["boundShapeId"] == ids[1]
+    # The cached shapes themselves are never modified
+    assert SHAPES[2]["props"]["start"]["boundShapeId"] == "shape:node-abc123"
+
+
+def test_hit_returns_a_fresh_copy_each_time():
+    cache = DiagramCache()
+    cache.set("binary search flowchart", SHAPES)
+
+    first = cache.get("Draw the binary search flowchart")
+    second = cache.get("binary search flowchart")
+    assert first[0]["props"] == SHAPES[0]["props"]
+    assert first[0]["id"] != second[0]["id"]
+    assert cache.get("bubble sort") is None
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = DiagramCache(max_entries=2)
+    cache.set("one", SHAPES)
+    cache.set("two", SHAPES)
+    cache.get("one")
+    cache.set("three", SHAPES)
+
+    assert "one" in cache
+    assert "two" not in cache
+    assert "three" in cache
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    cache = DiagramCache(ttl_seconds=10)
+    now = [1000.0]
+    monkeypatch.setattr(diagramCache.time, "time", lambda: now[0])
+    cache.set("binary search flowchart", SHAPES)
+
+    now[0] += 11
+    assert cache.get("binary search flowchart") is None
+
+
+def test_similar_prompt_is_served_above_threshold():
+    cache = DiagramCache(similarity_threshold=0.9)
+    cache.set("binary search flowchart", SHAPES, vector=[1.0, 0.0])
+
+    assert cache.get("binary search diagram", vector=[0.99, 0.05]) is not None
+    assert cache.get("sorting algorithms", vector=[0.0, 1.0]) is None
+    assert cache.stats()["semantic_hits"] == 1
+
+
+def test_seed_prompts_skip_comments_and_blanks(tmp_path):
+    seeds = tmp_path / "seeds.txt"
+    seeds.write_text("# common prompts\nbinary search flowchart\n\n  water cycle  \n")
+
+    assert load_seed_prompts(str(seeds)) == ["binary search flowchart", "water cycle"]
+    assert load_seed_prompts(str(tmp_path / "missing.txt")) == []
+
+
+@pytest.mark.skipif(diagramCache.fcntl is None, reason="advisory locks need fcntl")
+def test_only_one_process_acquires_the_warmup_lock(tmp_path, monkeypatch):
+    path = str(tmp_path / "locks" / "warmup.lock")
+    monkeypatch.setattr(diagramCache, "_warmup_lock_file", None)
+    assert acquire_warmup_lock(path)
+    held = diagramCache._warmup_lock_file
+
+    # Another worker opens the file separately and can't take the lock
+    monkeypatch.setattr(diagramCache, "_warmup_lock_file", None)
+    assert not acquire_warmup_lock(path)
+    held.close()
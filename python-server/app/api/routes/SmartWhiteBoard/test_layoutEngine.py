@@ -0,0 +1,104 @@
+import random
+
+import pytest
+
+from app.api.routes.SmartWhiteBoard.layoutEngine import (
+    FLOWCHART, MARGIN, MINDMAP, ORGCHART, TITLE_WIDTH, DiagramBuilder, build_diagram, diagram_kind, guess_kind
+)
+
+
+def boxes(shapes):
+    return [(s["x"], s["y"], s["x"] + s["props"]["w"], s["y"] + s["props"]["h"]) for s in shapes if s["type"] == "geo"]
+
+
+def overlaps(shapes):
+    placed = boxes(shapes)
+    return [
+        (a, b) for i, a in enumerate(placed) for b in placed[i + 1:]
+        if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+    ]
+
+
+def random_topology(kind, nodes, edges, seed):
+    rng = random.Random(seed)
+    items = [{"id": f"n{i}", "text": f"Idea {i} " + "word " * rng.randint(0, 6)} for i in range(nodes)]
+    pairs = {(f"n{rng.randrange(i)}", f"n{i}") for i in range(1, nodes)}
+    while len(pairs) < edges:
+        source, target = rng.sample(range(nodes), 2)
+        pairs.add((f"n{source}", f"n{target}"))
+    items += [{"from": source, "to": target} for source, target in pairs]
+    return {"diagram": kind, "nodes": items[:nodes], "edges": items[nodes:]}
+
+
+def test_diagram_kind_names_and_prompt_guesses():
+    assert diagram_kind("Mind map") == MINDMAP
+    assert diagram_kind("org-chart") == ORGCHART
+    assert diagram_kind("process flow") == FLOWCHART
+    assert diagram_kind("venn", default=ORGCHART) == ORGCHART
+    assert guess_kind("brainstorm ideas for a trip") == MINDMAP
+    assert guess_kind("reporting structure of the team") == ORGCHART
+    assert guess_kind("steps to bake bread") == FLOWCHART
+
+
+def test_narrow_diagram_keeps_title_inside_margin():
+    shapes = build_diagram([
+        {"id": "a", "text": "Start"}, {"id": "b", "text": "Work"}, {"id": "c", "text": "End"},
+        {"from": "a", "to": "b"}, {"from": "b", "to": "c"},
+    ], "three steps")
+
+    title = shapes[0]
+    assert title["x"] >= MARGIN
+    assert title["props"]["text"] == "Three steps"
+    # The drawing is centred under the title
+    centres = [x0 + (x1 - x0) / 2 for x0, _, x1, _ in boxes(shapes)]
+    assert centres[0] == pytest.approx(title["x"] + TITLE_WIDTH / 2, abs=1)
+
+
+def test_flowchart_layers_run_top_down_below_title():
+    shapes = build_diagram([
+        {"id": "a", "text": "Start"}, {"id": "b", "text": "Check"}, {"id": "c", "text": "Done"},
+        {"from": "a", "to": "b"}, {"from": "b", "to": "c"}, {"from": "c", "to": "a"},
+    ], "loop")
+
+    ys = [y0 for _, y0, _, _ in boxes(shapes)]
+    assert ys[0] < ys[1] < ys[2]
+    assert min(ys) >= MARGIN + 80
+    assert not overlaps(shapes)
+
+
+@pytest.mark.parametrize("kind", [FLOWCHART, ORGCHART, MINDMAP])
+def test_dense_diagrams_have_no_overlapping_nodes(kind):
+    for seed in range(3):
+        shapes = build_diagram(random_topology(kind, nodes=60, edges=120, seed=seed), "dense")
+        assert len(boxes(shapes)) == 60
+        assert not overlaps(shapes), f"{kind} seed {seed}"
+        assert min(min(x0 for x0, _, _, _ in boxes(shapes)), shapes[0]["x"]) >= MARGIN
+
+
+def test_builder_keeps_shape_ids_as_the_diagram_grows():
+    builder = DiagramBuilder("growing", MINDMAP)
+    builder.add({"id": "root", "text": "Root"})
+    first = {shape["id"] for shape in builder.shapes()}
+
+    assert not builder.add({"from": "root", "to": "leaf"})
+    assert builder.add({"id": "leaf", "text": "Leaf"})
+    second = builder.shapes()
+    assert first <= {shape["id"] for shape in second}
+    arrow = [shape for shape in second if shape["type"] == "arrow"][0]
+    assert arrow["props"]["end"]["boundShapeId"] == builder.nodes["leaf"]["shape_id"]
+
+
+def test_invalid_items_are_skipped():
+    builder = DiagramBuilder("skips")
+    assert builder.add({"id": "a", "text": "A"})
+    assert not builder.add({"id": "a", "text": "Again"})
+    assert not builder.add({"id": "b"})
+    assert not builder.add({"from": "a", "to": "a"})
+    assert not builder.add("not a dict")
+
+
+def test_topology_without_nodes_is_rejected():
+    with pytest.raises(ValueError):
+        build_diagram({"nodes": [], "edges": []}, "empty")
+    with pytest.raises(ValueError):
+        build_diagram("nodes", "wrong type")
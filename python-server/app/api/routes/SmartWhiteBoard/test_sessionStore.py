@@ -0,0 +1,124 @@
+import json
+
+import pytest
+
+from app.api.routes.SmartWhiteBoard import sessionStore
+from app.api.routes.SmartWhiteBoard.sessionStore import MemorySessionStore, SocketRegistry, SqliteSessionStore
+
+SHAPES = [{"id": "shape:a", "type": "geo", "props": {"text": "A"}}]
+SIZE = len(json.dumps(SHAPES))
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    def make(**limits):
+        if request.param == "memory":
+            return MemorySessionStore(**limits)
+        return SqliteSessionStore(str(tmp_path / "sessions" / "sessions.sqlite"), **limits)
+    return make
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(sessionStore.time, "time", lambda: now[0])
+    return now
+
+
+def test_round_trip_and_delete(make_store):
+    store = make_store()
+    written = store.set("c1", SHAPES)
+
+    session = store.get("c1")
+    assert session.shapes == SHAPES
+    assert session.version == written.version
+    store.delete("c1")
+    assert store.get("c1") is None
+
+
+def test_oldest_sessions_are_evicted_beyond_max_entries(make_store, clock):
+    store = make_store(max_entries=2)
+    for client_id in ("c1", "c2", "c3"):
+        clock[0] += 1
+        store.set(client_id, SHAPES)
+
+    assert store.get("c1") is None
+    assert store.get("c3") is not None
+    stats = store.stats()
+    assert stats["entries"] == 2
+    assert stats["evictions"] == 1
+
+
+def test_sessions_are_evicted_beyond_max_bytes(make_store, clock):
+    store = make_store(max_bytes=SIZE * 2)
+    for client_id in ("c1", "c2", "c3", "c4"):
+        clock[0] += 1
+        store.set(client_id, SHAPES)
+
+    assert store.stats()["bytes"] <= SIZE * 2
+    assert store.get("c4") is not None
+    assert store.get("c1") is None
+
+
+def test_session_just_written_is_kept_over_budget(make_store):
+    store = make_store(max_bytes=1)
+    store.set("c1", SHAPES)
+    assert store.get("c1") is not None
+
+
+def test_sessions_expire_after_ttl(make_store, clock):
+    store = make_store(ttl_seconds=10)
+    store.set("c1", SHAPES)
+
+    clock[0] += 11
+    assert store.get("c1") is None
+    assert store.versions(["c1"]) == {}
+
+
+def test_versions_keep_increasing_after_eviction(make_store):
+    store = make_store()
+    first = store.set("c1", SHAPES).version
+    second = store.set("c1", SHAPES).version
+    store.delete("c1")
+    third = store.set("c1", SHAPES).version
+
+    assert first < second < third
+
+
+def test_versions_are_read_for_many_clients_at_once(make_store, monkeypatch):
+    monkeypatch.setattr(sessionStore, "VERSION_QUERY_BATCH", 2)
+    store = make_store()
+    written = {client_id: store.set(client_id, SHAPES).version for client_id in ("c1", "c2", "c3")}
+
+    assert store.versions(["c1", "c2", "c3", "missing"]) == written
+
+
+def test_sqlite_sessions_are_shared_between_processes(tmp_path):
+    path = str(tmp_path / "sessions.sqlite")
+    writer, reader = SqliteSessionStore(path), SqliteSessionStore(path)
+    version = writer.set("c1", SHAPES).version
+
+    assert reader.versions(["c1"]) == {"c1": version}
+    assert reader.get("c1").shapes == SHAPES
+
+
+def test_registry_refuses_connections_beyond_limit():
+    registry = SocketRegistry(max_connections=1)
+    assert registry.register("c1", object())
+    assert not registry.register("c2", object())
+    assert registry.stats()["rejected"] == 1
+
+
+def test_replacing_a_socket_resets_what_was_sent():
+    registry = SocketRegistry()
+    old, new = object(), object()
+    registry.register("c1", old)
+    registry.mark_sent("c1", 5)
+
+    assert registry.register("c1", new)
+    assert registry.get("c1") is new
+    assert registry.sent_version("c1") == 0
+    # The old socket's handler finishing doesn't drop the new one
+    registry.unregister("c1", old)
+    assert "c1" in registry
+    assert registry.client_ids() == ["c1"]
@@ -0,0 +1,52 @@
+import json
+
+from app.api.routes.SmartWhiteBoard.shapeStream import ShapeStreamParser
+
+TOPOLOGY = {
+    "diagram": "flowchart",
+    "nodes": [{"id": "a", "text": "Start {here}"}, {"id": "b", "text": "Say \"done\" ]"}],
+    "edges": [{"from": "a", "to": "b", "label": "next"}],
+}
+
+
+def feed_in_chunks(text, size):
+    parser = ShapeStreamParser()
+    found = []
+    for start in range(0, len(text), size):
+        found.extend(parser.feed(text[start:start + size]))
+    return found
+
+
+def test_objects_are_returned_as_they_complete():
+    parser = ShapeStreamParser()
+    assert parser.feed('[{"id": "a", "te') == []
+    assert parser.feed('xt": "A"}, {"id"') == [{"id": "a", "text": "A"}]
+    assert parser.feed(': "b"}]') == [{"id": "b"}]
+
+
+def test_every_chunk_size_gives_the_same_objects():
+    text = json.dumps(TOPOLOGY)
+    expected = TOPOLOGY["nodes"] + TOPOLOGY["edges"]
+    for size in (1, 2, 3, 7, 64, len(text)):
+        assert feed_in_chunks(text, size) == expected
+
+
+def test_prose_and_code_fences_are_skipped():
+    text = "Here is your diagram:\n```json\n" + json.dumps(TOPOLOGY["nodes"]) + "\n```\nHope it helps!"
+    assert feed_in_chunks(text, 5) == TOPOLOGY["nodes"]
+
+
+def test_nested_objects_stay_inside_their_shape():
+    text = '[{"id": "a", "props": {"geo": "oval", "meta": [{"k": 1}]}}]'
+    assert feed_in_chunks(text, 4) == [{"id": "a", "props": {"geo": "oval", "meta": [{"k": 1}]}}]
+
+
+def test_invalid_objects_are_dropped():
+    text = '[{"id": "a", "text": "A",}, {"id": "b"}]'
+    assert feed_in_chunks(text, 6) == [{"id": "b"}]
+
+
+def test_buffer_only_holds_the_unfinished_object():
+    parser = ShapeStreamParser()
+    parser.feed('[' + ", ".join(json.dumps({"id": str(i)}) for i in range(100)) + ', {"id": "par')
+    assert parser._text == '{"id": "par'
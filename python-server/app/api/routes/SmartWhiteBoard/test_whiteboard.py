@@ -0,0 +1,104 @@
+import asyncio
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+os.environ.setdefault("GROQ_API_KEY", "test")
+
+from app.api.routes.SmartWhiteBoard import whiteboard  # noqa: E402
+from app.api.routes.SmartWhiteBoard.diagramCache import DiagramCache  # noqa: E402
+from app.api.routes.SmartWhiteBoard.sessionStore import SocketRegistry, SqliteSessionStore  # noqa: E402
+
+SHAPES = [{"id": "shape:a", "type": "geo", "props": {"text": "A"}}]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(whiteboard, "connected_websockets", SocketRegistry(max_connections=1))
+    monkeypatch.setattr(whiteboard, "session_watcher", None)
+    app = FastAPI()
+    app.include_router(whiteboard.router)
+    return TestClient(app)
+
+
+def test_connection_over_limit_is_closed_with_1013(client):
+    with client.websocket_connect("/ws/first"):
+        with pytest.raises(WebSocketDisconnect) as excinfo:
+            with client.websocket_connect("/ws/second") as refused:
+                refused.receive_text()
+    assert excinfo.value.code == 1013
+
+
+def test_reconnect_closes_the_previous_socket(client):
+    with client.websocket_connect("/ws/same") as first:
+        with client.websocket_connect("/ws/same") as second:
+            with pytest.raises(WebSocketDisconnect):
+                first.receive_text()
+            second.send_text("ping")
+            assert second.receive_text() == "pong"
+
+
+def test_stored_session_is_sent_on_connect(client, monkeypatch):
+    monkeypatch.setattr(whiteboard.diagram_sessions, "max_entries", 10)
+    whiteboard.diagram_sessions.set("ready", SHAPES)
+    try:
+        with client.websocket_connect("/ws/ready") as websocket:
+            assert websocket.receive_json() == SHAPES
+    finally:
+        whiteboard.diagram_sessions.delete("ready")
+
+
+def test_result_written_by_another_worker_is_pushed(client, monkeypatch, tmp_path):
+    path = str(tmp_path / "sessions.sqlite")
+    monkeypatch.setattr(whiteboard, "diagram_sessions", SqliteSessionStore(path))
+    monkeypatch.setattr(whiteboard, "WS_SESSION_POLL_SECONDS", 0.01)
+    other_worker = SqliteSessionStore(path)
+
+    with client.websocket_connect("/ws/shared") as websocket:
+        other_worker.set("shared", SHAPES)
+        assert websocket.receive_json() == SHAPES
+
+
+def test_generate_endpoint_does_not_embed_the_prompt(client, monkeypatch):
+    monkeypatch.setattr(whiteboard, "diagram_cache", DiagramCache(similarity_threshold=0.9))
+    embedded, generated = [], []
+
+    async def prompt_vector(prompt):
+        embedded.append(prompt)
+    async def run_generation(client_id, prompt):
+        generated.append(prompt)
+    monkeypatch.setattr(whiteboard, "prompt_vector", prompt_vector)
+    monkeypatch.setattr(whiteboard, "run_generation", run_generation)
+
+    response = client.post("/generate-diagram", json={"prompt": "binary search flowchart"})
+
+    assert response.json()["cached"] is False
+    assert embedded == []
+    assert generated == ["binary search flowchart"]
+    assert whiteboard.diagram_cache.stats()["misses"] == 0
+
+
+def test_similar_prompt_is_served_by_the_background_task(monkeypatch):
+    cache = DiagramCache(similarity_threshold=0.9)
+    cache.set("binary search flowchart", SHAPES, vector=[1.0, 0.0])
+    monkeypatch.setattr(whiteboard, "diagram_cache", cache)
+    published = []
+
+    async def prompt_vector(prompt):
+        return [0.99, 0.05]
+    async def publish_shapes(client_id, shapes):
+        published.append((client_id, shapes))
+    async def generate(prompt):
+        raise AssertionError("a similar cached diagram should be served")
+    monkeypatch.setattr(whiteboard, "prompt_vector", prompt_vector)
+    monkeypatch.setattr(whiteboard, "publish_shapes", publish_shapes)
+    monkeypatch.setattr(whiteboard, "generate_diagram_with_groq", generate)
+    monkeypatch.setattr(whiteboard, "WHITEBOARD_STREAMING", False)
+
+    asyncio.run(whiteboard.run_generation("client-1", "flowchart for a binary search"))
+
+    assert [(client_id, shapes[0]["props"]) for client_id, shapes in published] == [("client-1", SHAPES[0]["props"])]
+    assert cache.stats()["semantic_hits"] == 1
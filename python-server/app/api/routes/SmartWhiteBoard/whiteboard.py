@@ -3,13 +3,25 @@ import os
 import asyncio
 import uuid
 import json
+import logging
+from typing import Optional
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException
 from pydantic import BaseModel
-import math
-from groq import Groq
+import re
+from groq import Groq, AsyncGroq
+from .shapeStream import ShapeStreamParser
+from .layoutEngine import DiagramBuilder, FLOWCHART, MINDMAP, build_diagram, diagram_kind, guess_kind
+from .sessionStore import SocketRegistry, create_session_store
+from .diagramCache import DiagramCache, acquire_warmup_lock, load_seed_prompts, normalize_prompt
+from app.api.routes.PdfChat.helper import get_embeddings
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Log one in this many WebSocket keep-alive messages
+WS_PING_LOG_SAMPLE = int(os.getenv("WHITEBOARD_PING_LOG_SAMPLE", "100"))
+
 # Configure Livekit (keeping this as it was in the original)
 livekit_url = os.getenv("LIVEKIT_URL")
 livekit_api_key = os.getenv("LIVEKIT_API_KEY")
@@ -20,6 +32,14 @@ groq_api_key = os.getenv("GROQ_API_KEY")
 if not groq_api_key:
     raise ValueError("GROQ_API_KEY not found in environment variables.")
 groq_client = Groq(api_key=groq_api_key)
+# Async client for streamed completions
+async_groq_client = AsyncGroq(api_key=groq_api_key)
+
+GROQ_DIAGRAM_MODEL = "llama3-8b-8192"  # Or "mixtral-8x7b-32768", "llama3-70b-8192", "gemma-7b-it"
+# "diagram": "<type>" in a streamed completion, read before the nodes arrive
+DIAGRAM_TYPE_PATTERN = re.compile(r'"diagram"\s*:\s*"([^"]*)"')
+# Stream shapes to the client as the model writes them (0 waits for the whole completion)
+WHITEBOARD_STREAMING = os.getenv("WHITEBOARD_STREAMING", "1") != "0"
 
 # Create router instead of app
 router = APIRouter()
@@ -27,535 +47,449 @@ router = APIRouter()
 class DiagramRequest(BaseModel):
     prompt: str
 
-# In-memory stores
-diagram_results: dict[str, list[dict]] = {}
-connected_websockets: dict[str, WebSocket] = {}
+# Generated diagrams by client_id: "memory" keeps them per process, "sqlite" shares
+# them between uvicorn workers on the same host
+diagram_sessions = create_session_store(
+    backend=os.getenv("WHITEBOARD_SESSION_BACKEND", "memory"),
+    db_path=os.getenv("WHITEBOARD_SESSION_DB", "whiteboardSessions/sessions.sqlite"),
+    max_entries=int(os.getenv("WHITEBOARD_SESSION_MAX_ENTRIES", "1000")),
+    max_bytes=int(os.getenv("WHITEBOARD_SESSION_MAX_MB", "64")) * 1024 * 1024,
+    ttl_seconds=float(os.getenv("WHITEBOARD_SESSION_TTL", "900"))
+)
+connected_websockets = SocketRegistry(max_connections=int(os.getenv("WHITEBOARD_MAX_CONNECTIONS", "1000")))
+
+# Diagrams already generated, by normalized prompt. WHITEBOARD_CACHE_SIMILARITY > 0 also
+# serves near-duplicate prompts, at the cost of embedding each prompt that misses
+diagram_cache = DiagramCache(
+    max_entries=int(os.getenv("WHITEBOARD_CACHE_ENTRIES", "256")),
+    ttl_seconds=float(os.getenv("WHITEBOARD_CACHE_TTL", "86400")),
+    similarity_threshold=float(os.getenv("WHITEBOARD_CACHE_SIMILARITY", "0"))
+)
+# File of prompts (one per line) generated at startup, e.g. app/api/routes/SmartWhiteBoard/diagramSeeds.txt
+WHITEBOARD_CACHE_SEED = os.getenv("WHITEBOARD_CACHE_SEED", "")
+# Only the worker holding this lock generates the seed prompts
+WHITEBOARD_CACHE_WARM_LOCK = os.getenv("WHITEBOARD_CACHE_WARM_LOCK", "whiteboardSessions/warmup.lock")
+
+# Sockets that send nothing (the client pings every 30s) for this long are closed
+WS_IDLE_TIMEOUT = float(os.getenv("WHITEBOARD_SOCKET_IDLE_SECONDS", "120"))
+# How often this process checks a shared session store for results written by other workers
+WS_SESSION_POLL_SECONDS = float(os.getenv("WHITEBOARD_SESSION_POLL_SECONDS", "0.25"))
+
+
+async def send_session(client_id: str, websocket: WebSocket) -> None:
+    session = await asyncio.to_thread(diagram_sessions.get, client_id)
+    if session is not None and session.version > connected_websockets.sent_version(client_id):
+        connected_websockets.mark_sent(client_id, session.version)
+        await websocket.send_json(session.shapes)
+
+
+# Deliver results that another worker wrote to the shared store. One poller per process
+# checks every socket connected here with a single query.
+async def watch_sessions() -> None:
+    while True:
+        await asyncio.sleep(WS_SESSION_POLL_SECONDS)
+        client_ids = connected_websockets.client_ids()
+        if not client_ids:
+            continue
+        try:
+            versions = await asyncio.to_thread(diagram_sessions.versions, client_ids)
+        except Exception as e:
+            logger.warning(f"Failed to poll whiteboard sessions: {e}")
+            continue
+        for client_id, version in versions.items():
+            websocket = connected_websockets.get(client_id)
+            if websocket is None or version <= connected_websockets.sent_version(client_id):
+                continue
+            try:
+                await send_session(client_id, websocket)
+            except Exception as e:
+                logger.debug(f"Dropping WebSocket after failed push: {e}", extra={"client_id": client_id})
+                connected_websockets.unregister(client_id, websocket)
+
+
+session_watcher: Optional[asyncio.Task] = None
+
+
+def start_session_watcher() -> None:
+    global session_watcher
+    if diagram_sessions.shared and (session_watcher is None or session_watcher.done()):
+        session_watcher = asyncio.create_task(watch_sessions())
+
+
+async def close_quietly(websocket: WebSocket, code: int = 1000) -> None:
+    try:
+        await websocket.close(code=code)
+    except Exception as e:
+        logger.debug(f"WebSocket already closed: {e}")
+
 
 @router.websocket("/ws/{client_id}")
 async def websocket_endpoint(websocket: WebSocket, client_id: str):
-    print(f"[Backend WS] Connection for client_id={client_id}")
+    previous = connected_websockets.get(client_id)
+    # Accept before closing, otherwise the refusal reaches the client as an HTTP 403
     await websocket.accept()
-    connected_websockets[client_id] = websocket
-
-    if client_id in diagram_results:
-        print(f"[Backend WS] Sending cached to {client_id}")
-        await websocket.send_json(diagram_results[client_id])
+    if not connected_websockets.register(client_id, websocket):
+        logger.warning("Whiteboard WebSocket limit reached, refusing connection", extra={"client_id": client_id})
+        await websocket.close(code=1013)
+        return
+    if previous is not None and previous is not websocket:
+        logger.info("Whiteboard WebSocket reconnected, closing the previous socket", extra={"client_id": client_id})
+        await close_quietly(previous)
+    logger.info("Whiteboard WebSocket connected", extra={"client_id": client_id})
 
     try:
+        await send_session(client_id, websocket)
+        start_session_watcher()
         while True:
-            msg = await websocket.receive_text()
-            print(f"[Backend WS] Received {msg} from {client_id}")
+            msg = await asyncio.wait_for(websocket.receive_text(), WS_IDLE_TIMEOUT)
             if msg == "ping":
+                logger.debug("Whiteboard WebSocket ping", extra={"client_id": client_id, "sample_every": WS_PING_LOG_SAMPLE})
                 await websocket.send_text("pong")
+            else:
+                logger.debug("Whiteboard WebSocket message", extra={"client_id": client_id, "length": len(msg)})
             await asyncio.sleep(0.1)
     except WebSocketDisconnect:
-        print(f"[Backend WS] {client_id} disconnected")
-        connected_websockets.pop(client_id, None)
+        logger.info("Whiteboard WebSocket disconnected", extra={"client_id": client_id})
+    except asyncio.TimeoutError:
+        logger.info("Closing idle whiteboard WebSocket", extra={"client_id": client_id})
+        await websocket.close()
     except Exception as e:
-        print(f"[Backend WS] Error for {client_id}: {e}")
-        connected_websockets.pop(client_id, None)
-
+        logger.warning(f"Whiteboard WebSocket error: {e}", extra={"client_id": client_id})
+    finally:
+        connected_websockets.unregister(client_id, websocket)
 
-async def generate_diagram_with_groq(prompt: str) -> list[dict]:
-    """Generate diagram shapes using Groq's API"""
-    print(f"[Backend] Generating diagram with Groq for prompt: {prompt}")
 
-    # Updated system prompt with emphasis on proper shapes and colors
+def diagram_messages(prompt: str) -> list[dict]:
+    """Chat messages asking the model for the nodes and edges of a diagram"""
+    # Only the topology is asked for; layout and tldraw shapes are produced by layoutEngine
     system_prompt_content = """
-    You are a diagram generation assistant. Create a visually appealing diagram based on the user's prompt.
-    Your output must be a valid JSON array of shapes that can be rendered by tldraw.
+    You are a diagram generation assistant. Describe the diagram the user asks for as a graph.
+    The server lays it out and draws it, so never include coordinates, sizes or tldraw shapes.
 
-    Each shape should have the following structure:
+    Your output must be a single JSON object:
     {
-      "id": "shape:unique_id",
-      "typeName": "shape",
-      "type": "geo",
-      "x": number,
-      "y": number,
-      "rotation": 0,
-      "isLocked": false,
-      "opacity": 1,
-      "index": "a1", (or a2, a3, etc.)
-      "parentId": "page:page",
-      "props": {
-        "geo": "rectangle|oval|diamond|triangle|hexagon|cloud",
-        "w": number, // Adjust width based on text content length (min 100, add 20px per character over 10)
-        "h": number, // Adjust height based on text content (min 50, add 10px per line)
-        "text": "Text content",
-        "color": "black|grey|light-violet|violet|blue|light-blue|yellow|orange|green|light-green|light-red|red|white",
-        "labelColor": "black",
-        "size": "m",
-        "font": "draw",
-        "align": "middle",
-        "verticalAlign": "middle",
-        "fill": "solid",
-        "dash": "draw",
-        "url": "",
-        "growY": 0,
-        "scale": 1
-      }
+      "diagram": "flowchart|mindmap|orgchart",
+      "nodes": [{"id": "n1", "text": "Text content", "shape": "oval", "color": "green"}],
+      "edges": [{"from": "n1", "to": "n2", "label": ""}]
     }
 
     IMPORTANT GUIDELINES FOR BETTER DIAGRAMS:
 
-    1. Use appropriate shape types based on function:
-       - Ovals for start/end nodes
-       - Rectangles for process steps
-       - Diamonds for decision points
-       - Clouds for external inputs/systems
-       - Hexagons for preparation steps
-       - Triangles for warnings or important notes
-
-    2. Use a variety of colors to make the diagram visually appealing:
-       - NEVER use all black shapes
-       - Assign different colors to different shapes
-       - Use colors that convey meaning: "green" for start, "red" for end, "yellow" for decisions, etc.
-       - Valid colors: "black", "grey", "light-violet", "violet", "blue", "light-blue", "yellow", "orange", "green", "light-green", "light-red", "red", "white"
-
-    3. Adjust shape sizes based on content:
-       - For text with 1-10 characters: w=120, h=60
-       - For text with 11-20 characters: w=180, h=80
-       - For text with 21-40 characters: w=240, h=100
-       - For text with 41+ characters: w=300, h=120
-       - For multi-line text: Add 20px height per additional line
-
-    4. Make shape content descriptive and detailed:
-       - For flowcharts: Include specific actions, not just generic labels
-       - For decision nodes: Phrase as questions with yes/no outcomes
-       - For process nodes: Describe the actual operation being performed
-       - For the specific problem in the prompt, include detailed steps that would actually solve the problem
-    
-    5. Give ample amount of space between shapes
+    1. Pick the diagram type: "flowchart" for processes, algorithms and sequences, "mindmap" for
+       concepts around a central topic, "orgchart" for hierarchies.
+
+    2. Use appropriate shapes: "oval" for start/end, "rectangle" for process steps, "diamond" for
+       decisions, "cloud" for external inputs/systems, "hexagon" for preparation steps, "triangle"
+       for warnings or important notes.
+
+    3. Use a variety of colors, never all black: "green" for start, "red" for end, "yellow" for
+       decisions. Valid colors: "black", "grey", "light-violet", "violet", "blue", "light-blue",
+       "yellow", "orange", "green", "light-green", "light-red", "red", "white"
+
+    4. Make node text descriptive and specific to the problem in the prompt. Phrase decisions as
+       questions and label their outgoing edges "Yes" and "No".
+
+    5. Write "diagram" first and every node before the edges. In a mind map, the central topic is
+       the first node and is connected to each branch.
     """
 
     user_prompt_content = f"""
-    Create a colorful and detailed diagram for: "{prompt}"
-
-    Determine if this should be a flowchart, mind map, or org chart based on the prompt.
-    Include at least 5-7 shapes with meaningful content related to the prompt.
-    Position the shapes appropriately for the diagram type.
-    Include a title text shape at the top (y=50, x=400, centered). The title should be the original prompt or a very close summary.
-
-    IMPORTANT:
-    1. Use DIFFERENT COLORS for each shape - do not make all shapes the same color
-    2. Use APPROPRIATE SHAPE TYPES for each element (oval for start/end, diamond for decisions, etc.)
-    3. Make the content DESCRIPTIVE and DETAILED - explain exactly what happens at each step
-    4. SIZE SHAPES APPROPRIATELY based on their content length
-    5. For flowcharts and sequential diagrams, connect the shapes with arrows
-
-    For each arrow, use this exact format:
-    {{
-      "id": "shape:arrow-unique_id",
-      "typeName": "shape",
-      "type": "arrow",
-      "x": 200,
-      "y": 200,
-      "rotation": 0,
-      "isLocked": false,
-      "opacity": 1,
-      "index": "a10",
-      "parentId": "page:page",
-      "props": {{
-        "dash": "draw",
-        "size": "m",
-        "fill": "none",
-        "color": "black",
-        "labelColor": "black",
-        "bend": 0,
-        "start": {{
-          "type": "binding",
-          "boundShapeId": "shape:source_id",
-          "normalizedAnchor": {{"x": 0.5, "y": 1.0}},
-          "isExact": false
-        }},
-        "end": {{
-          "type": "binding",
-          "boundShapeId": "shape:target_id",
-          "normalizedAnchor": {{"x": 0.5, "y": 0.0}},
-          "isExact": false
-        }},
-        "arrowheadStart": "none",
-        "arrowheadEnd": "arrow",
-        "text": "",
-        "font": "draw"
-      }}
-    }}
-
-    Return ONLY the JSON array of shapes. The output must be a single, valid JSON array.
+    Create a detailed diagram for: "{prompt}"
+    Include at least 5-7 nodes with meaningful content related to the prompt.
+    Return ONLY the JSON object.
     """
 
-    messages = [
+    return [
         {"role": "system", "content": system_prompt_content},
         {"role": "user", "content": user_prompt_content}
     ]
 
+# Embedding of the normalized prompt, only computed when near-duplicate matching is on.
+# It lands in the shared embedding cache, so storing the result later doesn't embed again.
+async def prompt_vector(prompt: str):
+    if not diagram_cache.semantic:
+        return None
+    try:
+        return await asyncio.to_thread(get_embeddings().embed_query, normalize_prompt(prompt))
+    except Exception as e:
+        logger.warning(f"Could not embed diagram prompt: {e}")
+        return None
+
+
+# The request path only checks the exact prompt; embedding for a near-duplicate match
+# is a provider round-trip, so it runs here, in the background generation task
+async def find_similar_diagram(prompt: str):
+    if not diagram_cache.semantic:
+        return None
+    vector = await prompt_vector(prompt)
+    return diagram_cache.get(prompt, vector)
+
+
+async def remember_diagram(prompt: str, shapes: list[dict]) -> None:
+    if shapes:
+        diagram_cache.set(prompt, shapes, await prompt_vector(prompt))
+
+
+async def generate_diagram_with_groq(prompt: str) -> list[dict]:
+    """Generate a diagram's nodes and edges using Groq's API and lay them out here"""
+    logger.debug("Generating diagram with Groq", extra={"prompt_length": len(prompt)})
+
     try:
         # Generate content with Groq
         # Using asyncio.to_thread because the groq client is synchronous
         chat_completion = await asyncio.to_thread(
             groq_client.chat.completions.create,
-            messages=messages,
-            model="llama3-8b-8192",  # Or "mixtral-8x7b-32768", "llama3-70b-8192", "gemma-7b-it"
+            messages=diagram_messages(prompt),
+            model=GROQ_DIAGRAM_MODEL,
             temperature=0.1, # Lower temperature for more deterministic JSON output
-            # max_tokens=4096, # Adjust if needed
             response_format={"type": "json_object"} # Request JSON output
         )
 
         response_content = chat_completion.choices[0].message.content
-        
-        # Parse the JSON
-        # Groq with response_format={"type": "json_object"} should directly return a parsable JSON string
-        shapes_data = json.loads(response_content)
-
-        # The JSON object returned by Groq might be a dictionary with a key holding the array,
-        # or it might be the array directly. We need to ensure `shapes` is a list.
-        if isinstance(shapes_data, dict):
-            # Try to find a list within the dictionary, common if the LLM wraps the array
-            found_list = False
-            for key, value in shapes_data.items():
-                if isinstance(value, list):
-                    shapes = value
-                    found_list = True
-                    print(f"[Backend] Extracted list from key '{key}' in Groq's JSON response.")
-                    break
-            if not found_list:
-                raise ValueError("Groq returned a JSON object, but no list of shapes found within it.")
-        elif isinstance(shapes_data, list):
-            shapes = shapes_data
-        else:
-            raise ValueError("Groq did not return a JSON list or an object containing a list.")
-
-
-        # Validate the shapes
-        if not isinstance(shapes, list):
-            raise ValueError("Groq's response, after parsing, did not result in a list of shapes.")
-
-        # Process and fix arrow shapes if needed (keeping this validation logic)
-        processed_shapes = []
-        shape_ids = set()
-
-        # First pass: collect all shape IDs and add non-arrow shapes
-        for shape in shapes:
-            if not isinstance(shape, dict) or not all(key in shape for key in ["id", "typeName", "type"]):
-                print(f"[Backend] Skipping invalid shape structure: {shape}")
-                continue
-            shape_ids.add(shape["id"])
-            if shape["type"] != "arrow":
-                processed_shapes.append(shape)
-
-        # Second pass: process and add arrow shapes
-        for shape in shapes:
-            if not isinstance(shape, dict) or shape["type"] != "arrow":
-                continue
 
-            valid_arrow = True
-            # Check start binding
-            start_id = shape.get("props", {}).get("start", {}).get("boundShapeId")
-            if not start_id or start_id not in shape_ids:
-                print(f"[Backend] Invalid or missing start_id '{start_id}' for arrow {shape.get('id')}. Available IDs: {shape_ids}")
-                valid_arrow = False
-            
-            # Check end binding
-            end_id = shape.get("props", {}).get("end", {}).get("boundShapeId")
-            if not end_id or end_id not in shape_ids:
-                print(f"[Backend] Invalid or missing end_id '{end_id}' for arrow {shape.get('id')}. Available IDs: {shape_ids}")
-                valid_arrow = False
-            
-            if valid_arrow:
-                processed_shapes.append(shape)
-            else:
-                print(f"[Backend] Skipping invalid arrow due to unbound shape: {shape.get('id')}")
+        # Groq with response_format={"type": "json_object"} should directly return a parsable JSON string
+        topology = json.loads(response_content)
 
+        # Drops malformed nodes and edges that don't connect two known nodes
+        processed_shapes = build_diagram(topology, prompt, guess_kind(prompt))
 
-        print(f"[Backend] Generated {len(processed_shapes)} shapes with Groq (including validated arrows)")
+        logger.info(f"Generated {len(processed_shapes)} shapes with Groq")
+        await remember_diagram(prompt, processed_shapes)
         return processed_shapes
 
     except json.JSONDecodeError as e:
-        print(f"[Backend] Error decoding JSON from Groq: {e}")
-        print(f"[Backend] Groq raw response causing error: {response_content[:500]}...") # Log part of the problematic response
+        # Only the size of the raw completion is logged; it can echo user content
+        logger.warning(f"Error decoding JSON from Groq: {e}", extra={"response_length": len(response_content)})
         return generate_diagram_from_prompt(prompt) # Fallback
     except Exception as e:
-        print(f"[Backend] Error generating with Groq: {e}")
+        logger.warning(f"Error generating with Groq: {e}")
         # Fallback to the rule-based generation
         return generate_diagram_from_prompt(prompt)
 
+async def stream_diagram_with_groq(prompt: str, on_shapes) -> list[dict]:
+    """
+    Generate a diagram from a streamed Groq completion, calling on_shapes
+    with the laid out diagram so far each time a node or edge arrives.
+    Edges are only drawn once both of the nodes they connect have arrived.
+    """
+    logger.debug("Streaming diagram from Groq", extra={"prompt_length": len(prompt)})
+    parser = ShapeStreamParser()
+    builder = DiagramBuilder(prompt, guess_kind(prompt))
+    header = ""
+    complete = False
+
+    try:
+        # JSON mode can't be streamed, so nodes and edges are picked out of the raw text as it arrives
+        stream = await async_groq_client.chat.completions.create(
+            messages=diagram_messages(prompt),
+            model=GROQ_DIAGRAM_MODEL,
+            temperature=0.1,
+            stream=True
+        )
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if not delta:
+                continue
+            if header is not None:
+                # The diagram type picks the layout; it is only looked for ahead of the first node
+                header += delta
+                match = DIAGRAM_TYPE_PATTERN.search(header)
+                if match:
+                    builder.kind = diagram_kind(match.group(1), builder.kind)
+            changed = False
+            for item in parser.feed(delta):
+                changed = builder.add(item) or changed
+            if builder.nodes:
+                header = None
+            if changed:
+                await on_shapes(builder.shapes())
+        complete = True
+    except Exception as e:
+        logger.warning(f"Error streaming diagram from Groq: {e}")
+
+    shapes = builder.shapes()
+    if not shapes:
+        # Nothing usable arrived; fall back to the rule-based generation
+        return generate_diagram_from_prompt(prompt)
+    logger.info(f"Streamed {len(shapes)} shapes from Groq")
+    if complete:
+        # A stream cut short is still shown, but not kept for other requests
+        await remember_diagram(prompt, shapes)
+    return shapes
+
 def generate_diagram_from_prompt(prompt: str) -> list[dict]:
     """Fallback method using rule-based generation"""
-    print(f"[Backend] Falling back to rule-based generation for prompt: {prompt}")
+    logger.info("Falling back to rule-based diagram generation")
     keywords = prompt.lower().split()
-    shapes: list[dict] = []
-    
+
     # Extract potential entities from the prompt
-    entities = [word for word in keywords if len(word) > 3 and word not in 
+    entities = [word for word in keywords if len(word) > 3 and word not in
                 ("flow", "diagram", "flowchart", "with", "and", "the", "that", "this", "from", "into", "create", "make", "show")]
-    
-    # Determine diagram type based on keywords
-    is_flowchart = any(k in keywords for k in ("flow", "diagram", "flowchart", "process", "sequence"))
-    is_mindmap = any(k in keywords for k in ("mind", "map", "concept", "idea", "brainstorm"))
-    
-    # Default to flowchart if no specific type is detected
-    if not any([is_flowchart, is_mindmap]):
-        is_flowchart = True
-    
-    unique_entities = list(set(entities))[:6] # Limit to 6
+
+    # Determine diagram type based on keywords, defaulting to a flowchart
+    kind = guess_kind(prompt)
+
+    unique_entities = list(dict.fromkeys(entities))[:6] # Limit to 6, keeping prompt order
     if len(unique_entities) < 2:
         unique_entities = ["Start", "Input", "Process", "Decision", "Output", "End"] # More generic fallback
-    
+
     # Define a list of colors to cycle through
     colors = ["light-blue", "light-green", "yellow", "orange", "light-violet", "light-red", "blue", "green", "violet"]
-    
-    # Add title shape first
-    title_id = f"shape:title-{uuid.uuid4().hex[:6]}"
-    shapes.append({
-        "id": title_id,
-        "typeName": "shape",
-        "type": "text",
-        "x": 400, 
-        "y": 50,
-        "rotation": 0, 
-        "isLocked": False, 
-        "opacity": 1,
-        "index": "a0", 
-        "parentId": "page:page",
-        "props": {
-            "text": prompt.capitalize(),
-            "color": "black", 
-            "size": "l", 
-            "font": "draw",
-            "textAlign": "middle", 
-            "w": 500, 
-            "autoSize": True,
-            "scale": 1,
-        },
-    })
-
-    def calculate_shape_size(text):
-        """Calculate appropriate width and height based on text content"""
-        text_length = len(text)
-        lines = text.count('\n') + 1
-        
-        # Base dimensions
-        width = max(180, 120 + (text_length * 5))  # Increase width with text length
-        height = max(100, 50 + (lines * 20))       # Increase height with line count
-        
-        # Cap at reasonable maximums
-        width = min(width, 400)
-        height = min(height, 200)
-        
-        return width, height
-
-    if is_flowchart:
-        y_pos = 150 # Start below title
-        x_start = 400 # Center horizontally
-        spacing_y = 100 # Vertical spacing between shapes
-        
+
+    builder = DiagramBuilder(prompt, kind)
+    if kind == FLOWCHART:
         for i, entity in enumerate(unique_entities):
             # Choose appropriate shape type based on position and content
             if i == 0:
-                geo_type = "oval"
-                text = "Start: Initialize variables"
-                color = "green"
+                geo_type, text, color = "oval", "Start: Initialize variables", "green"
             elif i == len(unique_entities) - 1:
-                geo_type = "oval"
-                text = f"End: Display result"
-                color = "light-red"
+                geo_type, text, color = "oval", "End: Display result", "light-red"
             elif "decision" in entity.lower() or "?" in entity or i == 3:  # Make 4th item a decision by default
-                geo_type = "diamond"
-                text = f"Decision: Is {entity} valid?"
-                color = "yellow"
+                geo_type, text, color = "diamond", f"Decision: Is {entity} valid?", "yellow"
+            elif i == 1:
+                geo_type, text, color = "rectangle", f"Input: Get {entity} from user", "light-blue"
+            elif i == 2:
+                geo_type, text, color = "rectangle", f"Process: Calculate {entity}", "blue"
             else:
-                geo_type = "rectangle"
-                # Make process steps more descriptive based on position
-                if i == 1:
-                    text = f"Input: Get {entity} from user"
-                    color = "light-blue"
-                elif i == 2:
-                    text = f"Process: Calculate {entity}"
-                    color = "blue"
-                else:
-                    text = f"Process: Apply {entity} operation"
-                    color = colors[i % len(colors)]
-            
-            # Calculate appropriate size based on text content
-            width, height = calculate_shape_size(text)
-            if geo_type == "diamond":
-                width = max(width, 180)  # Diamonds need more width
-                height = max(height, 120)  # Diamonds need more height
-            
-            current_y = y_pos + i * (height + spacing_y)
-            shape_id = f"shape:node-{uuid.uuid4().hex[:6]}"
-            
-            shapes.append({
-                "id": shape_id,
-                "typeName": "shape",
-                "type": "geo",
-                "x": x_start,
-                "y": current_y,
-                "rotation": 0,
-                "isLocked": False,
-                "opacity": 1,
-                "index": f"a{i+1}",
-                "parentId": "page:page",
-                "props": {
-                    "geo": geo_type,
-                    "w": width,
-                    "h": height,
-                    "text": text,
-                    "color": color,
-                    "labelColor": "black",
-                    "size": "m",
-                    "font": "draw",
-                    "align": "middle",
-                    "verticalAlign": "middle",
-                    "fill": "solid",
-                    "dash": "draw",
-                    "url": "",
-                    "growY": 0,
-                    "scale": 1,
-                }
-            })
-            
-            # Add arrows (basic vertical connection)
+                geo_type, text, color = "rectangle", f"Process: Apply {entity} operation", colors[i % len(colors)]
+            builder.add({"id": f"n{i}", "text": text, "shape": geo_type, "color": color})
+
+            if i > 0:
+                previous = builder.nodes[f"n{i - 1}"]
+                builder.add({"from": f"n{i - 1}", "to": f"n{i}", "label": "Yes" if previous["geo"] == "diamond" else ""})
+                # A failed check goes back to the step before it
+                if previous["geo"] == "diamond" and i > 1:
+                    builder.add({"from": f"n{i - 1}", "to": f"n{i - 2}", "label": "No"})
+    elif kind == MINDMAP:
+        # Central topic first, every other entity branching from it
+        for i, entity in enumerate(unique_entities):
+            builder.add({"id": f"n{i}", "text": entity.capitalize(), "shape": "oval" if i == 0 else "rectangle",
+                         "color": "light-blue"})
             if i > 0:
-                arrow_id = f"shape:arrow-{uuid.uuid4().hex[:6]}"
-                prev_shape_id = shapes[-2]["id"]  # The previously added shape
-                
-                # Position arrow connections based on shape types
-                start_anchor = {"x": 0.5, "y": 1.0}  # Default: bottom center
-                end_anchor = {"x": 0.5, "y": 0.0}    # Default: top center
-                
-                # Adjust for diamond shapes
-                prev_geo_type = shapes[-2]["props"]["geo"]
-                if prev_geo_type == "diamond":
-                    start_anchor = {"x": 0.5, "y": 0.75}  # Lower point of diamond
-                
-                if geo_type == "diamond":
-                    end_anchor = {"x": 0.5, "y": 0.25}  # Upper point of diamond
-                
-                shapes.append({
-                    "id": arrow_id,
-                    "typeName": "shape",
-                    "type": "arrow",
-                    "x": x_start,
-                    "y": current_y - spacing_y / 2,
-                    "rotation": 0,
-                    "isLocked": False,
-                    "opacity": 1,
-                    "index": f"az{i}",
-                    "parentId": "page:page",
-                    "props": {
-                        "dash": "draw",
-                        "size": "m",
-                        "fill": "none",
-                        "color": "black",
-                        "labelColor": "black",
-                        "bend": 0,
-                        "start": {
-                            "type": "binding", 
-                            "boundShapeId": prev_shape_id, 
-                            "normalizedAnchor": start_anchor, 
-                            "isExact": False
-                        },
-                        "end": {
-                            "type": "binding", 
-                            "boundShapeId": shape_id, 
-                            "normalizedAnchor": end_anchor, 
-                            "isExact": False
-                        },
-                        "arrowheadStart": "none",
-                        "arrowheadEnd": "arrow",
-                        "text": "",
-                        "font": "draw"
-                    }
-                })
-    elif is_mindmap:
-        center_x, center_y = 400, 350 # Below title
-        radius = 250
-        angle_step = 2 * math.pi / max(1, len(unique_entities)) # Avoid division by zero
-        
+                builder.add({"from": "n0", "to": f"n{i}"})
+    else:
+        # First entity at the top, the next two reporting to it and the rest shared between them
+        managers = [f"n{i}" for i in range(1, min(3, len(unique_entities)))]
         for i, entity in enumerate(unique_entities):
-            shape_id = f"shape:mind-{uuid.uuid4().hex[:6]}"
-            angle = i * angle_step
-            x_pos = center_x + radius * math.cos(angle) - 100 # -100 to adjust for shape width/2
-            y_pos = center_y + radius * math.sin(angle) - 50  # -50 to adjust for shape height/2
-            
-            if i == 0 and len(unique_entities) > 1: # Central topic if multiple entities
-                x_pos, y_pos = center_x - 100, center_y - 50
-            elif len(unique_entities) == 1: # Single entity, center it
-                x_pos, y_pos = center_x - 100, center_y - 50
-
-
-            shapes.append({
-                "id": shape_id, "typeName": "shape", "type": "geo",
-                "x": x_pos, "y": y_pos,
-                "rotation": 0, "isLocked": False, "opacity": 1, "index": f"a{i+1}", "parentId": "page:page",
-                "props": {
-                    "geo": "oval" if i == 0 and len(unique_entities)>1 else "rectangle", "w": 200, "h": 100,
-                    "text": entity.capitalize(), "color": "light-blue", "labelColor": "black",
-                    "size": "m", "font": "draw", "align": "middle", "verticalAlign": "middle",
-                    "fill": "solid", "dash": "draw", "url": "", "growY": 0, "scale": 1,
-                }
-            })
-            # Add arrows from central topic to others
-            if i > 0 and len(unique_entities) > 1:
-                central_shape_id = shapes[1]["id"] # Title is shapes[0]
-                arrow_id = f"shape:arrow-mind-{uuid.uuid4().hex[:6]}"
-                shapes.append({
-                    "id": arrow_id, "typeName": "shape", "type": "arrow",
-                    "x": (center_x + x_pos + 100) / 2, # Midpoint x
-                    "y": (center_y + y_pos + 50) / 2,  # Midpoint y
-                    "rotation": 0, "isLocked": False, "opacity": 1, "index": f"az{i}", "parentId": "page:page",
-                    "props": {
-                        "dash": "draw", "size": "m", "fill": "none", "color": "black", "labelColor": "black",
-                        "bend": 0,
-                        "start": {"type": "binding", "boundShapeId": central_shape_id, "normalizedAnchor": {"x": 0.5, "y": 0.5}, "isExact": False},
-                        "end": {"type": "binding", "boundShapeId": shape_id, "normalizedAnchor": {"x": 0.5, "y": 0.5}, "isExact": False},
-                        "arrowheadStart": "none", "arrowheadEnd": "arrow", "text": "", "font": "draw"
-                    }
-                })
-    else: # Default if no other type matched (should be flowchart due to earlier logic)
-        # Add a simple text message if no specific rules apply
-        if not shapes: # Only if no title was added
-            shapes.append({
-                "id": "shape:fallback-text", "typeName": "shape", "type": "text",
-                "x": 100, "y": 100, "rotation": 0, "isLocked": False, "opacity": 1,
-                "index": "a1", "parentId": "page:page",
-                "props": {"text": f"Rule-based: {prompt.capitalize()}", "color": "black", "size": "m", "font": "draw", "autoSize": True}
-            })
-
-    print(f"[Backend] Rule-based generated {len(shapes)} shapes")
+            builder.add({"id": f"n{i}", "text": entity.capitalize(), "shape": "rectangle",
+                         "color": colors[i % len(colors)]})
+            if i > 0:
+                parent = "n0" if f"n{i}" in managers else managers[i % len(managers)]
+                builder.add({"from": parent, "to": f"n{i}"})
+
+    shapes = builder.shapes()
+    logger.debug(f"Rule-based generation produced {len(shapes)} shapes")
     return shapes
 
+# Store the latest shapes for a client and push them if its socket is connected to this worker.
+# Messages are always the full list so far, so a client that redraws on each one stays correct.
+async def publish_shapes(client_id: str, shapes: list[dict]) -> None:
+    session = await asyncio.to_thread(diagram_sessions.set, client_id, shapes)
+    websocket = connected_websockets.get(client_id)
+    if websocket is None:
+        logger.debug("WebSocket not connected to this worker, diagram stored", extra={"client_id": client_id})
+        return
+    try:
+        connected_websockets.mark_sent(client_id, session.version)
+        await websocket.send_json(shapes)
+    except Exception as e:
+        logger.debug(f"Dropping WebSocket after failed push: {e}", extra={"client_id": client_id})
+        connected_websockets.unregister(client_id, websocket)
 
-@router.post("/generate-diagram")
-async def generate_diagram_endpoint(req: DiagramRequest):
-    print(f"[Backend] /generate-diagram prompt='{req.prompt}'")
-    client_id = f"client-{uuid.uuid4().hex[:8]}"
-    print(f"[Backend] Assigned client_id={client_id} for this request.")
 
+def error_shapes(error: Exception) -> list[dict]:
+    return [{
+        "id": "error-shape",
+        "typeName": "shape",
+        "type": "text",
+        "x": 100, "y": 100, "rotation": 0,
+        "isLocked": False, "opacity": 1,
+        "index": "a1", "parentId": "page:page",
+        "props": {"text": f"Error generating diagram: {str(error)[:200]}", "color": "red", "size": "m", "autoSize": True}
+    }]
+
+
+async def run_generation(client_id: str, prompt: str) -> None:
     try:
-        diagram = await generate_diagram_with_groq(req.prompt)
-        diagram_results[client_id] = diagram
-        
-        if client_id in connected_websockets:
-            print(f"[Backend] Pushing to WS {client_id} immediately after generation.")
-            await connected_websockets[client_id].send_json(diagram)
+        cached = await find_similar_diagram(prompt)
+        if cached is not None:
+            await publish_shapes(client_id, cached)
+            logger.info("Diagram served from cache by similarity", extra={"client_id": client_id})
+            return
+        if WHITEBOARD_STREAMING:
+            async def on_shapes(shapes):
+                await publish_shapes(client_id, shapes)
+            diagram = await stream_diagram_with_groq(prompt, on_shapes)
         else:
-            print(f"[Backend] WS for {client_id} not yet connected. Result cached.")
-            
-        return {"client_id": client_id, "message": "Diagram generation initiated. Connect WebSocket with this client_id."}
+            diagram = await generate_diagram_with_groq(prompt)
+        await publish_shapes(client_id, diagram)
+    except asyncio.CancelledError:
+        raise
     except Exception as e:
-        print(f"[Backend ERROR] {e}")
-        err_shape = [{
-            "id": "error-shape",
-            "typeName": "shape",
-            "type": "text",
-            "x": 100, "y": 100, "rotation": 0,
-            "isLocked": False, "opacity": 1,
-            "index": "a1", "parentId": "page:page",
-            "props": {"text": f"Error generating diagram: {str(e)[:200]}", "color": "red", "size": "m", "autoSize": True}
-        }]
-        diagram_results[client_id] = err_shape
-        return {"client_id": client_id, "message": "error", "error_details": str(e)}
-
-# Remove the if __name__ == "__main__" block as it's no longer needed
\ No newline at end of file
+        logger.exception(f"Diagram generation failed: {e}", extra={"client_id": client_id})
+        await publish_shapes(client_id, error_shapes(e))
+
+
+# Generations still running; held so the tasks aren't garbage collected mid-flight
+generation_tasks: set[asyncio.Task] = set()
+
+
+# Cancel running generations and the session poller; called at shutdown
+async def stop_generation() -> None:
+    tasks = set(generation_tasks)
+    if session_watcher is not None:
+        tasks.add(session_watcher)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def warm_cache(prompts: list[str]) -> None:
+    # One at a time, so warm-up doesn't compete with live requests for the Groq rate limit
+    for prompt in prompts:
+        if prompt not in diagram_cache:
+            await generate_diagram_with_groq(prompt)
+    logger.info(f"Diagram cache warmed with {len(prompts)} seed prompts")
+
+
+# Generate the seed prompts in the background; called at startup
+def start_cache_warmup() -> None:
+    prompts = load_seed_prompts(WHITEBOARD_CACHE_SEED) if WHITEBOARD_CACHE_SEED else []
+    if prompts and not acquire_warmup_lock(WHITEBOARD_CACHE_WARM_LOCK):
+        logger.info("Diagram cache warm-up already running in another worker")
+        return
+    if prompts:
+        task = asyncio.create_task(warm_cache(prompts))
+        generation_tasks.add(task)
+        task.add_done_callback(generation_tasks.discard)
+
+
+# Size and eviction counters for stored diagrams, connected sockets and the diagram cache
+@router.get("/session-stats")
+async def session_stats():
+    return {
+        "sessions": await asyncio.to_thread(diagram_sessions.stats),
+        "websockets": connected_websockets.stats(),
+        "diagram_cache": diagram_cache.stats()
+    }
+
+
+# Returns the client_id right away; shapes are pushed over /ws/{client_id} once generated
+@router.post("/generate-diagram")
+async def generate_diagram_endpoint(req: DiagramRequest):
+    client_id = f"client-{uuid.uuid4().hex[:8]}"
+    logger.info("Diagram requested", extra={"client_id": client_id, "prompt_length": len(req.prompt)})
+
+    # A miss is only counted here when no similarity lookup follows in the background
+    cached = diagram_cache.get(req.prompt, count_miss=not diagram_cache.semantic)
+    if cached is not None:
+        # Stored now, so the socket receives it as soon as it connects
+        await publish_shapes(client_id, cached)
+        logger.info("Diagram served from cache", extra={"client_id": client_id})
+        return {"client_id": client_id, "message": "Diagram ready. Connect WebSocket with this client_id.", "cached": True}
+
+    task = asyncio.create_task(run_generation(client_id, req.prompt))
+    generation_tasks.add(task)
+    task.add_done_callback(generation_tasks.discard)
+
+    return {"client_id": client_id, "message": "Diagram generation initiated. Connect WebSocket with this client_id.", "cached": False}
@@ -0,0 +1,215 @@
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Optional, Union
+
+from PyPDF2 import PdfReader
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pymupdf
+except ImportError:
+    pymupdf = None
+
+# Backends to try in order; later ones are fallbacks when a document fails on an earlier one
+PDF_BACKEND_ORDER = [name.strip() for name in os.getenv("PDF_BACKENDS", "pymupdf,pypdf2").split(",") if name.strip()]
+
+# Extraction limits shared by every route that reads PDFs
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "25"))
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "500"))
+PDF_EXTRACT_TIMEOUT = float(os.getenv("PDF_EXTRACT_TIMEOUT", "60"))
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+class PdfExtractionError(Exception):
+    """Raised when a PDF can't be extracted within the configured page or time limits."""
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=PDF_EXTRACT_WORKERS)
+    return _executor
+
+
+def _ready() -> None:
+    pass
+
+
+async def start_executor() -> None:
+    """
+    Start every extraction worker now. The pool only spawns a process when a task
+    is submitted with no idle worker, so one no-op per worker is run and awaited.
+    """
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    await asyncio.gather(*(loop.run_in_executor(executor, _ready) for _ in range(PDF_EXTRACT_WORKERS)))
+
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+# Backends open either a file path (what the worker processes are given) or the PDF bytes
+PdfSource = Union[str, bytes]
+
+
+class PyMuPDFBackend:
+    name = "pymupdf"
+
+    def __init__(self, source: PdfSource):
+        if isinstance(source, str):
+            self.document = pymupdf.open(source, filetype="pdf")
+        else:
+            self.document = pymupdf.open(stream=source, filetype="pdf")
+
+    def page_count(self) -> int:
+        return self.document.page_count
+
+    def page_text(self, index: int) -> str:
+        return self.document.load_page(index).get_text()
+
+    def close(self) -> None:
+        self.document.close()
+
+
+class PyPDF2Backend:
+    name = "pypdf2"
+
+    def __init__(self, source: PdfSource):
+        self.reader = PdfReader(source if isinstance(source, str) else BytesIO(source))
+
+    def page_count(self) -> int:
+        return len(self.reader.pages)
+
+    def page_text(self, index: int) -> str:
+        return self.reader.pages[index].extract_text() or ""
+
+    def close(self) -> None:
+        pass
+
+
+PDF_BACKENDS = {
+    PyMuPDFBackend.name: PyMuPDFBackend,
+    PyPDF2Backend.name: PyPDF2Backend,
+}
+
+
+def available_backends(order: Optional[list[str]] = None) -> list[str]:
+    names = order or PDF_BACKEND_ORDER
+    return [name for name in names if name in PDF_BACKENDS and (name != PyMuPDFBackend.name or pymupdf is not None)]
+
+
+# Runs in a worker process: first backend that can open the document, and its page count
+def _count_pages(path: str, backends: list[str]) -> tuple[str, int]:
+    errors = []
+    for name in backends:
+        try:
+            backend = PDF_BACKENDS[name](path)
+            try:
+                return name, backend.page_count()
+            finally:
+                backend.close()
+        except Exception as e:
+            errors.append(f"{name}: {e}")
+    raise PdfExtractionError(f"No PDF backend could open the document ({'; '.join(errors)})")
+
+
+# Runs in a worker process: text for pages [start, end), stopping early once the deadline passes.
+# If the preferred backend fails part way, the whole range is retried with the next one.
+def _extract_page_range(path: str, start: int, end: int, deadline: float, backends: list[str]) -> tuple[list[str], bool]:
+    errors = []
+    for name in backends:
+        pages = []
+        try:
+            backend = PDF_BACKENDS[name](path)
+            try:
+                for index in range(start, end):
+                    if time.time() > deadline:
+                        return pages, False
+                    pages.append(backend.page_text(index))
+                return pages, True
+            finally:
+                backend.close()
+        except Exception as e:
+            errors.append(f"{name}: {e}")
+    raise PdfExtractionError(f"Failed to extract pages {start}-{end} ({'; '.join(errors)})")
+
+
+def _write_temp_pdf(data: bytes) -> str:
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as temp_file:
+        temp_file.write(data)
+    return temp_file.name
+
+
+def _remove_temp_pdf(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError as e:
+        logger.warning(f"Could not remove temporary PDF {path}: {e}")
+
+
+async def extract_pdf_pages(data: bytes, backends: Optional[list[str]] = None) -> list[str]:
+    """
+    Extract the text of each page from PDF bytes on the process pool, splitting
+    large documents into page ranges that are extracted in parallel. Backends
+    are tried in order (PDF_BACKENDS by default) and later ones act as fallbacks.
+    """
+    backends = available_backends(backends)
+    if not backends:
+        raise PdfExtractionError("No PDF extraction backend is available")
+    # Workers get a path to the bytes on disk rather than a pickled copy of the whole PDF per task
+    path = await asyncio.to_thread(_write_temp_pdf, data)
+    try:
+        return await _extract_file_pages(path, backends)
+    finally:
+        await asyncio.to_thread(_remove_temp_pdf, path)
+
+
+async def _extract_file_pages(path: str, backends: list[str]) -> list[str]:
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    deadline = time.time() + PDF_EXTRACT_TIMEOUT
+
+    try:
+        backend_name, page_count = await asyncio.wait_for(
+            loop.run_in_executor(executor, _count_pages, path, backends), timeout=PDF_EXTRACT_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        raise PdfExtractionError(f"Timed out reading PDF after {PDF_EXTRACT_TIMEOUT}s")
+
+    if page_count > PDF_MAX_PAGES:
+        raise PdfExtractionError(f"PDF has {page_count} pages, the limit is {PDF_MAX_PAGES}")
+
+    ranges = [(start, min(start + PDF_PAGES_PER_TASK, page_count))
+              for start in range(0, page_count, PDF_PAGES_PER_TASK)]
+    # Start from the backend that opened the document, keeping the rest as fallbacks
+    range_backends = backends[backends.index(backend_name):]
+    tasks = [loop.run_in_executor(executor, _extract_page_range, path, start, end, deadline, range_backends)
+             for start, end in ranges]
+
+    try:
+        results = await asyncio.wait_for(asyncio.gather(*tasks), timeout=max(0.0, deadline - time.time()) + 1)
+    except asyncio.TimeoutError:
+        results = None
+
+    if results is None or not all(complete for _, complete in results):
+        logger.warning(f"PDF extraction of {page_count} pages exceeded {PDF_EXTRACT_TIMEOUT}s")
+        raise PdfExtractionError(f"Timed out extracting PDF text after {PDF_EXTRACT_TIMEOUT}s")
+
+    return [page for pages, _ in results for page in pages]
+
+
+async def extract_pdf_text(data: bytes, backends: Optional[list[str]] = None) -> str:
+    """Extract the text of a whole PDF as a single string."""
+    return "\n".join(await extract_pdf_pages(data, backends))
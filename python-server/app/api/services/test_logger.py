@@ -0,0 +1,109 @@
+import asyncio
+import json
+import logging
+import queue
+import sys
+
+from app.api.services import logger as app_logger
+from app.api.services.logger import (
+    JsonFormatter, NonBlockingQueueHandler, RequestContextFilter, RequestIdMiddleware, SamplingFilter, request_id
+)
+
+
+def make_record(msg="hello %s", args=("world",), **extra) -> logging.LogRecord:
+    record = logging.LogRecord("app.test", logging.INFO, __file__, 1, msg, args, None)
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+
+def test_sampling_keeps_one_in_every_n_per_message():
+    sampler = SamplingFilter()
+
+    kept = [sampler.filter(make_record(sample_every=3)) for _ in range(7)]
+    assert kept == [True, False, False, True, False, False, True]
+    assert sampler.filter(make_record(msg="other %s", sample_every=3))
+    assert all(sampler.filter(make_record()) for _ in range(3))
+
+
+def test_sampling_counts_the_template_not_its_arguments():
+    sampler = SamplingFilter()
+
+    kept = [sampler.filter(make_record(args=(number,), sample_every=2)) for number in range(4)]
+    assert kept == [True, False, True, False]
+
+
+def test_sampling_keeps_only_the_most_recent_messages():
+    sampler = SamplingFilter(max_keys=2)
+
+    for number in range(100):
+        sampler.filter(make_record(msg=f"job {number} failed", args=(), sample_every=2))
+    sampler.filter(make_record(msg="job 98 failed", args=(), sample_every=2))
+
+    assert list(sampler._counts) == [("app.test", "job 99 failed"), ("app.test", "job 98 failed")]
+
+
+def test_records_carry_the_current_request_id():
+    token = request_id.set("abc123")
+    try:
+        record = make_record()
+        RequestContextFilter().filter(record)
+    finally:
+        request_id.reset(token)
+
+    assert record.request_id == "abc123"
+
+
+def test_json_output_includes_extra_fields_and_exceptions():
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = logging.LogRecord("app.test", logging.ERROR, __file__, 1, "failed %s", ("upload",), sys.exc_info())
+    record.user_id = "u1"
+
+    entry = json.loads(JsonFormatter().format(record))
+
+    assert entry["level"] == "ERROR"
+    assert entry["logger"] == "app.test"
+    assert entry["message"] == "failed upload"
+    assert entry["user_id"] == "u1"
+    assert "ValueError: boom" in entry["exc_info"]
+
+
+def test_full_queue_drops_records_instead_of_blocking(monkeypatch):
+    monkeypatch.setattr(NonBlockingQueueHandler, "dropped", 0)
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+
+    for _ in range(3):
+        handler.handle(make_record())
+
+    assert handler.queue.qsize() == 1
+    assert NonBlockingQueueHandler.dropped == 2
+    assert handler.queue.get_nowait().getMessage() == "hello world"
+
+
+def test_level_overrides_are_parsed():
+    assert app_logger._parse_levels(" app.routes=debug, uvicorn.access=WARNING,broken,") == {
+        "app.routes": "DEBUG",
+        "uvicorn.access": "WARNING",
+    }
+
+
+def test_middleware_echoes_incoming_request_id():
+    seen = []
+
+    async def app(scope, receive, send):
+        seen.append(request_id.get())
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "headers": [(b"x-request-id", b"req-42")]}
+    asyncio.run(RequestIdMiddleware(app)(scope, None, send))
+
+    assert seen == ["req-42"]
+    assert (b"x-request-id", b"req-42") in sent[0]["headers"]
+    assert request_id.get() is None
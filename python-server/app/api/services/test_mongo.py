@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from app.api.services import mongo
+from app.api.services.mongo import PoolMonitor
+
+
+def test_checkouts_move_callers_from_waiting_to_in_use():
+    monitor = PoolMonitor()
+    monitor.connection_created(None)
+    monitor.connection_check_out_started(None)
+    monitor.connection_check_out_started(None)
+
+    assert (monitor.waiting, monitor.in_use) == (2, 0)
+
+    monitor.connection_checked_out(None)
+    monitor.connection_check_out_failed(None)
+
+    stats = monitor.stats()
+    assert (stats["open"], stats["waiting"], stats["in_use"]) == (1, 0, 1)
+    assert (stats["checkouts"], stats["checkout_failures"]) == (1, 1)
+
+
+def test_checked_in_and_closed_connections_are_released():
+    monitor = PoolMonitor()
+    monitor.connection_created(None)
+    monitor.connection_check_out_started(None)
+    monitor.connection_checked_out(None)
+
+    monitor.connection_checked_in(None)
+    monitor.connection_closed(None)
+
+    stats = monitor.stats()
+    assert (stats["open"], stats["in_use"]) == (0, 0)
+    assert stats["checkouts"] == 1
+
+
+def test_saturation_is_share_of_pool_in_use(monkeypatch):
+    monkeypatch.setattr(mongo, "MONGO_MAX_POOL_SIZE", 4)
+    monitor = PoolMonitor()
+    for _ in range(3):
+        monitor.connection_check_out_started(None)
+        monitor.connection_checked_out(None)
+
+    assert monitor.stats()["saturation"] == pytest.approx(0.75)
+    monkeypatch.setattr(mongo, "MONGO_MAX_POOL_SIZE", 0)
+    assert monitor.stats()["saturation"] == 0.0
+
+
+def test_client_is_shared_and_configured_from_settings(monkeypatch):
+    monkeypatch.setattr(mongo, "MONGO_URI", "mongodb://localhost:1/")
+    monkeypatch.setattr(mongo, "MONGO_MAX_POOL_SIZE", 7)
+    monkeypatch.setattr(mongo, "_client", None)
+
+    client = mongo.get_client()
+    try:
+        assert mongo.get_client() is client
+        assert client.options.pool_options.max_pool_size == 7
+        assert mongo.get_database().name == mongo.MONGO_DATABASE
+    finally:
+        asyncio.run(mongo.close())
+    assert mongo._client is None
+
+
+def test_ping_reports_unreachable_server(monkeypatch):
+    monkeypatch.setattr(mongo, "MONGO_URI", "mongodb://localhost:1/")
+    monkeypatch.setattr(mongo, "MONGO_SERVER_SELECTION_TIMEOUT_MS", 50)
+    monkeypatch.setattr(mongo, "_client", None)
+
+    async def check():
+        try:
+            return await mongo.ping()
+        finally:
+            await mongo.close()
+
+    assert asyncio.run(check()) is False
@@ -0,0 +1,66 @@
+import asyncio
+import os
+
+import pytest
+
+from app.api.services import pdfExtractor
+from app.api.services.pdfExtractor import PdfExtractionError, extract_pdf_pages, start_executor
+
+pymupdf = pytest.importorskip("pymupdf")
+
+
+def make_pdf(pages: int) -> bytes:
+    document = pymupdf.open()
+    for number in range(pages):
+        document.new_page().insert_text((72, 72), f"Page number {number}")
+    data = document.tobytes()
+    document.close()
+    return data
+
+
+@pytest.fixture(autouse=True)
+def executor(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdfExtractor, "PDF_EXTRACT_WORKERS", 2)
+    monkeypatch.setattr(pdfExtractor.tempfile, "tempdir", str(tmp_path))
+    yield
+    pdfExtractor.shutdown_executor()
+
+
+def test_start_executor_spawns_every_worker():
+    asyncio.run(start_executor())
+    assert len(pdfExtractor.get_executor()._processes) == 2
+
+
+@pytest.mark.parametrize("backend", ["pymupdf", "pypdf2"])
+def test_page_ranges_come_back_in_order(monkeypatch, backend):
+    monkeypatch.setattr(pdfExtractor, "PDF_PAGES_PER_TASK", 2)
+
+    pages = asyncio.run(extract_pdf_pages(make_pdf(5), [backend]))
+
+    assert [page.strip() for page in pages] == [f"Page number {number}" for number in range(5)]
+
+
+def test_temporary_file_is_removed(tmp_path):
+    asyncio.run(extract_pdf_pages(make_pdf(1)))
+    assert os.listdir(tmp_path) == []
+
+
+def test_page_limit_is_enforced(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdfExtractor, "PDF_MAX_PAGES", 2)
+
+    with pytest.raises(PdfExtractionError):
+        asyncio.run(extract_pdf_pages(make_pdf(3)))
+    assert os.listdir(tmp_path) == []
+
+
+def test_unreadable_document_is_an_extraction_error():
+    with pytest.raises(PdfExtractionError):
+        asyncio.run(extract_pdf_pages(b"%PDF-1.7 not really a pdf"))
+
+
+def test_backends_still_open_bytes():
+    backend = pdfExtractor.PDF_BACKENDS["pymupdf"](make_pdf(2))
+    try:
+        assert backend.page_count() == 2
+    finally:
+        backend.close()
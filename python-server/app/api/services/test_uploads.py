@@ -0,0 +1,96 @@
+import asyncio
+import io
+
+import pytest
+from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi.testclient import TestClient
+
+from app.api.services.uploads import MaxBodySizeMiddleware, UploadRejected, check_signature, read_upload
+
+LIMIT = 1024
+BOUNDARY = "testboundary"
+
+
+def make_upload(data: bytes, filename: str = "file.pdf") -> UploadFile:
+    return UploadFile(io.BytesIO(data), filename=filename)
+
+
+def multipart(data: bytes) -> bytes:
+    return (
+        f"--{BOUNDARY}\r\n"
+        'Content-Disposition: form-data; name="file"; filename="file.pdf"\r\n'
+        "Content-Type: application/pdf\r\n\r\n"
+    ).encode() + data + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        try:
+            data = await read_upload(file, "pdf", max_bytes=10 * 1024 * 1024)
+        except UploadRejected as e:
+            raise HTTPException(status_code=e.status_code, detail=str(e))
+        return {"size": len(data)}
+
+    app.add_middleware(MaxBodySizeMiddleware, paths=("/upload",), max_bytes=LIMIT)
+    return TestClient(app)
+
+
+def test_signature_mismatch_is_rejected():
+    with pytest.raises(UploadRejected):
+        check_signature(b"PK\x03\x04", "pdf")
+    check_signature(b"%PDF-1.7", "pdf")
+    check_signature(b"PK\x03\x04rest", "docx")
+
+
+def test_text_formats_reject_nul_bytes():
+    with pytest.raises(UploadRejected):
+        check_signature(b"abc\x00def", "txt")
+    check_signature(b"plain text", "txt")
+
+
+def test_read_upload_enforces_size_limit():
+    upload = make_upload(b"%PDF-" + b"x" * 5000)
+    with pytest.raises(UploadRejected) as excinfo:
+        asyncio.run(read_upload(upload, "pdf", max_bytes=1000))
+    assert excinfo.value.status_code == 413
+
+
+def test_read_upload_rejects_empty_file():
+    with pytest.raises(UploadRejected):
+        asyncio.run(read_upload(make_upload(b""), "pdf"))
+
+
+def test_small_upload_passes_middleware(client):
+    response = client.post(
+        "/upload",
+        content=multipart(b"%PDF-small"),
+        headers={"content-type": f"multipart/form-data; boundary={BOUNDARY}"},
+    )
+    assert response.status_code == 200
+    assert response.json() == {"size": len(b"%PDF-small")}
+
+
+def test_declared_content_length_over_limit_is_rejected(client):
+    body = multipart(b"%PDF-" + b"x" * (LIMIT + 128 * 1024))
+    response = client.post(
+        "/upload", content=body, headers={"content-type": f"multipart/form-data; boundary={BOUNDARY}"}
+    )
+    assert response.status_code == 413
+
+
+def test_chunked_body_over_limit_is_rejected(client):
+    body = multipart(b"%PDF-" + b"x" * (LIMIT + 128 * 1024))
+
+    def chunks():
+        # A generator has no length, so the body is sent without Content-Length
+        for start in range(0, len(body), 8192):
+            yield body[start:start + 8192]
+
+    response = client.post(
+        "/upload", content=chunks(), headers={"content-type": f"multipart/form-data; boundary={BOUNDARY}"}
+    )
+    assert response.status_code == 413
@@ -0,0 +1,156 @@
+import os
+import uuid
+from typing import Optional
+
+import aiofiles
+import aiofiles.os
+from fastapi import HTTPException, UploadFile
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# Upload limits shared by every route that accepts files
+UPLOAD_MAX_BYTES = int(float(os.getenv("UPLOAD_MAX_MB", "10")) * 1024 * 1024)
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(64 * 1024)))
+
+# Leading bytes each binary format must start with; text formats are only checked for NUL bytes
+FILE_SIGNATURES = {
+    'pdf': (b'%PDF-',),
+    'docx': (b'PK\x03\x04',),
+    'odt': (b'PK\x03\x04',),
+    'rtf': (b'{\\rtf',),
+}
+TEXT_FORMATS = {'txt', 'tex', 'html'}
+
+
+class UploadRejected(Exception):
+    """Raised when an upload is too large or its contents don't match its extension."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def check_signature(head: bytes, file_extension: str) -> None:
+    if file_extension == 'pdf':
+        # Some PDF writers put a few bytes of junk before the header
+        valid = any(signature in head[:1024] for signature in FILE_SIGNATURES['pdf'])
+    elif file_extension in FILE_SIGNATURES:
+        valid = head.startswith(FILE_SIGNATURES[file_extension])
+    else:
+        valid = file_extension not in TEXT_FORMATS or b'\x00' not in head
+    if not valid:
+        raise UploadRejected(f"File content is not a valid {file_extension.upper()} file")
+
+
+async def iter_upload(upload: UploadFile, file_extension: str, max_bytes: Optional[int] = None):
+    """
+    Yield an upload in chunks, rejecting it as soon as the signature is wrong
+    or the size limit is passed rather than after it has all been read.
+    """
+    max_bytes = max_bytes or UPLOAD_MAX_BYTES
+    if upload.size is not None and upload.size > max_bytes:
+        raise UploadRejected(f"File is larger than {max_bytes // (1024 * 1024)} MB", status_code=413)
+
+    total = 0
+    first = True
+    while True:
+        chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        if first:
+            check_signature(chunk, file_extension)
+            first = False
+        total += len(chunk)
+        if total > max_bytes:
+            raise UploadRejected(f"File is larger than {max_bytes // (1024 * 1024)} MB", status_code=413)
+        yield chunk
+    if first:
+        raise UploadRejected("File is empty")
+
+
+async def read_upload(upload: UploadFile, file_extension: str, max_bytes: Optional[int] = None) -> bytes:
+    """Read a validated upload into memory, never holding more than max_bytes."""
+    return b''.join([chunk async for chunk in iter_upload(upload, file_extension, max_bytes)])
+
+
+async def save_upload(upload: UploadFile, destination: str, file_extension: str,
+                      max_bytes: Optional[int] = None) -> int:
+    """
+    Stream a validated upload to destination. Data goes to a temporary file
+    in the same directory that is renamed into place once complete, so a
+    rejected or interrupted upload never replaces an existing file.
+    """
+    temp_path = f"{destination}.{uuid.uuid4().hex[:8]}.part"
+    written = 0
+    try:
+        async with aiofiles.open(temp_path, "wb") as buffer:
+            async for chunk in iter_upload(upload, file_extension, max_bytes):
+                await buffer.write(chunk)
+                written += len(chunk)
+        await aiofiles.os.replace(temp_path, destination)
+    except BaseException:
+        try:
+            await aiofiles.os.remove(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return written
+
+
+class MaxBodySizeMiddleware:
+    """
+    Reject requests to the given path prefixes whose body exceeds the limit,
+    before the multipart body is parsed and spooled. A declared
+    Content-Length is checked up front; chunked bodies are counted as they
+    are received.
+    """
+
+    def __init__(self, app: ASGIApp, paths: tuple[str, ...], max_bytes: Optional[int] = None):
+        self.app = app
+        self.paths = paths
+        # Allow some room for multipart boundaries and form fields
+        self.max_bytes = (max_bytes or UPLOAD_MAX_BYTES) + 64 * 1024
+
+    async def _reject(self, send: Send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json")],
+        })
+        await send({"type": "http.response.body", "body": b'{"detail":"Request body too large"}'})
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not scope["path"].startswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            await self._reject(send)
+            return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # FastAPI re-raises HTTPExceptions from body parsing, so this becomes the response
+                    raise HTTPException(status_code=413, detail="Request body too large")
+            return message
+
+        async def tracked_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except HTTPException as e:
+            # Raised where nothing turned it into a response, e.g. a body read outside a route
+            if e.status_code != 413 or response_started:
+                raise
+            await self._reject(send)
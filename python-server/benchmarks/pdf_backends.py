@@ -0,0 +1,99 @@
+"""
+Compare PDF text extraction backends on a corpus of fixture PDFs.
+
+Usage (from python-server/):
+    python -m benchmarks.pdf_backends [PDF_DIR] [--repeat N] [--pool]
+
+PDF_DIR defaults to uploads/. With --pool the shared process-pool extractor
+is measured end to end as well, so page-range parallelism is included.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from app.api.services import pdfExtractor
+
+
+def load_corpus(directory: str) -> list[tuple[str, bytes]]:
+    corpus = []
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith(".pdf"):
+            with open(os.path.join(directory, name), "rb") as f:
+                corpus.append((name, f.read()))
+    return corpus
+
+
+def bench_backend(name: str, corpus: list[tuple[str, bytes]], repeat: int) -> dict:
+    pages = 0
+    chars = 0
+    failures = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for _, data in corpus:
+            try:
+                backend = pdfExtractor.PDF_BACKENDS[name](data)
+                try:
+                    for index in range(backend.page_count()):
+                        chars += len(backend.page_text(index))
+                        pages += 1
+                finally:
+                    backend.close()
+            except Exception:
+                failures += 1
+    elapsed = time.perf_counter() - start
+    return {"pages": pages, "chars": chars, "failures": failures, "seconds": elapsed}
+
+
+def bench_pool(name: str, corpus: list[tuple[str, bytes]], repeat: int) -> dict:
+    async def run():
+        chars = 0
+        failures = 0
+        for _ in range(repeat):
+            for _, data in corpus:
+                try:
+                    chars += len(await pdfExtractor.extract_pdf_text(data, [name]))
+                except pdfExtractor.PdfExtractionError:
+                    failures += 1
+        return chars, failures
+
+    # Start every worker first so process startup isn't counted
+    asyncio.run(pdfExtractor.start_executor())
+    start = time.perf_counter()
+    chars, failures = asyncio.run(run())
+    elapsed = time.perf_counter() - start
+    return {"pages": None, "chars": chars, "failures": failures, "seconds": elapsed}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf_dir", nargs="?", default="uploads")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--pool", action="store_true", help="also benchmark the process-pool extractor")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.pdf_dir)
+    if not corpus:
+        print(f"No PDFs found in {args.pdf_dir}")
+        return 1
+    total_mb = sum(len(data) for _, data in corpus) * args.repeat / (1024 * 1024)
+    print(f"{len(corpus)} PDFs, {args.repeat} passes, {total_mb:.1f} MB total\n")
+    print(f"{'backend':<16}{'pages/s':>10}{'MB/s':>10}{'chars':>12}{'failures':>10}{'seconds':>10}")
+
+    for name in pdfExtractor.available_backends(list(pdfExtractor.PDF_BACKENDS)):
+        rows = [(name, bench_backend(name, corpus, args.repeat))]
+        if args.pool:
+            rows.append((f"{name} (pool)", bench_pool(name, corpus, args.repeat)))
+        for label, result in rows:
+            seconds = result["seconds"] or 1e-9
+            pages_per_sec = f"{result['pages'] / seconds:.1f}" if result["pages"] is not None else "-"
+            print(f"{label:<16}{pages_per_sec:>10}{total_mb / seconds:>10.2f}"
+                  f"{result['chars']:>12}{result['failures']:>10}{result['seconds']:>10.3f}")
+
+    pdfExtractor.shutdown_executor()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
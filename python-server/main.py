@@ -3,14 +3,23 @@ import uvicorn
 import os
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.api.routes.PdfChat import pdfchat
 from app.api.routes.SmartWhiteBoard import whiteboard
 from app.api.routes.Resume import resume
 from typing import List
 import shutil
 from app.api.routes.ResumeEvaluator import ResumeScore
+from app.api.routes.ResumeEvaluator.converterPool import converter_pool
+from app.api.services.pdfExtractor import start_executor, shutdown_executor
+from app.api.services import mongo
+from app.api.services.uploads import MaxBodySizeMiddleware
+from app.api.services.logger import configure_logging, stop_logging, RequestIdMiddleware
+import logging
 
 load_dotenv()
+configure_logging()
+logger = logging.getLogger(__name__)
 
 app = FastAPI()
 
@@ -19,12 +28,26 @@ origins = [
     "http://localhost:5173",
 ]
 
+# Refuse oversized uploads as their bodies arrive, before multipart parsing spools them
+app.add_middleware(
+    MaxBodySizeMiddleware,
+    paths=("/api/v1/upload/", "/api/v1/resume/evaluate-resume")
+)
+app.add_middleware(
+    MaxBodySizeMiddleware,
+    paths=("/api/v1/pdf-chat/upload-pdfs",),
+    max_bytes=pdfchat.PDF_CHAT_UPLOAD_MAX_BYTES * pdfchat.PDF_CHAT_UPLOAD_MAX_FILES
+)
+
+app.add_middleware(RequestIdMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
 
 app.include_router(pdfchat.router, prefix="/api/v1/pdf-chat", tags=["pdfchat"])
@@ -32,10 +55,39 @@ app.include_router(whiteboard.router, prefix="/api/v1/whiteboard", tags=["whiteb
 app.include_router(resume.router, prefix="/api/v1/upload", tags=["resume"])
 app.include_router(ResumeScore.router, prefix="/api/v1/resume", tags=["resume-evaluator"])
 
+@app.on_event("startup")
+async def startup():
+    # Warm up document conversion workers so uploads don't pay process startup
+    await converter_pool.start()
+    # Spawn every PDF extraction worker before the first upload arrives
+    await start_executor()
+    await pdfchat.ingestion_queue.start()
+    # Open the shared MongoDB connection pool
+    await mongo.connect()
+    # Pre-generate common whiteboard diagrams (WHITEBOARD_CACHE_SEED)
+    whiteboard.start_cache_warmup()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await whiteboard.stop_generation()
+    await pdfchat.ingestion_queue.stop()
+    await converter_pool.stop()
+    shutdown_executor()
+    await mongo.close()
+    stop_logging()
+
 @app.get('/')
 def root():
     return {"message":"Welcome to Next Hire Python Backend","status":"Ok"}
 
+@app.get('/health/mongo')
+async def mongo_health():
+    reachable = await mongo.ping()
+    return JSONResponse(
+        status_code=200 if reachable else 503,
+        content={"status": "Ok" if reachable else "Unavailable", "pool": mongo.pool_monitor.stats()}
+    )
+
 
 
 import os
@@ -108,11 +160,11 @@ class S3Input(BaseModel):
 @app.post('/analyze-interview')
 def analyze_interview(input_data: S3Input):
     # --- Step 1: Download from S3 ---
-    print(f"Downloading video from S3 bucket: {input_data.bucket}, key: {input_data.key}")
+    logger.info(f"Downloading video from S3 bucket: {input_data.bucket}, key: {input_data.key}")
     try:
         s3_client.download_file(input_data.bucket, input_data.key, LOCAL_VIDEO_PATH)
     except Exception as e:
-        print(f"Error downloading video: {str(e)}")
+        logger.error(f"Error downloading video: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to download video from S3: {str(e)}")
 
     # --- Step 2: Upload video to Gemini ---